@@ -1,8 +1,45 @@
 import streamlit as st
 import uuid
+import pandas as pd
+from typing import Callable, Optional
 from src.ui import sidebar
-from src.logic import data_io
+from src.logic import data_io, exporter, memory_governor, memory_optimizer
 from src.utils.logger import init_logger, get_logger
+from src.utils.frame import dense_view, enable_copy_on_write
+from src.utils.settings import get_int_env
+from src.logic.versioning import DatasetVersionStore
+
+def _memory_release_callback() -> Optional[Callable[[], None]]:
+    """メモリガバナーがこのセッションのデータを退避したときに、セッション側の DataFrame への参照を外す関数
+    ガバナーは別セッションのスクリプト実行中に呼ぶため、`st.session_state` ではなく、このセッションの状態を直接参照する。
+    """
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return None
+    state = ctx.session_state
+
+    def release() -> None:
+        approx = state['approx_eda'] if 'approx_eda' in state else None
+        if approx is not None:
+            approx[1].cancel()
+        for key in ('df', 'preview_df', 'approx_eda'):
+            state[key] = None
+        state['memory_released'] = True
+
+    return release
+
+
+def _show_frame(df: pd.DataFrame) -> None:
+    """タブ下部のデータ表示。疎な列（One-Hot の出力）を含む場合は全体を密にせず、先頭 `PREVIEW_ROWS` 行だけを密にして表示する"""
+    if not any(isinstance(t, pd.SparseDtype) for t in df.dtypes):
+        st.dataframe(df)
+        return
+    rows = get_int_env('PREVIEW_ROWS', 1000)
+    st.dataframe(dense_view(df.head(rows)))
+    if len(df) > rows:
+        st.caption(f"疎な列を含むため先頭 {rows:,} 行を表示しています（全 {len(df):,} 行）")
+
 
 def main() -> None:
     """
@@ -23,14 +60,24 @@ def main() -> None:
 
     # ロガー初期化（アプリ起動一回）
     init_logger()
+    # 変換処理が変更列だけを確保するよう、pandas の Copy-on-Write を有効化する
+    enable_copy_on_write()
     logger = get_logger(__name__, session_uid=st.session_state['session_uid'])
     logger.info("App started, session=%s", st.session_state['session_uid'])
 
     st.set_page_config(page_title="データ前処理アプリ", layout="wide")
     st.title("機械学習データ前処理アプリ")
 
+    # 操作のない間にメモリガバナーがデータをディスクへ退避していた場合は、バージョンストアから読み戻す
+    if st.session_state.get('memory_released'):
+        st.session_state['memory_released'] = False
+        if st.session_state.get('versions') is not None:
+            st.session_state['df'] = st.session_state['versions'].current
+            logger.info("Restored spilled data: session=%s", st.session_state['session_uid'])
+
     # サイドバー：ファイルアップロード
     uploaded = sidebar.sidebar_file_uploader()
+    ingest_chunked, ingest_budget_mb, ingest_optimize, ingest_lazy_parquet = sidebar.sidebar_ingest_options()
 
     if uploaded is not None:
         try:
@@ -47,18 +94,54 @@ def main() -> None:
             if need_load:
                 # 常に先頭行をヘッダとして読み込む
                 header_opt = 0
+                read_kwargs = {}
                 if uploaded.name.endswith('.csv'):
-                    df = data_io.load_csv(uploaded, header=header_opt, session_id=st.session_state['session_uid'])
+                    df = data_io.load_csv(uploaded, header=header_opt, session_id=st.session_state['session_uid'],
+                                          chunked=ingest_chunked, memory_budget=ingest_budget_mb * 1024 ** 2)
                     hist_str = f"df = pd.read_csv('{uploaded.name}', header=0)"
                     st.session_state['history'].append(hist_str)
+                    read_kwargs = {'header': header_opt}
+                elif uploaded.name.endswith('.parquet') and ingest_lazy_parquet:
+                    # フッタ（列一覧・統計量）だけを先に読み、列とフィルタが選ばれたらその部分だけを読み込む
+                    pending = st.session_state.get('parquet_schema')
+                    if pending is None or pending[0] != uploaded.name:
+                        pending = (uploaded.name, data_io.parquet_schema(uploaded))
+                        st.session_state['parquet_schema'] = pending
+                    import src.ui.forms as forms
+                    from src.logic import parquet_reader
+                    selection = forms.parquet_load_form(pending[1])
+                    df = None
+                    if selection is not None:
+                        columns, filters = selection
+                        filters = parquet_reader.coerce_filters(filters, pending[1])
+                        df = data_io.load_parquet(uploaded, session_id=st.session_state['session_uid'],
+                                                  columns=columns, filters=filters)
+                        read_kwargs = {'columns': columns, 'filters': filters}
+                        from src.logic.codegen import read_source_code
+                        st.session_state['history'].append(read_source_code(
+                            {'path': uploaded.name, 'format': 'parquet', 'read_kwargs': read_kwargs}))
+                        st.session_state['parquet_schema'] = None
                 elif uploaded.name.endswith('.parquet'):
                     df = data_io.load_parquet(uploaded, session_id=st.session_state['session_uid'])
                     st.session_state['history'].append(f"df = pd.read_parquet('{uploaded.name}')")
                 else:
                     st.error("対応していないファイル形式です")
                     df = None
+                st.session_state['memory_report'] = None
+                if df is not None and ingest_optimize:
+                    # 数値のダウンキャストと文字列列のカテゴリ/Arrow 文字列化（読み込み直後、バージョン 0 にする前に行う）
+                    df, st.session_state['memory_report'] = memory_optimizer.optimize_dtypes(df)
                 st.session_state['df'] = df
                 st.session_state['file_name'] = uploaded.name
+                # 読み込んだデータをバージョン 0 として履歴管理を開始する（前のデータの退避ファイルは削除する）
+                if st.session_state.get('versions') is not None:
+                    st.session_state['versions'].close()
+                st.session_state['versions'] = DatasetVersionStore(df, label=f"読み込み: {uploaded.name}") if df is not None else None
+                st.session_state['source'] = {
+                    'path': uploaded.name,
+                    'format': 'parquet' if uploaded.name.endswith('.parquet') else 'csv',
+                    'read_kwargs': read_kwargs,
+                }
                 if df is not None:
                     logger.info("Loaded file %s rows=%d cols=%d", uploaded.name, df.shape[0], df.shape[1])
         except Exception as e:
@@ -66,14 +149,67 @@ def main() -> None:
             logger.exception("データ読み込みエラー: %s", e)
             st.error(f"データ読み込みエラー: {e}")
 
+    # バックグラウンドで実行した変換の結果を反映する（以降の表示が新しいデータを使うよう先に行う）
+    import src.ui.forms as forms
+    forms.collect_transform_job()
+
+    # サイドバー：処理履歴（元に戻す・やり直し・バージョン移動）
+    store = st.session_state.get('versions')
+    if st.session_state['df'] is not None and store is not None:
+        action = sidebar.sidebar_version_controls(store.labels(), store.position, store.can_undo, store.can_redo)
+        if action is not None:
+            kind, pos = action
+            if kind == 'undo':
+                st.session_state['df'] = store.undo()
+            elif kind == 'redo':
+                st.session_state['df'] = store.redo()
+            else:
+                st.session_state['df'] = store.jump(store.versions[pos].id)
+            logger.info("Version %s: now v%d", kind, store.current_version.id)
+
     # サイドバー：データサイズ表示
     sidebar.sidebar_data_shape(st.session_state['df'])
+    # サイドバー：列ごとのメモリ使用量と保存形式の指定
+    if st.session_state['df'] is not None:
+        report = memory_optimizer.memory_report(st.session_state['df'], st.session_state.get('memory_report'),
+                                                token=store.token if store is not None else None)
+        override = sidebar.sidebar_memory_report(report, memory_optimizer.STORAGE_MODES)
+        if override is not None:
+            column, mode = override
+            label = f"保存形式: {column} → {memory_optimizer.STORAGE_MODES[mode]}"
+            if store is not None:
+                st.session_state['df'] = store.apply('memory_optimizer.set_column_storage', label=label, column=column, mode=mode)
+            else:
+                st.session_state['df'] = memory_optimizer.set_column_storage(st.session_state['df'], column, mode)
+            st.rerun()
+
+    # メモリ使用量の計上と予算の適用（使用量はログに出力し、予算を超えた場合はサイドバーで知らせる）
+    approx = st.session_state.get('approx_eda')
+    governor = memory_governor.get_governor()
+    governor.touch(st.session_state['session_uid'], store=st.session_state.get('versions'),
+                   frames=[st.session_state['df'], st.session_state.get('preview_df'),
+                           approx[1].sample if approx is not None else None],
+                   release=_memory_release_callback())
+    sidebar.sidebar_warnings(governor.enforce(st.session_state['session_uid']))
 
     # サイドバー：リセットボタン
     if sidebar.sidebar_reset_button():
+        if st.session_state.get('versions') is not None:
+            st.session_state['versions'].close()
         st.session_state['df'] = None
         st.session_state['file_name'] = ''
         st.session_state['history'] = []
+        st.session_state['versions'] = None
+        st.session_state['source'] = None
+        st.session_state['memory_report'] = None
+        st.session_state['parquet_schema'] = None
+        if st.session_state.get('transform_job') is not None:
+            from src.logic import jobs
+            jobs.get_executor().cancel(st.session_state['transform_job'])
+            st.session_state['transform_job'] = None
+        if st.session_state.get('approx_eda') is not None:
+            st.session_state['approx_eda'][1].cancel()
+            st.session_state['approx_eda'] = None
         logger.info("Session reset: session=%s", st.session_state.get('session_uid'))
         # Streamlit のバージョン差異に備え、互換的に再実行を試みる
         try:
@@ -91,29 +227,23 @@ def main() -> None:
                     st.stop()
 
     # サイドバー：ダウンロードボタン
+    # エンコードはボタン押下時にのみ行う（再実行のたびに CSV/Parquet を生成しない）
     if st.session_state['df'] is not None:
-        try:
-            csv_bytes = data_io.export_csv(st.session_state['df'])
-            sidebar.sidebar_download_button(
-                label="CSVダウンロード",
-                data=csv_bytes,
-                file_name="processed.csv",
-                mime="text/csv"
-            )
-            parquet_bytes = data_io.export_parquet(st.session_state['df'])
-            sidebar.sidebar_download_button(
-                label="Parquetダウンロード",
-                data=parquet_bytes,
-                file_name="processed.parquet",
-                mime="application/octet-stream"
-            )
-            try:
-                logger.info("Prepared exports: csv_bytes=%d parquet_bytes=%d", len(csv_bytes), len(parquet_bytes))
-            except Exception:
-                logger.info("Prepared exports")
-        except Exception as e:
-            logger.exception("エクスポートエラー: %s", e)
-            st.error(f"エクスポートエラー: {e}")
+        sidebar.sidebar_download_button(
+            label="CSVダウンロード",
+            data=exporter.deferred_export(st.session_state['df'], 'csv'),
+            file_name="processed.csv",
+            mime="text/csv"
+        )
+        sidebar.sidebar_download_button(
+            label="Parquetダウンロード",
+            data=exporter.deferred_export(st.session_state['df'], 'parquet'),
+            file_name="processed.parquet",
+            mime="application/octet-stream"
+        )
+
+    # 実行中のジョブの進捗（完了までポーリングで更新する）
+    forms.transform_job_status()
 
     tab1, tab2, tab3, tab4, tab5 = st.tabs([
         "データプレビュー", "EDA（探索的データ分析）", "クリーニング", "特徴量作成", "エクスポート"])
@@ -132,25 +262,74 @@ def main() -> None:
         if df is not None:
             import src.logic.eda as eda
             import src.ui.charts as charts
-            st.subheader("基本統計量")
-            st.dataframe(eda.describe_basic(df))
+            from src.logic.profile import DEFAULT_BINS, get_profile
+            token = store.token if store is not None else None
+            approx_mode = st.toggle(
+                "近似モード（大規模データ向け）", key="eda_approx",
+                help="抽出した行とスケッチで統計量を推定して即座に表示し、バックグラウンドで全行を集計して正確な値に近づけます。")
+            if approx_mode:
+                strat_options = [None] + [c for c in df.columns if not pd.api.types.is_numeric_dtype(df[c])]
+                stratify = st.selectbox("層化抽出に使う列（任意）", strat_options, key="eda_approx_stratify",
+                                        format_func=lambda c: "なし（一様抽出）" if c is None else str(c))
+                approx_key = (token, stratify)
+                cached = st.session_state.get('approx_eda')
+                if cached is None or cached[0] != approx_key or token is None:
+                    if cached is not None:
+                        cached[1].cancel()
+                    cached = (approx_key, eda.ApproxDescribe(df, stratify=stratify).start())
+                    st.session_state['approx_eda'] = cached
+                approx = cached[1]
+                charts.approx_stats_area(approx)
+                # グラフ・相関は抽出した行から描く
+                view_df, view_token = approx.sample, (f"{token}:sample:{stratify}" if token else None)
+                num_cols = approx.numeric_columns()
+                profile = None
+            else:
+                # 統計量は 1 回の走査でまとめて計算し、データのバージョンごとにキャッシュする
+                profile = get_profile(df, token=token)
+                st.subheader("基本統計量")
+                st.dataframe(eda.describe_basic(df, profile=profile))
 
-            st.subheader("欠損値情報")
-            st.dataframe(eda.missing_info(df))
+                st.subheader("欠損値情報")
+                st.dataframe(eda.missing_info(df, profile=profile))
+                view_df, view_token = df, token
+                num_cols = profile.numeric_columns()
 
             st.subheader("分布の可視化")
-            num_cols = df.select_dtypes(include=['number']).columns.tolist()
             if num_cols:
                 col = st.selectbox("ヒストグラム/箱ひげ図を表示する列を選択", num_cols, key="eda_numcol")
-                charts.plot_histogram(df, col)
-                charts.plot_box(df, col)
+                bins = st.slider("ビン数", min_value=5, max_value=200, value=DEFAULT_BINS, key="eda_bins")
+                if profile is not None and bins == DEFAULT_BINS:
+                    charts.plot_histogram_bins(*profile.histogram(col), col)
+                else:
+                    charts.plot_histogram(view_df, col, bins=bins, token=view_token)
+                charts.plot_box(view_df, col, token=view_token)
+                if len(num_cols) >= 2:
+                    sx, sy, sm = st.columns(3)
+                    x_col = sx.selectbox("散布図の X 軸", num_cols, key="eda_scatter_x")
+                    y_col = sy.selectbox("散布図の Y 軸", num_cols, index=1, key="eda_scatter_y")
+                    method = sm.radio("間引き方法", ['sample', 'lttb'], horizontal=True, key="eda_scatter_method",
+                                      format_func=lambda m: {'sample': '無作為抽出', 'lttb': 'LTTB（折れ線）'}[m])
+                    charts.plot_scatter(view_df, x_col, y_col, token=view_token, method=method)
             else:
                 st.info("数値列がありません")
 
             st.subheader("相関分析")
-            corr = eda.corr_matrix(df)
-            st.dataframe(corr)
-            charts.plot_corr_heatmap(corr)
+            from src.logic import correlation
+            corr_method = st.radio("相関係数", ['pearson', 'spearman'], horizontal=True, key="eda_corr_method",
+                                   format_func=lambda m: {'pearson': 'Pearson', 'spearman': 'Spearman（順位）'}[m])
+            corr = eda.corr_matrix(view_df, method=corr_method, token=view_token)
+            max_display = 30
+            if len(corr.columns) > max_display:
+                # 列数が多い場合は、相関の強いペアと、それらを含む列をクラスタ順に並べた部分行列だけを描画する
+                st.caption(f"数値列が {len(corr.columns)} 列あるため、相関の強い上位ペアと {max_display} 列の部分行列を表示します")
+                st.dataframe(correlation.top_pairs(corr, k=20))
+                charts.plot_corr_heatmap(correlation.clustered_submatrix(corr, max_columns=max_display))
+                with st.expander("相関係数行列（全体）"):
+                    st.dataframe(corr)
+            else:
+                st.dataframe(corr)
+                charts.plot_corr_heatmap(corr)
         else:
             st.info("データをアップロードしてください")
 
@@ -161,14 +340,14 @@ def main() -> None:
             import src.logic.cleaning as cleaning
             import src.ui.forms as forms
             num_cols = df.select_dtypes(include=['number']).columns.tolist()
-            obj_cols = df.select_dtypes(include=['object']).columns.tolist()
+            obj_cols = df.select_dtypes(include=['object', 'string']).columns.tolist()
             cat_cols = df.select_dtypes(include=['category']).columns.tolist()
             date_cols = df.select_dtypes(include=['datetime']).columns.tolist()
             forms.cleaning_form(df, num_cols, obj_cols, cat_cols, date_cols)
             # フォーム操作で `st.session_state['df']` が更新される可能性があるため
             # 最新の DataFrame をセッションから取得してプレビュー表示する
             df = st.session_state.get('df', df)
-            st.dataframe(df)
+            _show_frame(df)
         else:
             st.info("データをアップロードしてください")
 
@@ -179,14 +358,14 @@ def main() -> None:
             import src.logic.feature_engineering as feature
             import src.ui.forms as forms
             num_cols = df.select_dtypes(include=['number']).columns.tolist()
-            obj_cols = df.select_dtypes(include=['object']).columns.tolist()
+            obj_cols = df.select_dtypes(include=['object', 'string']).columns.tolist()
             cat_cols = df.select_dtypes(include=['category']).columns.tolist()
             date_cols = df.select_dtypes(include=['datetime']).columns.tolist()
             forms.feature_engineering_form(df, num_cols, obj_cols, cat_cols, date_cols)
             # フォームでエンコーディング等を実行すると `st.session_state['df']` が更新されるため
             # 最新の DataFrame を取得してプレビュー表示する
             df = st.session_state.get('df', df)
-            st.dataframe(df)
+            _show_frame(df)
         else:
             st.info("データをアップロードしてください")
 
@@ -197,8 +376,16 @@ def main() -> None:
         if df is not None:
             import src.logic.codegen as codegen
             import src.ui.export as export
-            code = codegen.generate_code(st.session_state.get('history', []))
-            export.code_export_area(code)
+            store = st.session_state.get('versions')
+            if store is not None:
+                # 記録された処理履歴（バージョンストア）からパイプライン IR を作り、コードを生成する
+                from src.logic.pipeline import Pipeline
+                pipeline = Pipeline.from_versions(store.lineage(), source=st.session_state.get('source'))
+                export.code_export_area(codegen.generate_pipeline_code(pipeline))
+                export.pipeline_export_area(pipeline.to_json())
+            else:
+                code = codegen.generate_code(st.session_state.get('history', []))
+                export.code_export_area(code)
             export.data_export_area(df)
         else:
             st.info("データをアップロードしてください")
@@ -0,0 +1,324 @@
+"""
+bench.py
+src/logic の主要な処理のベンチマーク（Streamlit 不要・オフラインで実行できる）
+合成データ（src/logic/synthetic.py）を行数ごとに生成し、各処理の実行時間と最大メモリ割り当て量を計測して
+JSON に保存する。保存済みの結果（別のコミットでの計測）と比べて、しきい値を超えて遅く・大きくなった処理を
+回帰として報告する。
+
+例:
+    dataset-builder-bench run --rows 1e5 1e6 -o bench.json
+    dataset-builder-bench run --rows 1e7 --cases cleaning. --baseline main.json --threshold 0.2
+    python -m src.bench compare main.json bench.json
+"""
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+import argparse
+import fnmatch
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from src.utils.frame import enable_copy_on_write
+from src.utils.logger import init_logger
+
+
+@dataclass(frozen=True)
+class BenchCase:
+    """1 つの計測対象
+    prepare … 計測しない前処理（データ → run に渡す入力。None なら合成データをそのまま渡す）
+    run … 計測する処理
+    """
+    run: Callable[[Any], Any]
+    prepare: Optional[Callable[[pd.DataFrame], Any]] = None
+
+
+def _numeric(df: pd.DataFrame) -> List[str]:
+    return [c for c in df.columns if c.startswith('f')]
+
+
+def _csv_bytes(df: pd.DataFrame) -> bytes:
+    from src.logic import data_io
+    return data_io.export_csv(df)
+
+
+def _load_csv(data: bytes) -> pd.DataFrame:
+    from src.logic import data_io
+    return data_io.load_csv(io.BytesIO(data))
+
+
+def _export_csv(df: pd.DataFrame) -> bytes:
+    from src.logic import data_io
+    return data_io.export_csv(df)
+
+
+def _describe_basic(df: pd.DataFrame) -> pd.DataFrame:
+    from src.logic import eda
+    return eda.describe_basic(df)
+
+
+def _corr(method: str) -> Callable[[pd.DataFrame], pd.DataFrame]:
+    def run(df: pd.DataFrame) -> pd.DataFrame:
+        from src.logic import eda
+        return eda.corr_matrix(df, method=method)
+    return run
+
+
+def _one_hot_encode(df: pd.DataFrame) -> pd.DataFrame:
+    from src.logic import feature_engineering
+    return feature_engineering.one_hot_encode(df, 'c0')
+
+
+def _drop_duplicates(df: pd.DataFrame) -> pd.DataFrame:
+    from src.logic import cleaning
+    return cleaning.drop_duplicates(df)
+
+
+def _fill_missing(df: pd.DataFrame) -> pd.DataFrame:
+    from src.logic import cleaning
+    return cleaning.fill_missing(df, None, '平均', columns=_numeric(df))
+
+
+def _clip_outliers_iqr(df: pd.DataFrame) -> pd.DataFrame:
+    from src.logic import cleaning
+    return cleaning.clip_outliers_iqr(df, None, columns=_numeric(df))
+
+
+def _standard_scale(df: pd.DataFrame) -> pd.DataFrame:
+    from src.logic import feature_engineering
+    return feature_engineering.standard_scale(df, None, columns=_numeric(df))
+
+
+def _label_encode(df: pd.DataFrame) -> pd.DataFrame:
+    from src.logic import feature_engineering
+    return feature_engineering.label_encode(df, 's0')
+
+
+def _parse_dates(df: pd.DataFrame) -> pd.Series:
+    from src.logic import datetimes
+    return datetimes.parse(df['d0'], cache=False)
+
+
+def _parsed_dates(df: pd.DataFrame) -> pd.DataFrame:
+    from src.logic import datetimes
+    return df.assign(d0=datetimes.parse(df['d0'], cache=False))
+
+
+def _extract_date_features(df: pd.DataFrame) -> pd.DataFrame:
+    from src.logic import datetimes, feature_engineering
+    return feature_engineering.extract_date_features(df, 'd0', list(datetimes.PARTS))
+
+
+def _optimize_memory(df: pd.DataFrame) -> Any:
+    from src.logic import memory_optimizer
+    return memory_optimizer.optimize_dtypes(df)
+
+
+CASES: Dict[str, BenchCase] = {
+    'data_io.load_csv': BenchCase(_load_csv, prepare=_csv_bytes),
+    'data_io.export_csv': BenchCase(_export_csv),
+    'eda.describe_basic': BenchCase(_describe_basic),
+    'eda.corr_matrix[pearson]': BenchCase(_corr('pearson')),
+    'eda.corr_matrix[spearman]': BenchCase(_corr('spearman')),
+    'feature_engineering.one_hot_encode': BenchCase(_one_hot_encode),
+    'feature_engineering.label_encode': BenchCase(_label_encode),
+    'feature_engineering.standard_scale': BenchCase(_standard_scale),
+    'feature_engineering.extract_date_features': BenchCase(_extract_date_features, prepare=_parsed_dates),
+    'datetimes.parse': BenchCase(_parse_dates),
+    'cleaning.drop_duplicates': BenchCase(_drop_duplicates),
+    'cleaning.fill_missing': BenchCase(_fill_missing),
+    'cleaning.clip_outliers_iqr': BenchCase(_clip_outliers_iqr),
+    'memory_optimizer.optimize_dtypes': BenchCase(_optimize_memory),
+}
+
+
+def select_cases(patterns: Optional[List[str]]) -> List[str]:
+    """名前の接頭辞または glob パターン（例: 'cleaning.', 'eda.*'）に一致する計測対象"""
+    if not patterns:
+        return list(CASES)
+    return [name for name in CASES
+            if any(name.startswith(p) or fnmatch.fnmatchcase(name, p) for p in patterns)]
+
+
+def measure(case: BenchCase, df: pd.DataFrame, repeat: int) -> Dict[str, Any]:
+    """実行時間（repeat 回の最小・中央値）と、別の 1 回を tracemalloc で追跡した最大割り当て量
+    割り当て量は Python と NumPy（pandas の列を含む）の分で、Arrow のバッファは含まない。
+    """
+    arg = case.prepare(df) if case.prepare is not None else df
+    times = []
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        case.run(arg)
+        times.append(time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        case.run(arg)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds_min': min(times), 'seconds_median': statistics.median(times), 'repeat': len(times),
+            'peak_bytes': int(peak)}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    return {'commit': _git_commit(), 'python': platform.python_version(), 'pandas': pd.__version__,
+            'numpy': np.__version__, 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def run_benchmarks(rows_list: List[int], names: List[str], repeat: int = 3,
+                   spec_kwargs: Optional[Dict[str, Any]] = None,
+                   progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """行数ごとに合成データを生成して各処理を計測し、JSON にできる結果を返す"""
+    from src.logic.synthetic import SyntheticSpec, generate
+    results = []
+    for rows in rows_list:
+        spec = SyntheticSpec(rows=rows, **(spec_kwargs or {}))
+        df = generate(spec)
+        for name in names:
+            try:
+                record = {'name': name, 'rows': rows, 'cols': df.shape[1], **measure(CASES[name], df, repeat)}
+            except Exception as e:  # 1 つの処理の失敗で全体を止めない
+                record = {'name': name, 'rows': rows, 'cols': df.shape[1], 'error': f'{type(e).__name__}: {e}'}
+            results.append(record)
+            if progress is not None:
+                progress(record)
+        del df
+    spec = {k: v for k, v in SyntheticSpec(**(spec_kwargs or {})).to_dict().items() if k != 'rows'}
+    return {'environment': environment(), 'spec': spec, 'results': results}
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float,
+            min_seconds: float = 0.01) -> List[Dict[str, Any]]:
+    """同じ処理・行数の結果を比べ、実行時間（最小値）または最大割り当て量が (1 + threshold) 倍を超えたものを返す
+    どちらの実行時間も min_seconds 未満の計測は誤差が大きいため時間の比較から除く。
+    """
+    base = {(r['name'], r['rows']): r for r in baseline.get('results', []) if 'error' not in r}
+    regressions = []
+    for r in current.get('results', []):
+        b = base.get((r['name'], r['rows']))
+        if b is None or 'error' in r:
+            continue
+        for metric in ('seconds_min', 'peak_bytes'):
+            old, new = b[metric], r[metric]
+            if metric == 'seconds_min' and max(old, new) < min_seconds:
+                continue
+            if old > 0 and new > old * (1 + threshold):
+                regressions.append({'name': r['name'], 'rows': r['rows'], 'metric': metric,
+                                    'baseline': old, 'current': new, 'ratio': new / old})
+    return regressions
+
+
+def _rows(value: str) -> int:
+    """'1e6' や '1_000_000' 形式の行数"""
+    return int(float(value.replace('_', '')))
+
+
+def _format(record: Dict[str, Any]) -> str:
+    if 'error' in record:
+        return f"{record['name']:<44} {record['rows']:>12,}  ERROR {record['error']}"
+    return (f"{record['name']:<44} {record['rows']:>12,}  {record['seconds_min']:>9.4f}s  "
+            f"{record['seconds_median']:>9.4f}s  {record['peak_bytes'] / 1024 ** 2:>9.1f} MB")
+
+
+def _report(regressions: List[Dict[str, Any]], threshold: float) -> None:
+    if not regressions:
+        print(f'no regressions (threshold {threshold:.0%})')
+        return
+    print(f'{len(regressions)} regressions (threshold {threshold:.0%}):', file=sys.stderr)
+    for r in regressions:
+        print(f"  {r['name']} rows={r['rows']:,} {r['metric']}: {r['baseline']:.4g} -> {r['current']:.4g} "
+              f"(x{r['ratio']:.2f})", file=sys.stderr)
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='dataset-builder-bench',
+                                     description='src/logic の処理を合成データで計測し、結果を比較します。')
+    sub = parser.add_subparsers(dest='command', required=True)
+    run = sub.add_parser('run', help='計測して結果を表示・保存する')
+    run.add_argument('--rows', nargs='+', type=_rows, default=[100_000, 1_000_000],
+                     help='行数（複数指定可。既定: 1e5 1e6）')
+    run.add_argument('--cases', nargs='*', help='計測する処理の接頭辞または glob パターン（既定: すべて）')
+    run.add_argument('--repeat', type=int, default=3, help='実行時間の計測回数（既定: 3）')
+    run.add_argument('--numeric', type=int, default=4, help='float 列の数')
+    run.add_argument('--integer', type=int, default=2, help='int 列の数')
+    run.add_argument('--categorical', type=int, default=2, help='カテゴリ列の数')
+    run.add_argument('--strings', type=int, default=1, help='文字列列の数')
+    run.add_argument('--dates', type=int, default=1, help='日付（文字列）列の数')
+    run.add_argument('--null-ratio', type=float, default=0.05, help='欠損率')
+    run.add_argument('--cardinality', type=int, default=100, help='カテゴリ・文字列の値の種類数')
+    run.add_argument('--duplicate-ratio', type=float, default=0.01, help='重複行の割合')
+    run.add_argument('--seed', type=int, default=0, help='乱数のシード')
+    run.add_argument('-o', '--output', help='結果の JSON の保存先')
+    run.add_argument('--baseline', help='比較する保存済みの結果（JSON）')
+    run.add_argument('--threshold', type=float, default=0.2, help='回帰とみなす悪化の割合（既定: 0.2 = 20%%）')
+    run.add_argument('--list', action='store_true', help='計測対象の一覧を表示して終了する')
+    cmp_ = sub.add_parser('compare', help='保存済みの 2 つの結果を比較する')
+    cmp_.add_argument('baseline', help='基準の結果（JSON）')
+    cmp_.add_argument('current', help='比較する結果（JSON）')
+    cmp_.add_argument('--threshold', type=float, default=0.2, help='回帰とみなす悪化の割合（既定: 0.2 = 20%%）')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    init_logger(to_stdout=False)
+    enable_copy_on_write()
+
+    if args.command == 'compare':
+        regressions = compare(_load(args.baseline), _load(args.current), args.threshold)
+        _report(regressions, args.threshold)
+        return 1 if regressions else 0
+
+    names = select_cases(args.cases)
+    if args.list:
+        print('\n'.join(names))
+        return 0
+    if not names:
+        print('no benchmark cases matched', file=sys.stderr)
+        return 2
+    # 永続データセットキャッシュ（load_csv の 2 回目以降がキャッシュから読まれる）を使わない
+    os.environ['DATASET_CACHE_MAX_MB'] = '0'
+    os.environ.setdefault('CACHE_DIR', tempfile.mkdtemp(prefix='dataset-builder-bench-'))
+    spec_kwargs = {'numeric': args.numeric, 'integer': args.integer, 'categorical': args.categorical,
+                   'strings': args.strings, 'dates': args.dates, 'null_ratio': args.null_ratio,
+                   'cardinality': args.cardinality, 'duplicate_ratio': args.duplicate_ratio, 'seed': args.seed}
+    print(f"{'case':<44} {'rows':>12}  {'min':>10}  {'median':>10}  {'peak':>12}")
+    result = run_benchmarks(args.rows, names, args.repeat, spec_kwargs, progress=lambda r: print(_format(r)))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f'saved {args.output}')
+    failed = sum('error' in r for r in result['results'])
+    if args.baseline:
+        regressions = compare(_load(args.baseline), result, args.threshold)
+        _report(regressions, args.threshold)
+        if regressions:
+            return 1
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+cli.py
+dataset-builder のバッチ実行エントリポイント（Streamlit 不要）
+アプリの「エクスポート」タブで保存したパイプライン JSON を、複数の CSV/Parquet ファイルに適用する。
+
+例:
+    dataset-builder pipeline.json "data/2024-*/*.csv" -o out/ -j 8
+    python -m src.cli pipeline.json "data/**/*.parquet" -o out/
+"""
+from typing import List, Optional
+import argparse
+import sys
+import time
+from src.logic.batch import default_chunk_rows, expand_inputs, run_batch
+from src.logic.pipeline import Pipeline
+from src.utils.frame import enable_copy_on_write
+from src.utils.logger import init_logger
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='dataset-builder',
+        description='保存済みパイプラインを CSV/Parquet ファイル群に適用し、Parquet で出力します。')
+    parser.add_argument('pipeline', help='パイプライン JSON ファイル')
+    parser.add_argument('inputs', nargs='+', help='入力ファイルの glob パターン（`**` で再帰）')
+    parser.add_argument('-o', '--output-dir', required=True, help='出力先ディレクトリ')
+    parser.add_argument('-j', '--workers', type=int, default=0,
+                        help='並列プロセス数（既定: 環境変数 BATCH_WORKERS または CPU 数）')
+    parser.add_argument('--chunk-rows', type=int, default=0,
+                        help=f'ストリーミング実行時のチャンク行数（既定: {default_chunk_rows():,}）')
+    parser.add_argument('--inexact', action='store_true',
+                        help='行フィルタをデータ依存の操作より前に移動する最適化を許可する（結果が変わる場合がある）')
+    parser.add_argument('--skip-existing', action='store_true', help='出力ファイルが既にある入力をスキップする')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    init_logger(to_stdout=False)
+    enable_copy_on_write()
+
+    pipeline = Pipeline.load(args.pipeline)
+    inputs = expand_inputs(args.inputs)
+    if not inputs:
+        print('no input files matched', file=sys.stderr)
+        return 2
+    print(f'{len(inputs)} files, {len(pipeline.steps)} steps -> {args.output_dir}')
+
+    started = time.perf_counter()
+    done = failed = skipped = 0
+    rows = nbytes = 0
+    for r in run_batch(pipeline, inputs, args.output_dir, workers=args.workers, chunk_rows=args.chunk_rows,
+                       exact=not args.inexact, skip_existing=args.skip_existing):
+        if r.skipped:
+            skipped += 1
+            print(f'SKIP  {r.input} (exists: {r.output})')
+            continue
+        if r.error:
+            failed += 1
+            print(f'FAIL  {r.input}: {r.error}', file=sys.stderr)
+            continue
+        done += 1
+        rows += r.rows_in
+        nbytes += r.bytes_in
+        mode = 'stream' if r.streamed else 'memory'
+        print(f'OK    {r.input} -> {r.output}  rows {r.rows_in:,} -> {r.rows_out:,}  '
+              f'{r.seconds:.2f}s  {r.mb_per_s:.1f} MB/s  {r.rows_per_s:,.0f} rows/s  [{mode}]')
+
+    elapsed = time.perf_counter() - started
+    print(f'done: {done} ok, {failed} failed, {skipped} skipped in {elapsed:.2f}s  '
+          f'({nbytes / 1024 ** 2 / elapsed if elapsed else 0:.1f} MB/s, {rows / elapsed if elapsed else 0:,.0f} rows/s overall)')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
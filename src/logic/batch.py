@@ -0,0 +1,282 @@
+"""
+batch.py
+記録済みパイプラインを複数ファイルへ一括適用するバッチ処理（Streamlit 非依存）
+行ローカルな操作だけからなるパイプラインは、ファイルをチャンク単位で読み込み・変換・Parquet 書き出しし、
+ファイル全体をメモリに載せない。学習済みのパラメータを持たないスケーリング・ラベルエンコーディングは、
+大きなファイルではチャンクごとの partial_fit で先に学習してからチャンク単位で実行する。重複削除も、大きな
+ファイルでは 1 回目の読み込みで行ハッシュから重複を求め、2 回目の読み込みで除きながら書き出す。それ以外の統計量を
+学習する操作（平均補完等）を含む場合は、必要な列だけをファイル単位で読み込んで実行する。
+ファイルごとの処理はプロセスプールで並列に実行する。
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+import glob
+import os
+import time
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.logic import dedup, exporter, parquet_reader, transforms
+from src.logic.pipeline import (Pipeline, Step, eliminate_dead_steps, execute_plan, is_streamable, op_spec, optimize,
+                                parquet_columns, read_source, required_columns, source_format)
+from src.utils.frame import dense_view, enable_copy_on_write
+from src.utils.logger import get_logger, init_logger
+from src.utils.settings import get_int_env
+
+logger = get_logger(__name__)
+
+
+def default_chunk_rows() -> int:
+    return get_int_env('BATCH_CHUNK_ROWS', 250_000)
+
+
+def _available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # sched_getaffinity が無い OS
+        return os.cpu_count() or 1
+
+
+@dataclass
+class FileResult:
+    """1 ファイル分の処理結果（件数・所要時間・スループット）"""
+    input: str
+    output: str
+    rows_in: int = 0
+    rows_out: int = 0
+    bytes_in: int = 0
+    seconds: float = 0.0
+    streamed: bool = False
+    skipped: bool = False
+    error: Optional[str] = None
+
+    @property
+    def mb_per_s(self) -> float:
+        return self.bytes_in / 1024 ** 2 / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def rows_per_s(self) -> float:
+        return self.rows_in / self.seconds if self.seconds > 0 else 0.0
+
+
+def expand_inputs(patterns: List[str]) -> List[str]:
+    """glob パターン（`**` 可）を展開し、重複を除いてソートした入力ファイル一覧を返す"""
+    paths: Set[str] = set()
+    for pattern in patterns:
+        paths.update(p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p))
+    return sorted(paths)
+
+
+def output_paths(inputs: List[str], output_dir: str) -> Dict[str, str]:
+    """入力ごとの出力 Parquet パス（入力の共通ディレクトリからの相対構成を保ち、同名ファイルの衝突を避ける）"""
+    if not inputs:
+        return {}
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in inputs])
+    return {p: os.path.join(output_dir, os.path.splitext(os.path.relpath(os.path.abspath(p), root))[0] + '.parquet')
+            for p in inputs}
+
+
+def iter_source_chunks(path: str, source: Dict[str, Any], chunk_rows: int,
+                       columns: Optional[Set[str]] = None) -> Iterator[pd.DataFrame]:
+    """入力ファイルを chunk_rows 行ずつの DataFrame として読み込む（columns 指定時はその列だけ）"""
+    if source_format(path, source) == 'parquet':
+        # 読み込み設定の列・フィルタで射影と行グループの絞り込みを行う
+        yield from parquet_reader.iter_batches(path, columns=parquet_columns(path, source, columns),
+                                               filters=(source.get('read_kwargs') or {}).get('filters'),
+                                               batch_rows=chunk_rows)
+        return
+    kwargs = dict(source.get('read_kwargs') or {})
+    if columns is not None:
+        kwargs['usecols'] = lambda c: c in columns
+    with pd.read_csv(path, chunksize=chunk_rows, **kwargs) as reader:
+        yield from reader
+
+
+# 学習済みのパラメータが無くてもチャンクごとの partial_fit で学習できる操作 → 変換の種類
+FITTABLE_OPS = {
+    'feature_engineering.standard_scale': 'standard',
+    'feature_engineering.minmax_scale': 'minmax',
+    'feature_engineering.label_encode': 'label',
+}
+
+
+def two_pass_min_bytes() -> int:
+    """先にチャンク単位の読み込み（学習・重複の検出）を行ってからストリーミング実行するファイルの大きさの下限"""
+    return get_int_env('BATCH_TWO_PASS_MIN_MB', 256) * 1024 ** 2
+
+
+def fit_streaming(pipeline: Pipeline, path: str, chunk_rows: int) -> Optional[Pipeline]:
+    """学習していないスケーリング等を、手前のステップを適用したチャンクの partial_fit で学習し、
+    全ステップが行ローカルになったパイプラインを返す（学習できない操作がある場合は None）
+    学習する操作ごとにファイルを 1 回チャンク単位で読む。
+    """
+    steps = list(pipeline.steps)
+    for i, step in enumerate(steps):
+        if op_spec(step).row_local(step.params):
+            continue
+        kind = FITTABLE_OPS.get(step.op)
+        if kind is None:
+            return None
+        columns = list(step.params['columns']) if step.params.get('columns') else [step.params['column']]
+        # 学習する列に寄与しない手前のステップは実行しない（必要な列だけを読む）
+        prefix = eliminate_dead_steps(steps[:i], columns)
+        chunks = (execute_plan(chunk, prefix) for chunk in iter_source_chunks(
+            path, pipeline.source, chunk_rows, required_columns(prefix, columns)))
+        fitted = transforms.fit_chunks(kind, chunks, columns)
+        params = fitted.params if step.params.get('columns') else fitted.column_params(columns[0])
+        steps[i] = Step(step.op, {**step.params, **params})
+    return Pipeline(steps=steps, source=pipeline.source, outputs=pipeline.outputs)
+
+
+def split_dedup(steps: List[Step]) -> Optional[Tuple[List[Step], Step, List[Step]]]:
+    """重複削除 1 つと行ローカルな操作だけからなる場合の (手前のステップ, 重複削除, 後ろのステップ)"""
+    positions = [i for i, step in enumerate(steps) if step.op == 'cleaning.drop_duplicates']
+    if len(positions) != 1:
+        return None
+    i = positions[0]
+    if not is_streamable(steps[:i] + steps[i + 1:]):
+        return None
+    return steps[:i], steps[i], steps[i + 1:]
+
+
+def _write_dedup_streaming(pipeline: Pipeline, path: str, chunk_rows: int, dest: str, result: FileResult) -> bool:
+    """手前のステップを適用したチャンクの行ハッシュで全体の重複を求め、2 回目の読み込みで重複行を除きながら
+    後ろのステップを適用して書き出す（ファイル全体をメモリに載せない）
+    """
+    prefix, step, suffix = split_dedup(pipeline.steps)
+    columns = required_columns(pipeline.steps, pipeline.outputs)
+    reads = rows_in = 0
+
+    def read_chunks() -> Iterator[pd.DataFrame]:
+        nonlocal reads, rows_in
+        reads += 1
+        for chunk in iter_source_chunks(path, pipeline.source, chunk_rows, columns):
+            if reads == 1:
+                rows_in += len(chunk)
+            yield execute_plan(chunk, prefix)
+
+    chunks = dedup.iter_drop_duplicates(read_chunks, step.params.get('subset'), step.params.get('keep', 'first'))
+    plan = optimize(Pipeline(steps=suffix, source=pipeline.source, outputs=pipeline.outputs))
+    streamed = _write_streaming(chunks, plan, pipeline.outputs, dest, result)
+    result.rows_in = rows_in
+    return streamed
+
+
+class _SchemaDrift(Exception):
+    """後続チャンクの型が先頭チャンクから推論したスキーマに変換できない"""
+
+
+def _write_streaming(chunks: Iterator[pd.DataFrame], plan: List[Any], outputs: Optional[List[str]],
+                     dest: str, result: FileResult) -> bool:
+    """チャンクごとにパイプラインを適用して行グループとして書き出す（チャンクが無ければ False）"""
+    writer = None
+    try:
+        for chunk in chunks:
+            result.rows_in += len(chunk)
+            df = execute_plan(chunk, plan, outputs)
+            table = pa.Table.from_pandas(dense_view(df), preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(dest, table.schema)
+            elif not table.schema.equals(writer.schema):
+                try:
+                    table = table.cast(writer.schema)
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError, ValueError) as e:
+                    raise _SchemaDrift(str(e)) from e
+            writer.write_table(table)
+            result.rows_out += len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+    return writer is not None
+
+
+def process_file(pipeline_dict: Dict[str, Any], path: str, output: str,
+                 chunk_rows: int = 0, exact: bool = True) -> FileResult:
+    """1 ファイルにパイプラインを適用して Parquet で書き出す（プロセスプールのワーカーで実行される）"""
+    pipeline = Pipeline.from_dict(pipeline_dict)
+    result = FileResult(input=path, output=output, bytes_in=os.path.getsize(path))
+    start = time.perf_counter()
+    plan = optimize(pipeline, exact=exact)
+    columns = required_columns(pipeline.steps, pipeline.outputs)
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    tmp = f'{output}.{uuid.uuid4().hex}.tmp'
+    try:
+        two_pass = not is_streamable(pipeline.steps) and result.bytes_in >= two_pass_min_bytes()
+        if two_pass:
+            fitted = fit_streaming(pipeline, path, chunk_rows or default_chunk_rows())
+            if fitted is not None:
+                logger.info("batch: fitted %s over chunks, streaming", path)
+                pipeline, plan = fitted, optimize(fitted, exact=exact)
+        dedup_split = two_pass and not is_streamable(pipeline.steps) and split_dedup(pipeline.steps) is not None
+        if is_streamable(pipeline.steps) or dedup_split:
+            try:
+                if dedup_split:
+                    result.streamed = _write_dedup_streaming(pipeline, path, chunk_rows or default_chunk_rows(),
+                                                             tmp, result)
+                else:
+                    result.streamed = _write_streaming(
+                        iter_source_chunks(path, pipeline.source, chunk_rows or default_chunk_rows(), columns),
+                        plan, pipeline.outputs, tmp, result)
+            except _SchemaDrift as e:
+                # 先頭チャンクが全欠損の列など、チャンク間で型が揺れる場合はファイル単位の実行でやり直す
+                logger.info("batch: schema drift in %s (%s), retrying in memory", path, e)
+                result.streamed = False
+            if not result.streamed:
+                result.rows_in = result.rows_out = 0
+        if not result.streamed:
+            df = read_source(path, pipeline.source, columns)
+            result.rows_in = len(df)
+            df = execute_plan(df, plan, pipeline.outputs)
+            result.rows_out = len(df)
+            with open(tmp, 'wb') as f:
+                exporter.write_parquet(df, f)
+        os.replace(tmp, output)
+    except Exception as e:
+        # 1 ファイルの失敗でバッチ全体を止めない（結果に記録して呼び出し側で集計する）
+        logger.exception("batch: failed %s", path)
+        result.error = f'{type(e).__name__}: {e}'
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    result.seconds = time.perf_counter() - start
+    logger.info("batch: %s rows_in=%d rows_out=%d seconds=%.3f streamed=%s",
+                path, result.rows_in, result.rows_out, result.seconds, result.streamed)
+    return result
+
+
+def _init_worker(arrow_threads: int) -> None:
+    init_logger(to_stdout=False)
+    enable_copy_on_write()
+    # ワーカー数 × Arrow スレッド数（列・行チャンクの並列数）が CPU 数を超えないようにする
+    pa.set_cpu_count(arrow_threads)
+    os.environ.setdefault('PARALLEL_WORKERS', str(arrow_threads))
+
+
+def run_batch(pipeline: Pipeline, inputs: List[str], output_dir: str, workers: int = 0,
+              chunk_rows: int = 0, exact: bool = True, skip_existing: bool = False) -> Iterator[FileResult]:
+    """入力ファイル群にパイプラインを並列適用し、完了したファイルから順に結果を返す
+    workers=1 の場合はプロセスを起動せず、呼び出し元のプロセスで順に実行する。
+    """
+    targets = output_paths(inputs, output_dir)
+    pending = []
+    for path, output in targets.items():
+        if skip_existing and os.path.exists(output):
+            yield FileResult(input=path, output=output, skipped=True)
+        else:
+            pending.append((path, output))
+    if not pending:
+        return
+    cpus = _available_cpus()
+    workers = min(workers or get_int_env('BATCH_WORKERS', cpus), len(pending))
+    spec = pipeline.to_dict()
+    if workers <= 1:
+        for path, output in pending:
+            yield process_file(spec, path, output, chunk_rows, exact)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(max(1, cpus // workers),)) as pool:
+        futures = [pool.submit(process_file, spec, path, output, chunk_rows, exact) for path, output in pending]
+        for future in as_completed(futures):
+            yield future.result()
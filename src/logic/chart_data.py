@@ -0,0 +1,145 @@
+"""
+chart_data.py
+グラフ描画用データのサーバー側集計
+ヒストグラムは NumPy で度数を計算し、箱ひげ図は四分位数・ひげ・上限付きの外れ値サンプルだけを、
+散布図・折れ線は LTTB またはランダムサンプリングで間引いた点だけを返す。
+ブラウザへ送るデータ量は行数によらず上限（`CHART_MAX_POINTS` 等）で抑えられる。
+結果は (データセットのバージョン, 列, パラメータ) ごとにキャッシュする。
+"""
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+from src.utils.cache import DerivedCache
+from src.utils.logger import get_logger
+from src.utils.settings import get_int_env
+
+logger = get_logger(__name__)
+
+MAX_BINS = 500
+_cache = DerivedCache(128, 'CHART_CACHE_ENTRIES')
+
+
+def max_points() -> int:
+    """散布図・折れ線で描画する点数の上限"""
+    return get_int_env('CHART_MAX_POINTS', 5000)
+
+
+def max_outliers() -> int:
+    """箱ひげ図で個別に描画する外れ値の上限"""
+    return get_int_env('CHART_MAX_OUTLIERS', 1000)
+
+
+def _finite_values(s: pd.Series) -> np.ndarray:
+    if pd.api.types.is_datetime64_any_dtype(s):
+        values = s.to_numpy(dtype='datetime64[ns]').view(np.int64)
+        return values[values != np.iinfo(np.int64).min].astype(np.float64)
+    values = s.to_numpy(dtype=np.float64, na_value=np.nan)
+    return values[np.isfinite(values)]
+
+
+def _key(token: Optional[str], *parts: Any) -> Optional[Tuple[Any, ...]]:
+    return None if token is None else (token,) + parts
+
+
+# --- ヒストグラム ---
+
+def histogram(df: pd.DataFrame, column: Any, bins: int = 30, token: Optional[str] = None) -> Dict[str, Any]:
+    """等幅ビンの度数 {'counts', 'edges', 'n'} を返す（ビン数は MAX_BINS まで）"""
+    bins = int(min(max(bins, 1), MAX_BINS))
+
+    def compute() -> Dict[str, Any]:
+        values = _finite_values(df[column])
+        if len(values) == 0:
+            return {'counts': np.zeros(0, dtype=np.int64), 'edges': np.zeros(0), 'n': 0}
+        counts, edges = np.histogram(values, bins=bins, range=(float(values.min()), float(values.max())))
+        return {'counts': counts, 'edges': edges, 'n': int(len(values))}
+
+    return _cache.get_or_compute(_key(token, 'histogram', column, bins), compute)
+
+
+# --- 箱ひげ図 ---
+
+def box_stats(df: pd.DataFrame, column: Any, token: Optional[str] = None, seed: int = 0) -> Dict[str, Any]:
+    """四分位数・平均・ひげ（1.5×IQR 以内の最も外側の値）と外れ値サンプルを返す
+    外れ値は `CHART_MAX_OUTLIERS` 件を上限に無作為抽出する（最小値・最大値は必ず含める）。
+    """
+    limit = max_outliers()
+
+    def compute() -> Dict[str, Any]:
+        values = _finite_values(df[column])
+        if len(values) == 0:
+            return {'n': 0}
+        q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        lo_fence, hi_fence = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+        inside = (values >= lo_fence) & (values <= hi_fence)
+        outliers = values[~inside]
+        n_outliers = len(outliers)
+        if n_outliers > limit:
+            rng = np.random.default_rng(seed)
+            pick = rng.choice(n_outliers, size=max(limit - 2, 0), replace=False)
+            outliers = np.concatenate([outliers[pick], [outliers.min(), outliers.max()]])
+        return {
+            'n': int(len(values)), 'q1': float(q1), 'median': float(median), 'q3': float(q3),
+            'mean': float(values.mean()),
+            'lower': float(values[inside].min()), 'upper': float(values[inside].max()),
+            'outliers': outliers, 'n_outliers': int(n_outliers),
+        }
+
+    return _cache.get_or_compute(_key(token, 'box', column, limit, seed), compute)
+
+
+# --- 散布図・折れ線の間引き ---
+
+def sample_indices(n: int, k: int, seed: int = 0) -> np.ndarray:
+    """0..n-1 から k 個を非復元で一様抽出した昇順のインデックス（リザーバサンプリングと同じ分布）"""
+    if n <= k:
+        return np.arange(n)
+    rng = np.random.default_rng(seed)
+    return np.sort(rng.choice(n, size=k, replace=False))
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets で残す点のインデックスを返す（x は昇順であること）
+    各バケットから、前に選んだ点と次のバケットの平均点とで作る三角形の面積が最大になる点を選ぶ。
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        nxt_start, nxt_end = end, (edges[i + 2] if i + 2 < len(edges) else n)
+        nxt_end = max(nxt_end, nxt_start + 1)
+        avg_x, avg_y = x[nxt_start:nxt_end].mean(), y[nxt_start:nxt_end].mean()
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[prev] - avg_x) * (by - y[prev]) - (x[prev] - bx) * (avg_y - y[prev]))
+        prev = start + int(np.argmax(area))
+        out[i + 1] = prev
+    return out
+
+
+def scatter_points(df: pd.DataFrame, x: Any, y: Any, token: Optional[str] = None,
+                   method: str = 'sample', seed: int = 0) -> Dict[str, Any]:
+    """散布図用に間引いた点 {'x', 'y', 'n'} を返す
+    method='sample' は一様サンプリング、'lttb' は x で並べた折れ線の形を保つ間引き。
+    """
+    limit = max_points()
+
+    def compute() -> Dict[str, Any]:
+        xs = df[x].to_numpy(dtype=np.float64, na_value=np.nan)
+        ys = df[y].to_numpy(dtype=np.float64, na_value=np.nan)
+        mask = np.isfinite(xs) & np.isfinite(ys)
+        xs, ys = xs[mask], ys[mask]
+        if method == 'lttb':
+            order = np.argsort(xs, kind='stable')
+            xs, ys = xs[order], ys[order]
+            idx = lttb_indices(xs, ys, limit)
+        else:
+            idx = sample_indices(len(xs), limit, seed)
+        return {'x': xs[idx], 'y': ys[idx], 'n': int(len(xs))}
+
+    return _cache.get_or_compute(_key(token, 'scatter', x, y, method, limit, seed), compute)
@@ -2,31 +2,47 @@
 cleaning.py
 型変換、欠損値・重複・外れ値処理
 """
-from typing import Optional, Any
+from typing import Optional, Any, Dict, List
 import pandas as pd
 import numpy as np
+from src.logic import datetimes, dedup, parallel
 from src.utils.logger import get_logger
-try:
-    import streamlit as st
-    _session_uid = st.session_state.get('session_uid') if hasattr(st, 'session_state') else None
-except Exception:
-    _session_uid = None
+from src.utils.frame import shallow_copy
+logger = get_logger(__name__)
 
-logger = get_logger(__name__, session_uid=_session_uid)
-
-def convert_dtype(df: pd.DataFrame, column: str, dtype: str) -> pd.DataFrame:
-    """指定列の型変換"""
-    df = df.copy()
+def convert_dtype_column(s: pd.Series, dtype: str) -> pd.Series:
+    """1 列の型変換（列単位の処理。パイプラインの融合実行でも使う）"""
     if dtype == '数値':
-        df[column] = pd.to_numeric(df[column], errors='coerce')
+        return pd.to_numeric(s, errors='coerce')
     elif dtype == '文字列':
-        df[column] = df[column].astype(str)
+        return s.astype(str)
     elif dtype == 'カテゴリ':
-        df[column] = df[column].astype('category')
+        return s.astype('category')
     elif dtype == '日付':
-        df[column] = pd.to_datetime(df[column], errors='coerce')
+        return datetimes.parse(s)
+    return s
+
+def _targets(column: Optional[Any], columns: Optional[List[Any]]) -> List[Any]:
+    """処理対象の列（columns を渡すと複数列、無ければ column の 1 列）"""
+    return list(columns) if columns else [column]
+
+def _assign(df: pd.DataFrame, values: Dict[Any, pd.Series]) -> pd.DataFrame:
+    """変換後の列をまとめて 1 つの新しいフレームに反映する（他の列はコピーしない）"""
+    df = shallow_copy(df)
+    for column, s in values.items():
+        df[column] = s
+    return df
+
+def convert_dtype_columns(df: pd.DataFrame, columns: List[Any], dtype: str) -> Dict[Any, pd.Series]:
+    """複数列の型変換（列のグループごとに並列に実行する）"""
+    return parallel.map_columns(lambda cols: {c: convert_dtype_column(df[c], dtype) for c in cols}, columns, len(df))
+
+def convert_dtype(df: pd.DataFrame, column: Optional[str], dtype: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """指定列の型変換（columns を渡すと複数列をまとめて変換する）"""
+    columns = _targets(column, columns)
+    df = _assign(df, convert_dtype_columns(df, columns, dtype))
     try:
-        logger.info("convert_dtype: column=%s dtype=%s", column, dtype)
+        logger.info("convert_dtype: columns=%s dtype=%s", columns, dtype)
     except Exception:
         pass
     return df
@@ -38,44 +54,128 @@ def drop_missing(df: pd.DataFrame, axis: int = 0) -> pd.DataFrame:
     logger.info("drop_missing: after_rows=%d", res.shape[0])
     return res
 
-def fill_missing(df: pd.DataFrame, column: str, method: str, value: Optional[Any] = None) -> pd.DataFrame:
-    """欠損値を指定方法で補完"""
-    df = df.copy()
+def fill_missing_column(s: pd.Series, method: str, value: Optional[Any] = None) -> pd.Series:
+    """1 列の欠損値補完"""
     if method == '平均':
-        df[column] = df[column].fillna(df[column].mean())
+        return s.fillna(s.mean())
     elif method == '中央値':
-        df[column] = df[column].fillna(df[column].median())
+        return s.fillna(s.median())
     elif method == '最頻値':
-        df[column] = df[column].fillna(df[column].mode().iloc[0])
+        return s.fillna(s.mode().iloc[0])
     elif method == '定数' and value is not None:
-        df[column] = df[column].fillna(value)
-    logger.info("fill_missing: column=%s method=%s", column, method)
+        if isinstance(s.dtype, pd.CategoricalDtype) and value not in s.cat.categories:
+            # カテゴリ型（メモリ最適化で変換された列等）は補完値をカテゴリに追加してから補完する
+            s = s.cat.add_categories([value])
+        return s.fillna(value)
+    return s
+
+def _has_mean(s: pd.Series) -> bool:
+    """平均・中央値で補完できる列か（bool 以外の数値・日付）"""
+    return ((pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s))
+            or pd.api.types.is_datetime64_any_dtype(s))
+
+def _block_fill_values(block: pd.DataFrame, method: str) -> pd.Series:
+    """選択列のブロックの平均・中央値を 1 回の集計で計算する"""
+    return block.mean() if method == '平均' else block.median()
+
+def _fill_missing_block(df: pd.DataFrame, columns: List[Any], method: str, value: Optional[Any]) -> Dict[Any, pd.Series]:
+    if method in ('平均', '中央値'):
+        # 数値列はまとめて 1 回で集計し、日付列は列ごとに補完する
+        numeric = [c for c in columns if not pd.api.types.is_datetime64_any_dtype(df[c])]
+        fills = _block_fill_values(df[numeric], method) if len(numeric) > 1 else None
+        return {c: df[c].fillna(fills[c]) if fills is not None and c in fills.index
+                else fill_missing_column(df[c], method, value) for c in columns}
+    return {c: fill_missing_column(df[c], method, value) for c in columns}
+
+def fill_missing_columns(df: pd.DataFrame, columns: List[Any], method: str, value: Optional[Any] = None) -> Dict[Any, pd.Series]:
+    """複数列の欠損値補完（平均・中央値は列のグループごとに 1 回の集計で求め、グループは並列に処理する）
+    平均・中央値で補完できない列（数値・日付以外）を含む場合は、列の分け方によらず ValueError を送出する。
+    """
+    if method in ('平均', '中央値'):
+        invalid = [c for c in columns if not _has_mean(df[c])]
+        if invalid:
+            raise ValueError(f"{method}で補完できない列です（数値・日付の列を選択してください）: {invalid}")
+    return parallel.map_columns(lambda cols: _fill_missing_block(df, cols, method, value), columns, len(df))
+
+def fill_missing(df: pd.DataFrame, column: Optional[str], method: str, value: Optional[Any] = None,
+                 columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """欠損値を指定方法で補完（columns を渡すと複数列をまとめて補完する）"""
+    columns = _targets(column, columns)
+    df = _assign(df, fill_missing_columns(df, columns, method, value))
+    logger.info("fill_missing: columns=%s method=%s", columns, method)
     return df
 
-def drop_duplicates(df: pd.DataFrame) -> pd.DataFrame:
-    """重複行を削除"""
-    logger.info("drop_duplicates: before_rows=%d", df.shape[0])
-    res = df.drop_duplicates()
-    logger.info("drop_duplicates: after_rows=%d", res.shape[0])
+def drop_duplicates(df: pd.DataFrame, subset: Optional[List[Any]] = None, keep: str = 'first') -> pd.DataFrame:
+    """重複行を削除（subset の列が一致する行を重複とみなす。keep は 'first' / 'last' / 'none'）"""
+    res = dedup.drop_duplicates(df, subset=subset, keep=keep)
+    logger.info("drop_duplicates: subset=%s keep=%s rows=%d->%d", subset, keep, len(df), len(res))
     return res
 
-def clip_outliers_iqr(df: pd.DataFrame, column: str) -> pd.DataFrame:
-    """IQR法で外れ値を上下限でクリッピング"""
-    df = df.copy()
-    q1 = df[column].quantile(0.25)
-    q3 = df[column].quantile(0.75)
+def clip_outliers_iqr_column(s: pd.Series) -> pd.Series:
+    """1 列を IQR 法の上下限でクリッピング"""
+    q1 = s.quantile(0.25)
+    q3 = s.quantile(0.75)
     iqr = q3 - q1
     lower = q1 - 1.5 * iqr
     upper = q3 + 1.5 * iqr
-    df[column] = df[column].clip(lower, upper)
-    logger.info("clip_outliers_iqr: column=%s lower=%s upper=%s", column, lower, upper)
-    return df
+    logger.info("clip_outliers_iqr: column=%s lower=%s upper=%s", s.name, lower, upper)
+    return s.clip(lower, upper)
+
+def clip_outliers_iqr_columns(df: pd.DataFrame, columns: List[Any]) -> Dict[Any, pd.Series]:
+    """複数列を IQR 法の上下限でクリッピング（四分位は列のグループのブロックに対する 1 回の quantile で求め、
+    グループは並列に処理する）
+    """
+    return parallel.map_columns(lambda cols: _clip_outliers_iqr_block(df, cols), columns, len(df))
+
+def _clip_outliers_iqr_block(df: pd.DataFrame, columns: List[Any]) -> Dict[Any, pd.Series]:
+    if len(columns) == 1:
+        return {columns[0]: clip_outliers_iqr_column(df[columns[0]])}
+    block = df[list(columns)]
+    q = block.quantile([0.25, 0.75])
+    iqr = q.loc[0.75] - q.loc[0.25]
+    lower = q.loc[0.25] - 1.5 * iqr
+    upper = q.loc[0.75] + 1.5 * iqr
+    logger.info("clip_outliers_iqr: columns=%s lower=%s upper=%s", list(columns), lower.tolist(), upper.tolist())
+    clipped = block.clip(lower, upper, axis=1)
+    return {c: clipped[c] for c in columns}
+
+def clip_outliers_iqr(df: pd.DataFrame, column: Optional[str], columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """IQR法で外れ値を上下限でクリッピング（columns を渡すと複数列をまとめて処理する）"""
+    return _assign(df, clip_outliers_iqr_columns(df, _targets(column, columns)))
 
-def remove_outliers_sigma(df: pd.DataFrame, column: str, sigma: float = 3.0) -> pd.DataFrame:
-    """3σ法で外れ値行を削除"""
-    mean = df[column].mean()
-    std = df[column].std()
+def remove_outliers_sigma(df: pd.DataFrame, column: Optional[str], sigma: float = 3.0,
+                          columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """3σ法で外れ値行を削除（columns を渡すと、いずれかの列が範囲外または欠損の行を削除する）
+    平均・標準偏差は削除前のデータの選択列に対して 1 回の集計でまとめて求める。
+    """
+    columns = _targets(column, columns)
+    # 列のグループごとの「範囲内の行」のマスクを並列に求めて結合する
+    masks = parallel.map_columns(lambda cols: _sigma_keep(df, cols, sigma), columns, len(df))
+    keep = np.logical_and.reduce([m.to_numpy() for m in masks.values()])
+    return df[keep]
+
+def _sigma_keep(df: pd.DataFrame, columns: List[Any], sigma: float) -> Dict[Any, pd.Series]:
+    block = df[columns]
+    mean = block.mean()
+    std = block.std()
     lower = mean - sigma * std
     upper = mean + sigma * std
-    logger.info("remove_outliers_sigma: column=%s mean=%s std=%s sigma=%s lower=%s upper=%s", column, mean, std, sigma, lower, upper)
-    return df[(df[column] >= lower) & (df[column] <= upper)]
+    logger.info("remove_outliers_sigma: columns=%s mean=%s std=%s sigma=%s lower=%s upper=%s",
+                columns, mean.tolist(), std.tolist(), sigma, lower.tolist(), upper.tolist())
+    return {columns[0]: (block.ge(lower, axis=1) & block.le(upper, axis=1)).all(axis=1)}
+
+def promote_header(df: pd.DataFrame) -> pd.DataFrame:
+    """先頭行を列名に昇格する（ヘッダなしで読み込んだデータ向け）"""
+    if df.shape[0] < 1:
+        return df
+    res = df.iloc[1:].reset_index(drop=True)
+    res.columns = df.iloc[0].astype(str).tolist()
+    logger.info("promote_header: columns=%s", list(res.columns))
+    return res
+
+def rename_columns(df: pd.DataFrame, names: List[str]) -> pd.DataFrame:
+    """列名を一括で置き換える（データはコピーしない）"""
+    res = shallow_copy(df)
+    res.columns = list(names)
+    logger.info("rename_columns: columns=%s", list(names))
+    return res
@@ -2,7 +2,12 @@
 codegen.py
 処理履歴からPandasコード自動生成
 """
-from typing import List
+from typing import Any, Callable, Dict, List, TYPE_CHECKING
+from src.logic.datetimes import DEFAULT_PARTS
+from src.logic.encoding import DEFAULT_HASH_FEATURES, OTHER
+
+if TYPE_CHECKING:
+    from src.logic.pipeline import Pipeline
 
 def generate_code(history: List[str]) -> str:
     """履歴リストからPandasコードを生成"""
@@ -10,3 +15,256 @@ def generate_code(history: List[str]) -> str:
     for step in history:
         code += step + "\n"
     return code
+
+
+def _c(name: Any) -> str:
+    return repr(name)
+
+
+def _cols(p: Dict[str, Any]) -> str:
+    """複数列の操作（columns）の対象列のリスト"""
+    return repr(list(p['columns']))
+
+
+def _convert_dtype(p: Dict[str, Any]) -> List[str]:
+    if p.get('columns'):
+        return [line for column in p['columns'] for line in _convert_dtype({**p, 'columns': None, 'column': column})]
+    c = _c(p['column'])
+    expr = {
+        '数値': f"pd.to_numeric(df[{c}], errors='coerce')",
+        '文字列': f"df[{c}].astype(str)",
+        'カテゴリ': f"df[{c}].astype('category')",
+        '日付': f"pd.to_datetime(df[{c}], errors='coerce')",
+    }.get(p['dtype'])
+    return [f"df[{c}] = {expr}"] if expr else []
+
+
+def _fill_missing(p: Dict[str, Any]) -> List[str]:
+    if p.get('columns') and p['method'] in ('平均', '中央値'):
+        cols = _cols(p)
+        stat = 'mean' if p['method'] == '平均' else 'median'
+        # 選択列は全て数値・日付（それ以外はアプリ側で拒否される）なので、そのまま 1 回で集計する
+        return [f"df[{cols}] = df[{cols}].fillna(df[{cols}].{stat}())"]
+    if p.get('columns'):
+        return [line for column in p['columns'] for line in _fill_missing({**p, 'columns': None, 'column': column})]
+    c = _c(p['column'])
+    expr = {
+        '平均': f"df[{c}].mean()",
+        '中央値': f"df[{c}].median()",
+        '最頻値': f"df[{c}].mode().iloc[0]",
+        '定数': repr(p.get('value')),
+    }.get(p['method'])
+    if expr is None or (p['method'] == '定数' and p.get('value') is None):
+        return []
+    return [f"df[{c}] = df[{c}].fillna({expr})"]
+
+
+def _drop_duplicates(p: Dict[str, Any]) -> List[str]:
+    args = []
+    if p.get('subset'):
+        args.append(f"subset={list(p['subset'])!r}")
+    keep = p.get('keep', 'first')
+    if keep != 'first':
+        args.append(f"keep={False if keep == 'none' else keep!r}")
+    return [f"df = df.drop_duplicates({', '.join(args)})"]
+
+
+def _clip_outliers_iqr(p: Dict[str, Any]) -> List[str]:
+    if p.get('columns'):
+        cols = _cols(p)
+        return [
+            f"q = df[{cols}].quantile([0.25, 0.75])",
+            "q1, q3 = q.loc[0.25], q.loc[0.75]",
+            f"df[{cols}] = df[{cols}].clip(q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1), axis=1)",
+        ]
+    c = _c(p['column'])
+    return [
+        f"q1, q3 = df[{c}].quantile(0.25), df[{c}].quantile(0.75)",
+        f"df[{c}] = df[{c}].clip(q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1))",
+    ]
+
+
+def _remove_outliers_sigma(p: Dict[str, Any]) -> List[str]:
+    sigma = p.get('sigma', 3.0)
+    if p.get('columns'):
+        cols = _cols(p)
+        return [
+            f"mean, std = df[{cols}].mean(), df[{cols}].std()",
+            f"df = df[(df[{cols}].ge(mean - {sigma} * std, axis=1) & df[{cols}].le(mean + {sigma} * std, axis=1)).all(axis=1)]",
+        ]
+    c = _c(p['column'])
+    return [
+        f"mean, std = df[{c}].mean(), df[{c}].std()",
+        f"df = df[(df[{c}] >= mean - {sigma} * std) & (df[{c}] <= mean + {sigma} * std)]",
+    ]
+
+
+def _add_column_by_operation(p: Dict[str, Any]) -> List[str]:
+    a, b = p['col1'], p.get('col2')
+    ops = {'加算': ('plus', '+'), '減算': ('minus', '-'), '乗算': ('mul', '*'), '除算': ('div', '/')}
+    if p['op'] in ops:
+        suffix, sym = ops[p['op']]
+        return [f"df[{_c(f'{a}_{suffix}_{b}')}] = df[{_c(a)}] {sym} df[{_c(b)}]"]
+    if p['op'] == '定数加算' and p.get('const') is not None:
+        return [f"df[{_c(f'{a}_plus_' + str(p['const']))}] = df[{_c(a)}] + {p['const']!r}"]
+    return []
+
+
+def _one_hot_encode(p: Dict[str, Any]) -> List[str]:
+    c = _c(p['column'])
+    method = p.get('method', 'onehot')
+    sparse = bool(p.get('sparse', True))
+    dtype = "'uint8'" if sparse else 'bool'
+    prefix = str(p['column'])
+    if method == 'hash':
+        n = int(p.get('n_features') or DEFAULT_HASH_FEATURES)
+        lines = [
+            f"_codes = pd.Series(pd.util.hash_array(df[{c}].astype(str).to_numpy(dtype=object), categorize=True) % {n}, "
+            f"index=df.index).where(df[{c}].notna())",
+            f"_enc = pd.Categorical(_codes, categories=range({n}))",
+        ]
+        prefix += '_hash'
+    elif p.get('categories') is None:
+        return [f"df = pd.get_dummies(df, columns=[{c}], sparse={sparse}, dtype={dtype})"]
+    elif method == 'top_k':
+        lines = [
+            f"_cats = {list(p['categories'])!r}",
+            f"_s = df[{c}].astype(object).where(df[{c}].isin(_cats) | df[{c}].isna(), {OTHER!r})",
+            f"_enc = pd.Categorical(_s, categories=_cats + [{OTHER!r}])",
+        ]
+    else:
+        lines = [f"_enc = pd.Categorical(df[{c}], categories={list(p['categories'])!r})"]
+    return lines + [
+        f"df = pd.concat([df.drop(columns=[{c}]), pd.get_dummies(pd.Series(_enc, index=df.index), prefix={prefix!r}, "
+        f"sparse={sparse}, dtype={dtype})], axis=1)",
+    ]
+
+
+def _label_encode(p: Dict[str, Any]) -> List[str]:
+    c = _c(p['column'])
+    if p.get('classes') is None:
+        return [f"df[{c}] = df[{c}].astype(str).astype('category').cat.codes"]
+    return [f"df[{c}] = pd.Index({list(p['classes'])!r}).get_indexer(df[{c}].astype(str))"]
+
+
+def _standard_scale(p: Dict[str, Any]) -> List[str]:
+    if p.get('columns'):
+        cols = _cols(p)
+        if p.get('mean') is None or p.get('scale') is None:
+            return [f"df[{cols}] = (df[{cols}] - df[{cols}].mean()) / df[{cols}].std(ddof=0).replace(0, 1)"]
+        return [f"df[{cols}] = (df[{cols}] - {list(p['mean'])!r}) / {list(p['scale'])!r}"]
+    c = _c(p['column'])
+    if p.get('mean') is None or p.get('scale') is None:
+        return [f"df[{c}] = (df[{c}] - df[{c}].mean()) / df[{c}].std(ddof=0)"]
+    return [f"df[{c}] = (df[{c}] - {p['mean']!r}) / {p['scale']!r}"]
+
+
+def _minmax_scale(p: Dict[str, Any]) -> List[str]:
+    if p.get('columns'):
+        cols = _cols(p)
+        if p.get('data_min') is None or p.get('data_max') is None:
+            return [f"df[{cols}] = (df[{cols}] - df[{cols}].min()) / (df[{cols}].max() - df[{cols}].min()).replace(0, 1)"]
+        widths = [(hi - lo) or 1.0 for lo, hi in zip(p['data_min'], p['data_max'])]
+        return [f"df[{cols}] = (df[{cols}] - {list(p['data_min'])!r}) / {widths!r}"]
+    c = _c(p['column'])
+    if p.get('data_min') is None or p.get('data_max') is None:
+        return [f"df[{c}] = (df[{c}] - df[{c}].min()) / (df[{c}].max() - df[{c}].min())"]
+    width = p['data_max'] - p['data_min']
+    return [f"df[{c}] = (df[{c}] - {p['data_min']!r}) / {width or 1.0!r}"]
+
+
+def _extract_date_features(p: Dict[str, Any]) -> List[str]:
+    col = p['column']
+    parts = list(DEFAULT_PARTS if p.get('parts') is None else p['parts'])
+    lines = [f"_dt = pd.to_datetime(df[{_c(col)}], errors='coerce')"]
+    if any(part.endswith('_cyclic') for part in parts):
+        lines.insert(0, "import numpy as np")
+    for part in parts:
+        if part == 'is_holiday':
+            lines.append(f"df[{_c(f'{col}_is_holiday')}] = _dt.dt.weekday >= 5")
+        elif part.endswith('_cyclic'):
+            unit = part[:-len('_cyclic')]
+            value = f"(_dt.dt.{unit} - 1)" if unit == 'month' else f"_dt.dt.{unit}"
+            period = {'month': 12, 'weekday': 7, 'hour': 24}[unit]
+            for fn in ('sin', 'cos'):
+                lines.append(f"df[{_c(f'{col}_{unit}_{fn}')}] = np.{fn}(2 * np.pi * {value} / {period})")
+        else:
+            lines.append(f"df[{_c(f'{col}_{part}')}] = _dt.dt.{part}")
+    return lines
+
+
+def _promote_header(p: Dict[str, Any]) -> List[str]:
+    return ["df.columns = df.iloc[0].astype(str).tolist()", "df = df.iloc[1:].reset_index(drop=True)"]
+
+
+def _set_column_storage(p: Dict[str, Any]) -> List[str]:
+    c = _c(p['column'])
+    expr = {
+        'category': f"df[{c}].astype('category')",
+        'string': f"df[{c}].astype('string[pyarrow]')",
+        'object': f"df[{c}].astype(object)",
+    }.get(p['mode'])
+    return [f"df[{c}] = {expr}"] if expr else [f"# 保存形式の変更: {p['column']} ({p['mode']})"]
+
+
+# 操作名 → pandas コード行を返す関数
+STEP_TEMPLATES: Dict[str, Callable[[Dict[str, Any]], List[str]]] = {
+    'cleaning.convert_dtype': _convert_dtype,
+    'cleaning.drop_missing': lambda p: [f"df = df.dropna(axis={p.get('axis', 0)})"],
+    'cleaning.fill_missing': _fill_missing,
+    'cleaning.drop_duplicates': _drop_duplicates,
+    'cleaning.clip_outliers_iqr': _clip_outliers_iqr,
+    'cleaning.remove_outliers_sigma': _remove_outliers_sigma,
+    'cleaning.promote_header': _promote_header,
+    'memory_optimizer.set_column_storage': _set_column_storage,
+    'cleaning.rename_columns': lambda p: [f"df.columns = {list(p['names'])!r}"],
+    'feature_engineering.add_column_by_operation': _add_column_by_operation,
+    'feature_engineering.one_hot_encode': _one_hot_encode,
+    'feature_engineering.label_encode': _label_encode,
+    'feature_engineering.standard_scale': _standard_scale,
+    'feature_engineering.minmax_scale': _minmax_scale,
+    'feature_engineering.extract_date_features': _extract_date_features,
+}
+
+
+def _filter_value(v: Any) -> str:
+    """フィルタ値のリテラル（pyarrow は文字列を日時に変換しないため日時は pd.Timestamp にする）"""
+    if isinstance(v, (list, tuple)):
+        return '[' + ', '.join(_filter_value(x) for x in v) + ']'
+    if hasattr(v, 'isoformat'):
+        return f"pd.Timestamp({v.isoformat()!r})"
+    return repr(v)
+
+
+def _parquet_filters(filters: List[Any]) -> str:
+    return '[' + ', '.join(f"({c!r}, {op!r}, {_filter_value(v)})" for c, op, v in filters) + ']'
+
+
+def read_source_code(src: Dict[str, Any]) -> str:
+    """読み込み設定（パス・形式・read_kwargs）から読み込みのコード行を生成"""
+    kwargs = src.get('read_kwargs') or {}
+    if src.get('format') == 'parquet':
+        args = ''
+        if kwargs.get('columns') is not None:
+            args += f", columns={list(kwargs['columns'])!r}"
+        if kwargs.get('filters'):
+            args += f", filters={_parquet_filters(kwargs['filters'])}"
+        return f"df = pd.read_parquet({src['path']!r}{args})"
+    args = ''.join(f", {k}={v!r}" for k, v in kwargs.items() if not (k == 'encoding' and v is None))
+    return f"df = pd.read_csv({src['path']!r}{args})"
+
+
+def generate_pipeline_code(pipeline: 'Pipeline') -> str:
+    """パイプライン IR から Pandas コードを生成"""
+    lines = ["import pandas as pd"]
+    if pipeline.source.get('path'):
+        lines.append(read_source_code(pipeline.source))
+    for step in pipeline.steps:
+        template = STEP_TEMPLATES.get(step.op)
+        if template is None:
+            lines.append(f"# 未対応の処理: {step.op} {step.params}")
+            continue
+        lines.extend(template(step.params))
+    if pipeline.outputs:
+        lines.append(f"df = df[{list(pipeline.outputs)!r}]")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,161 @@
+"""
+correlation.py
+相関係数行列の計算
+各列を 1 度だけ標準化し、行ブロックごとの行列積（BLAS）を積み上げて Pearson 相関を求める。
+欠損値がある場合は、欠損マスクの行列積でペアごとの有効行数・和・二乗和も同時に積み上げ、
+pandas の `corr()` と同じペアごとの完全データによる相関になる。Spearman は列ごとの順位を
+データセットのバージョン単位でキャッシュして再利用する。列数が多い場合の表示用に、
+相関の強い上位ペアと、クラスタリングで並べ替えた部分行列を返す API を持つ。
+"""
+from typing import Any, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+from src.logic.profile import Moments
+from src.utils.cache import DerivedCache
+from src.utils.logger import get_logger
+from src.utils.settings import get_int_env
+
+logger = get_logger(__name__)
+
+_corr_cache = DerivedCache(16, 'CORR_CACHE_ENTRIES')
+_rank_cache = DerivedCache(512, 'CORR_RANK_CACHE_ENTRIES')
+
+
+def default_block_rows() -> int:
+    return get_int_env('CORR_BLOCK_ROWS', 65_536)
+
+
+def _to_float(values: Any) -> np.ndarray:
+    """列（の一部）を欠損を NaN とした float64 配列にする（float64 の NumPy 列はコピーしない）"""
+    if isinstance(values, np.ndarray):
+        return values.astype(np.float64, copy=False)
+    return values.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def pearson_from_arrays(names: Sequence[Any], arrays: Sequence[Any], block_rows: int = 0) -> pd.DataFrame:
+    """列配列（NumPy 配列または ExtensionArray、同じ長さ）のペアごとの Pearson 相関行列"""
+    p = len(arrays)
+    n = len(arrays[0]) if p else 0
+    block = block_rows or default_block_rows()
+
+    # 1 回目の走査: 列ごとの平均・標準偏差（標準化しておくと積和の桁落ちを防げる）
+    means, stds = np.zeros(p), np.ones(p)
+    has_nan = False
+    for j, arr in enumerate(arrays):
+        m = Moments()
+        for start in range(0, n, block):
+            v = _to_float(arr[start:start + block])
+            valid = v[~np.isnan(v)]
+            has_nan = has_nan or len(valid) < len(v)
+            m.merge(Moments.from_array(valid))
+        means[j] = m.mean
+        if m.count > 1 and m.var > 0:
+            stds[j] = np.sqrt(m.var)
+
+    # 2 回目の走査: 行ブロックごとに標準化して行列積を積み上げる
+    cross = np.zeros((p, p))
+    if has_nan:
+        cnt, s1, s2 = np.zeros((p, p)), np.zeros((p, p)), np.zeros((p, p))
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        z = np.empty((stop - start, p), order='F')
+        for j, arr in enumerate(arrays):
+            z[:, j] = (_to_float(arr[start:stop]) - means[j]) / stds[j]
+        if has_nan:
+            mask = ~np.isnan(z)
+            z[~mask] = 0.0
+            w = mask.astype(np.float64)
+            cross += z.T @ z
+            cnt += w.T @ w          # ペアごとの有効行数
+            s1 += z.T @ w           # s1[i, j]: 列 j が有効な行での列 i の和
+            s2 += (z * z).T @ w     # 同じく二乗和
+        else:
+            cross += z.T @ z
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if has_nan:
+            cov = cross - s1 * s1.T / cnt
+            var_i = s2 - s1 * s1 / cnt
+            corr = cov / np.sqrt(var_i * var_i.T)
+            corr[cnt < 2] = np.nan
+        else:
+            d = np.sqrt(np.diag(cross))
+            corr = cross / np.outer(d, d)
+    corr = np.clip(corr, -1.0, 1.0)
+    diag = np.diag(corr).copy()
+    np.fill_diagonal(corr, np.where(np.isnan(diag), np.nan, 1.0))
+    return pd.DataFrame(corr, index=list(names), columns=list(names))
+
+
+def column_ranks(s: pd.Series, token: Optional[str] = None) -> np.ndarray:
+    """列の順位（同順位は平均、欠損は NaN）。データセットのバージョンと列名をキーにキャッシュする"""
+    key = None if token is None else (token, s.name)
+    return _rank_cache.get_or_compute(key, lambda: s.rank(method='average').to_numpy(dtype=np.float64))
+
+
+def corr_matrix(df: pd.DataFrame, method: str = 'pearson', token: Optional[str] = None,
+                block_rows: int = 0) -> pd.DataFrame:
+    """数値列の相関係数行列（pearson / spearman。それ以外の method は pandas に委ねる）
+    Spearman は列ごとの順位に対する Pearson 相関として計算する。欠損値がある場合は各列の有効値だけで
+    順位を付けるため、ペアごとに順位を付け直す pandas の結果とはわずかに異なる。
+    """
+    num_df = df.select_dtypes(include="number")
+
+    def compute() -> pd.DataFrame:
+        names = list(num_df.columns)
+        if not names:
+            return pd.DataFrame()
+        if method == 'pearson':
+            arrays = [s.array for _, s in num_df.items()]
+        elif method == 'spearman':
+            arrays = [column_ranks(s, token) for _, s in num_df.items()]
+        else:
+            return num_df.corr(method=method)
+        result = pearson_from_arrays(names, arrays, block_rows)
+        logger.info("corr_matrix: method=%s rows=%d cols=%d", method, len(num_df), len(names))
+        return result
+
+    return _corr_cache.get_or_compute(None if token is None else (token, method, num_df.shape), compute)
+
+
+def top_pairs(corr: pd.DataFrame, k: int = 20) -> pd.DataFrame:
+    """絶対値の大きい順に上位 k 個の列ペア（対角・重複を除く）"""
+    values = corr.to_numpy()
+    i, j = np.triu_indices(len(values), k=1)
+    r = values[i, j]
+    valid = ~np.isnan(r)
+    i, j, r = i[valid], j[valid], r[valid]
+    if len(r) > k:
+        pick = np.argpartition(-np.abs(r), k - 1)[:k]
+        i, j, r = i[pick], j[pick], r[pick]
+    order = np.argsort(-np.abs(r), kind='stable')
+    names = corr.columns
+    return pd.DataFrame({'列1': names[i[order]], '列2': names[j[order]], '相関係数': r[order]})
+
+
+def _cluster_order(sub: np.ndarray) -> List[int]:
+    """1 - |r| を距離とした階層クラスタリングの葉の順序（SciPy が無ければ元の順序）"""
+    try:
+        from scipy.cluster.hierarchy import leaves_list, linkage
+        from scipy.spatial.distance import squareform
+    except ImportError:
+        return list(range(len(sub)))
+    dist = 1.0 - np.abs(np.nan_to_num(sub, nan=0.0))
+    np.fill_diagonal(dist, 0.0)
+    dist = (dist + dist.T) / 2
+    return leaves_list(linkage(squareform(dist, checks=False), method='average')).tolist()
+
+
+def clustered_submatrix(corr: pd.DataFrame, max_columns: int = 30) -> pd.DataFrame:
+    """表示用の部分行列: 他の列との最大相関（絶対値）が大きい列を max_columns 個選び、似た列が隣り合うよう並べる"""
+    values = corr.to_numpy()
+    if len(values) > max_columns:
+        off = np.abs(np.nan_to_num(values, nan=0.0))
+        np.fill_diagonal(off, 0.0)
+        keep = np.sort(np.argsort(-off.max(axis=1), kind='stable')[:max_columns])
+    else:
+        keep = np.arange(len(values))
+    if len(keep) < 3:
+        return corr.iloc[keep, keep]
+    order = keep[_cluster_order(values[np.ix_(keep, keep)])]
+    return corr.iloc[order, order]
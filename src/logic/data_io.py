@@ -2,109 +2,299 @@
 data_io.py
 データ入出力（CSV/Parquet読込・書出し）、プレビュー生成ロジック
 """
-from typing import Optional, Tuple, List
+from typing import Optional, Tuple, List, Dict, Any, Callable, TYPE_CHECKING
 import pandas as pd
-import streamlit as st
+import datetime
 import io
+import os
 import hashlib
 from src.utils.logger import get_logger
+from src.utils.settings import get_int_env
+from src.logic import exporter, ingest
+from src.logic.dataset_cache import get_dataset_cache
+from src.logic.fingerprint import HashingReader, buffered_reader, quick_fingerprint, sha256_view, source_view
+
+if TYPE_CHECKING:
+    from src.logic.parquet_reader import ParquetSchema
 
 def _compute_sha256(data: bytes) -> str:
-    """バイト列の SHA256 チェックサムを返す"""
-    h = hashlib.sha256()
-    h.update(data)
-    return h.hexdigest()
-
-
-@st.cache_data
-def _load_csv_from_bytes(file_bytes: bytes, checksum: str, session_id: str,
-                         encoding: Optional[str] = None,
-                         use_header: bool = True, column_names: Optional[List[str]] = None,
-                         header: Optional[int] = 0) -> pd.DataFrame:
-    """内部キャッシュ関数: バイト列とチェックサムを受け取り DataFrame を返す
-    キャッシュキーに `checksum` を含めることで、ファイル内容ベースでの分離を保証する。
-    """
-    buf = io.BytesIO(file_bytes)
-    if column_names is not None:
-        return pd.read_csv(buf, encoding=encoding, header=None, names=column_names)
+    """バイト列の SHA256 チェックサムを返す（コピーせず memoryview のスライスで計算する）"""
+    return sha256_view(memoryview(data))
 
+
+def _csv_read_kwargs(encoding: Optional[str], use_header: bool, column_names: Optional[List[str]],
+                     header: Optional[int]) -> Dict[str, Any]:
+    """ヘッダ指定を `pd.read_csv` の引数に変換する"""
+    if column_names is not None:
+        return {'encoding': encoding, 'header': None, 'names': column_names}
     if header is not None:
-        return pd.read_csv(buf, encoding=encoding, header=header)
+        return {'encoding': encoding, 'header': header}
+    return {'encoding': encoding, 'header': 0 if use_header else None}
+
+
+def _read_csv_c(buf: io.BytesIO, read_kwargs: Dict[str, Any]) -> pd.DataFrame:
+    """pandas 標準の C パーサ（単一スレッド、全オプション対応）"""
+    return pd.read_csv(buf, **read_kwargs)
+
+
+def _configure_arrow_threads() -> None:
+    """pyarrow のスレッド数を利用可能なコア数（`CSV_PARSER_THREADS` で上書き可）に合わせる"""
+    import pyarrow as pa
+    threads = get_int_env('CSV_PARSER_THREADS', _available_cpus())
+    if pa.cpu_count() != threads:
+        pa.set_cpu_count(max(1, threads))
+
+
+def _temporal_positions(df: pd.DataFrame) -> List[int]:
+    """pyarrow パーサが日付・時刻として推定した列の位置（C パーサは文字列のまま読む）"""
+    positions = []
+    for i, (_, s) in enumerate(df.items()):
+        if pd.api.types.is_datetime64_any_dtype(s):
+            positions.append(i)
+        elif s.dtype == object:
+            first = s.first_valid_index()
+            if first is not None and isinstance(s.loc[first], (datetime.date, datetime.time)):
+                positions.append(i)
+    return positions
+
+
+def _read_text_columns(buf: io.BufferedIOBase, read_kwargs: Dict[str, Any], positions: List[int]) -> Dict[int, pd.Series]:
+    """指定位置の列だけを pyarrow で文字列として読み直す（欠損とみなす値は C パーサと同じ）"""
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    from pandas._libs.parsers import STR_NA_VALUES
+    buf.seek(0)
+    names = [f'f{i}' for i in positions]
+    read_options = pa_csv.ReadOptions(autogenerate_column_names=True,
+                                      skip_rows=0 if read_kwargs.get('header') is None else 1,
+                                      encoding=read_kwargs.get('encoding') or 'utf8')
+    convert_options = pa_csv.ConvertOptions(include_columns=names, column_types={n: pa.string() for n in names},
+                                            null_values=list(STR_NA_VALUES), strings_can_be_null=True)
+    table = pa_csv.read_csv(buf, read_options=read_options, convert_options=convert_options)
+    return {i: table.column(n).to_pandas() for i, n in zip(positions, names)}
+
+
+def _read_csv_pyarrow(buf: io.BytesIO, read_kwargs: Dict[str, Any]) -> pd.DataFrame:
+    """pyarrow パーサ（マルチスレッド）。結果は NumPy ベースの dtype に変換される
+    pyarrow は日付・時刻らしい列を datetime64 / date に変換するが、C パーサと同じ dtype にするため
+    （ファイルサイズでパーサが切り替わっても列の型が変わらないように）、その列は文字列として読み直す。
+    """
+    _configure_arrow_threads()
+    df = pd.read_csv(buf, engine='pyarrow', **read_kwargs)
+    positions = _temporal_positions(df)
+    if positions:
+        for i, values in _read_text_columns(buf, read_kwargs, positions).items():
+            values.index = df.index
+            df.isetitem(i, values)
+        get_logger(__name__).info("read_csv: engine=pyarrow reread %d date-like columns as text", len(positions))
+    return df
+
+
+def _read_csv_pyarrow_dtype(buf: io.BytesIO, read_kwargs: Dict[str, Any]) -> pd.DataFrame:
+    """pyarrow パーサ（マルチスレッド）。列は ArrowDtype のまま保持し変換コストを省く"""
+    _configure_arrow_threads()
+    return pd.read_csv(buf, engine='pyarrow', dtype_backend='pyarrow', **read_kwargs)
+
+
+CSV_PARSERS: Dict[str, Callable[[io.BytesIO, Dict[str, Any]], pd.DataFrame]] = {
+    'c': _read_csv_c,
+    'pyarrow': _read_csv_pyarrow,
+    'pyarrow_dtype': _read_csv_pyarrow_dtype,
+}
+
+# pyarrow パーサがそのまま扱える文字コード（それ以外は C パーサを使う）
+_PYARROW_ENCODINGS = {None, 'utf-8', 'utf8', 'utf-8-sig', 'ascii'}
+
+
+def _available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def select_csv_engine(file_size: int, read_kwargs: Dict[str, Any], cpu_count: Optional[int] = None) -> str:
+    """ファイルサイズ・読み込みオプション・コア数から CSV パーサを選択する
+    `CSV_ENGINE` 環境変数が設定されていればそれを優先する。
+    """
+    forced = os.getenv('CSV_ENGINE')
+    if forced in CSV_PARSERS:
+        return forced
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return 'c'
+    encoding = read_kwargs.get('encoding')
+    if (encoding.lower() if encoding else None) not in _PYARROW_ENCODINGS:
+        return 'c'
+    if read_kwargs.get('header') not in (0, None):
+        return 'c'
+    cpus = cpu_count or _available_cpus()
+    # 小さいファイルはスレッド起動コストが勝るため C パーサの方が速い
+    if cpus <= 1 or file_size < get_int_env('CSV_PYARROW_MIN_KB', 4096) * 1024:
+        return 'c'
+    return 'pyarrow'
+
 
-    header_val = 0 if use_header else None
-    return pd.read_csv(buf, encoding=encoding, header=header_val)
+def read_csv_with_engine(buf: io.BytesIO, read_kwargs: Dict[str, Any], engine: str) -> pd.DataFrame:
+    """指定パーサで CSV を読み込む。高速パーサが未対応のオプション・入力で失敗した場合は C パーサで再読込する"""
+    if engine == 'c':
+        return _read_csv_c(buf, read_kwargs)
+    try:
+        return CSV_PARSERS[engine](buf, read_kwargs)
+    except (ValueError, TypeError, ImportError) as e:
+        # pyarrow.lib.ArrowInvalid は ValueError のサブクラス
+        get_logger(__name__).info("read_csv: engine=%s failed (%s), falling back to c", engine, e)
+        buf.seek(0)
+        return _read_csv_c(buf, read_kwargs)
+
+
+def _load_csv_from_stream(stream: io.BufferedIOBase, read_kwargs: Dict[str, Any], engine: str = 'c') -> pd.DataFrame:
+    """内部関数: ストリームを指定パーサで読み込み DataFrame を返す"""
+    return read_csv_with_engine(stream, read_kwargs, engine)
+
+
+def _csv_variant(read_kwargs: Dict[str, Any], mode: str) -> str:
+    """読み込みオプションとパーサからデータセットキャッシュのバリアント名を作る"""
+    opts_key = hashlib.sha256(repr(sorted(read_kwargs.items())).encode('utf-8')).hexdigest()[:12]
+    return f'csv-{mode}-{opts_key}'
 
 
 def load_csv(file: io.BytesIO, encoding: Optional[str] = None, use_header: bool = True,
              column_names: Optional[List[str]] = None, header: Optional[int] = 0,
-             session_id: Optional[str] = None) -> pd.DataFrame:
-    """CSVファイルをDataFrameとして読み込む（UploadedFile 等をバイト列に変換して内部でキャッシュを行う）
+             session_id: Optional[str] = None, chunked: Optional[bool] = None,
+             chunk_rows: Optional[int] = None, memory_budget: Optional[int] = None,
+             engine: Optional[str] = None) -> pd.DataFrame:
+    """CSVファイルをDataFrameとして読み込む（ファイル内容の SHA256 をキーに永続キャッシュを参照する）
     Args:
         file: アップロードされたファイルオブジェクト（または bytes）
         encoding: 文字コード
         use_header: 先頭行をヘッダとして扱うか
         column_names: 明示的な列名
         header: header 引数（互換性のため）
+        session_id: ログに付与するセッション識別子
+        chunked: チャンク読み込みを行うか。None の場合はファイルサイズ（`INGEST_CHUNKED_MIN_MB`）で判定する
+        chunk_rows: チャンク読み込み時の 1 チャンクの行数
+        memory_budget: チャンク読み込み中にメモリ上に保持する中間データの上限バイト数（超過分はディスクへ退避。
+            読み込んだ DataFrame の大きさは制限しない）
+        engine: CSV パーサ（'c' / 'pyarrow' / 'pyarrow_dtype'）。None の場合は `select_csv_engine` で自動選択する
     Returns:
         DataFrame
     """
-    # `file` が UploadedFile や BytesIO の場合はバイト列に変換してから
-    # 内部のキャッシュ対応関数を呼ぶ。バイト列の SHA256 をキャッシュキーに使う。
-    if hasattr(file, 'seek'):
-        try:
-            file.seek(0)
-        except Exception:
-            pass
-    if hasattr(file, 'read'):
-        file_bytes = file.read()
-    elif isinstance(file, (bytes, bytearray)):
-        file_bytes = bytes(file)
-    else:
-        raise TypeError('file must be a file-like object or bytes')
-
-    checksum = _compute_sha256(file_bytes)
     sid = session_id or ''
-    df = _load_csv_from_bytes(file_bytes, checksum, sid, encoding=encoding,
-                                use_header=use_header, column_names=column_names, header=header)
     logger = get_logger(__name__, session_uid=sid)
+    read_kwargs = _csv_read_kwargs(encoding, use_header, column_names, header)
+    cache = get_dataset_cache()
+
+    # UploadedFile / BytesIO の内容はコピーせず memoryview で参照する
+    with source_view(file) as view:
+        size = len(view)
+        if chunked is None:
+            chunked = size >= get_int_env('INGEST_CHUNKED_MIN_MB', 256) * 1024 ** 2
+        if chunked:
+            engine = 'c'
+        elif engine is None:
+            engine = select_csv_engine(size, read_kwargs)
+        variant = _csv_variant(read_kwargs, 'chunked' if chunked else engine)
+
+        # 高速な事前チェックで未登録なら SHA256 の事前計算を省き、解析と同時にハッシュを計算する
+        quick = quick_fingerprint(view)
+        candidate = cache.lookup_quick(quick, variant)
+        df = None
+        if candidate is not None and sha256_view(view) == candidate:
+            df = cache.get(candidate, variant)
+        hit = df is not None
+
+        if hit:
+            checksum = candidate
+        else:
+            reader = HashingReader(view)
+            stream = buffered_reader(reader)
+            if chunked:
+                df = ingest.read_csv_chunked(stream, read_kwargs, chunk_rows=chunk_rows, memory_budget=memory_budget,
+                                             spill_key=f'{quick}-{variant}')
+            else:
+                df = _load_csv_from_stream(stream, read_kwargs, engine)
+            checksum = reader.hexdigest()
+            cache.put(checksum, df, variant)
+            cache.remember_quick(quick, checksum, variant)
+
     try:
-        logger.info("load_csv: file_bytes=%d checksum=%s rows=%d cols=%d", len(file_bytes), checksum, df.shape[0], df.shape[1])
+        logger.info("load_csv: file_bytes=%d checksum=%s engine=%s chunked=%s cache_hit=%s rows=%d cols=%d",
+                    size, checksum, engine, chunked, hit, df.shape[0], df.shape[1])
     except Exception:
-        logger.info("load_csv: file_bytes=%d checksum=%s", len(file_bytes), checksum)
+        logger.info("load_csv: file_bytes=%d checksum=%s", size, checksum)
+    logger.info("dataset cache stats: %s", cache.stats())
     return df
 
-@st.cache_data
-def _load_parquet_from_bytes(file_bytes: bytes, checksum: str, session_id: str) -> pd.DataFrame:
-    """内部キャッシュ関数: Parquet のバイト列から DataFrame を読み込む"""
-    buf = io.BytesIO(file_bytes)
-    return pd.read_parquet(buf)
+def _load_parquet_from_view(view: memoryview, columns: Optional[List[str]] = None,
+                            filters: Optional[List[Tuple[str, str, Any]]] = None) -> pd.DataFrame:
+    """内部関数: Parquet の memoryview からコピーせずに DataFrame を読み込む（列・フィルタ指定時は遅延読み込み）"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    reader = pa.BufferReader(pa.py_buffer(view))
+    try:
+        if columns is None and not filters:
+            return pq.read_table(reader).to_pandas()
+        from src.logic import parquet_reader
+        return parquet_reader.read_table(reader, columns=columns, filters=filters)
+    finally:
+        reader.close()
 
 
-def load_parquet(file: io.BytesIO, session_id: Optional[str] = None) -> pd.DataFrame:
-    """ParquetファイルをDataFrameとして読み込む（アップロードオブジェクトはバイト列に変換して扱う）"""
-    if hasattr(file, 'seek'):
+def parquet_schema(file: io.BytesIO) -> 'ParquetSchema':
+    """Parquet のフッタだけを読み、列一覧と行グループ統計量の集約を返す（データ本体は読まない）"""
+    import pyarrow as pa
+    from src.logic import parquet_reader
+    with source_view(file) as view:
+        reader = pa.BufferReader(pa.py_buffer(view))
         try:
-            file.seek(0)
-        except Exception:
-            pass
-    if hasattr(file, 'read'):
-        file_bytes = file.read()
-    elif isinstance(file, (bytes, bytearray)):
-        file_bytes = bytes(file)
-    else:
-        raise TypeError('file must be a file-like object or bytes')
-
-    checksum = _compute_sha256(file_bytes)
+            return parquet_reader.read_schema(reader)
+        finally:
+            reader.close()
+
+
+def _parquet_variant(columns: Optional[List[str]], filters: Optional[List[Tuple[str, str, Any]]]) -> str:
+    """列・フィルタ指定からデータセットキャッシュのバリアント名を作る（指定なしは従来の 'parquet'）"""
+    if columns is None and not filters:
+        return 'parquet'
+    key = hashlib.sha256(repr((columns, [tuple(f) for f in filters or []])).encode('utf-8')).hexdigest()[:12]
+    return f'parquet-lazy-{key}'
+
+
+def load_parquet(file: io.BytesIO, session_id: Optional[str] = None, columns: Optional[List[str]] = None,
+                 filters: Optional[List[Tuple[str, str, Any]]] = None) -> pd.DataFrame:
+    """ParquetファイルをDataFrameとして読み込む（ファイル内容の SHA256 をキーに永続キャッシュを参照する）
+    columns / filters を指定すると、その列と条件に合い得る行グループだけを読み込む（`parquet_reader.read_table`）。
+    """
     sid = session_id or ''
-    df = _load_parquet_from_bytes(file_bytes, checksum, sid)
+    cache = get_dataset_cache()
+    variant = _parquet_variant(columns, filters)
+    with source_view(file) as view:
+        size = len(view)
+        # Parquet はフッタから読むため解析と同時のハッシュ計算はできない。事前チェックで未登録なら解析後に計算する
+        quick = quick_fingerprint(view)
+        candidate = cache.lookup_quick(quick, variant)
+        df = None
+        if candidate is not None and sha256_view(view) == candidate:
+            df = cache.get(candidate, variant)
+        hit = df is not None
+        if hit:
+            checksum = candidate
+        else:
+            df = _load_parquet_from_view(view, columns, filters)
+            checksum = sha256_view(view)
+            cache.put(checksum, df, variant)
+            cache.remember_quick(quick, checksum, variant)
     logger = get_logger(__name__, session_uid=sid)
     try:
-        logger.info("load_parquet: bytes=%d checksum=%s rows=%d cols=%d", len(file_bytes), checksum, df.shape[0], df.shape[1])
+        logger.info("load_parquet: bytes=%d checksum=%s variant=%s cache_hit=%s rows=%d cols=%d",
+                    size, checksum, variant, hit, df.shape[0], df.shape[1])
     except Exception:
-        logger.info("load_parquet: bytes=%d checksum=%s", len(file_bytes), checksum)
+        logger.info("load_parquet: bytes=%d checksum=%s", size, checksum)
+    logger.info("dataset cache stats: %s", cache.stats())
     return df
 
-@st.cache_data
 def preview_df(df: pd.DataFrame, head: int = 5, tail: int = 0) -> pd.DataFrame:
     """DataFrameの先頭・末尾プレビューを返す"""
     if tail > 0:
@@ -114,13 +304,13 @@ def preview_df(df: pd.DataFrame, head: int = 5, tail: int = 0) -> pd.DataFrame:
 def export_csv(df: pd.DataFrame) -> bytes:
     """DataFrameをCSVバイト列に変換"""
     # 明示的にヘッダーを有効にし、Excelでの文字化け対策として UTF-8 with BOM を使う
-    df2 = df.copy()
-    # カラム名が数値等の場合でも文字列にしてヘッダ行として出力されるようにする
-    df2.columns = [str(c) for c in df2.columns]
-    return df2.to_csv(index=False, header=True).encode('utf-8-sig')
+    # カラム名が数値等の場合でも文字列にしてヘッダ行として出力される（コピーは作らない）
+    buf = io.BytesIO()
+    exporter.write_csv(df, buf)
+    return buf.getvalue()
 
 def export_parquet(df: pd.DataFrame) -> bytes:
     """DataFrameをParquetバイト列に変換"""
     buf = io.BytesIO()
-    df.to_parquet(buf, index=False)
+    exporter.write_parquet(df, buf)
     return buf.getvalue()
@@ -0,0 +1,147 @@
+"""
+dataset_cache.py
+ファイル内容（SHA256）をキーにした永続データセットキャッシュ
+パース済み DataFrame を Arrow IPC (Feather) ファイルとして保存し、ヒット時はメモリマップで読み込む。
+セッション・プロセス再起動をまたいで共有され、総容量の上限を超えると LRU で削除する。
+"""
+from typing import Dict, Optional
+import functools
+import os
+import threading
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from src.utils.logger import get_logger
+from src.utils.settings import get_cache_dir, get_int_env
+
+logger = get_logger(__name__)
+
+
+class DatasetCache:
+    """内容アドレス方式のデータセットキャッシュ"""
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'writes': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _path(self, checksum: str, variant: str) -> str:
+        name = f'{checksum}-{variant}' if variant else checksum
+        return os.path.join(self.cache_dir, f'{name}.feather')
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += n
+
+    def _quick_path(self, quick: str, variant: str) -> str:
+        return os.path.join(self.cache_dir, 'quick', f'{quick}-{variant}' if variant else quick)
+
+    def lookup_quick(self, quick: str, variant: str = '') -> Optional[str]:
+        """高速フィンガープリントに対応する SHA256 の候補を返す（未登録なら確実にミス）"""
+        if not self.enabled:
+            return None
+        try:
+            with open(self._quick_path(quick, variant), encoding='ascii') as f:
+                checksum = f.read().strip()
+        except FileNotFoundError:
+            checksum = None
+        if checksum is None or not self.contains(checksum, variant):
+            self._count('misses')
+            return None
+        return checksum
+
+    def remember_quick(self, quick: str, checksum: str, variant: str = '') -> None:
+        """高速フィンガープリントと SHA256 の対応を記録する"""
+        if not self.enabled or not self.contains(checksum, variant):
+            return
+        path = self._quick_path(quick, variant)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp, 'w', encoding='ascii') as f:
+            f.write(checksum)
+        os.replace(tmp, path)
+
+    def contains(self, checksum: str, variant: str = '') -> bool:
+        return self.enabled and os.path.exists(self._path(checksum, variant))
+
+    def get(self, checksum: str, variant: str = '') -> Optional[pd.DataFrame]:
+        """キャッシュ済みなら DataFrame を返す（数値列はメモリマップ上のバッファを参照する）"""
+        if not self.enabled:
+            return None
+        path = self._path(checksum, variant)
+        try:
+            table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        except (FileNotFoundError, pa.ArrowInvalid):
+            self._count('misses')
+            return None
+        # アクセス時刻を LRU の順序として使う
+        os.utime(path)
+        self._count('hits')
+        return table.to_pandas(split_blocks=True)
+
+    def put(self, checksum: str, df: pd.DataFrame, variant: str = '') -> None:
+        """DataFrame を非圧縮の Feather ファイルとして保存する（メモリマップでゼロコピー読込するため非圧縮）"""
+        if not self.enabled:
+            return
+        path = self._path(checksum, variant)
+        tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+        try:
+            feather.write_feather(df, tmp, compression='uncompressed')
+            os.replace(tmp, path)
+        except (pa.ArrowException, ValueError, TypeError) as e:
+            # Arrow で表現できない値（混在型の object 列等）はキャッシュしない
+            logger.info("dataset cache: skip %s (%s)", os.path.basename(path), e)
+            return
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self._count('writes')
+        self._evict(keep=path)
+
+    def _evict(self, keep: str) -> None:
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if not name.endswith('.feather'):
+                continue
+            try:
+                st_ = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st_.st_mtime, st_.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                # メモリマップ中のファイルを削除しても、開いているマップは有効なまま残る
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self._count('evictions')
+            logger.info("dataset cache evicted: %s bytes=%d", os.path.basename(path), size)
+
+    def stats(self) -> Dict[str, int]:
+        """ヒット・ミス・削除回数と現在のエントリ数・総バイト数を返す"""
+        with self._lock:
+            stats = dict(self._counters)
+        sizes = [os.path.getsize(os.path.join(self.cache_dir, n))
+                 for n in os.listdir(self.cache_dir) if n.endswith('.feather')]
+        stats['entries'] = len(sizes)
+        stats['bytes'] = sum(sizes)
+        return stats
+
+
+@functools.lru_cache(maxsize=1)
+def get_dataset_cache() -> DatasetCache:
+    """プロセス共通の DatasetCache を返す（`DATASET_CACHE_MAX_MB=0` で無効化）"""
+    return DatasetCache(get_cache_dir('datasets'), get_int_env('DATASET_CACHE_MAX_MB', 10 * 1024) * 1024 ** 2)
@@ -0,0 +1,180 @@
+"""
+datetimes.py
+日付列の解析（フォーマットの推定・明示的なフォーマットでの変換・解析結果のキャッシュ）と日付特徴量の抽出
+文字列の列は先頭のサンプルから 1 回だけフォーマットを推定し、全行をそのフォーマットで変換する（行ごとの
+推定をしない）。カテゴリ型の列はカテゴリだけを変換して番号で引く。解析結果は列バッファをキーにキャッシュする
+ため、変更されていない列（バージョン間で共有される）を何度解析しても変換は 1 回で済む。
+特徴量（年・月・曜日・時・休日フラグ・周期の sin/cos）は datetime64 の整数表現から日・月の通し番号を 1 回だけ
+求め、要求された列をまとめて計算する。
+"""
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+from src.utils.cache import DerivedCache
+from src.utils.frame import buffer_key
+from src.utils.logger import get_logger
+from src.utils.settings import get_int_env
+
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pandas < 2.2
+    guess_datetime_format = None
+
+logger = get_logger(__name__)
+
+# 推定に失敗した場合に順に試すフォーマット
+CANDIDATE_FORMATS = (
+    '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S.%f',
+    '%Y/%m/%d', '%Y/%m/%d %H:%M:%S', '%Y/%m/%d %H:%M', '%Y%m%d', '%m/%d/%Y', '%d/%m/%Y', '%Y年%m月%d日',
+)
+
+# 特徴量の種類（*_cyclic は {列名}_{month|weekday|hour}_sin / _cos の 2 列）
+PARTS = ('year', 'month', 'weekday', 'hour', 'is_holiday', 'month_cyclic', 'weekday_cyclic', 'hour_cyclic')
+DEFAULT_PARTS = ('year', 'month', 'weekday', 'is_holiday')
+_PERIODS = {'month': 12, 'weekday': 7, 'hour': 24}
+
+_parse_cache = DerivedCache(4, 'DATETIME_CACHE_ENTRIES')
+
+
+def _sample(s: pd.Series, rows: int) -> pd.Series:
+    """フォーマット推定用の欠損でない先頭の値（文字列）"""
+    head = s.iloc[:rows * 4].dropna()
+    if head.empty:
+        head = s[s.notna()]
+    return head.iloc[:rows].astype(str)
+
+
+def infer_format(s: pd.Series, sample_rows: Optional[int] = None) -> Optional[str]:
+    """先頭のサンプル（`DATETIME_SAMPLE_ROWS`、既定 1000 行）から strftime 形式のフォーマットを推定する
+    サンプルを全て変換できるフォーマットを優先し、無ければ半数以上を変換できる中で最も多いもの。
+    推定できなければ None（pandas の既定の推定に任せる）。
+    """
+    sample = _sample(s, sample_rows or get_int_env('DATETIME_SAMPLE_ROWS', 1000))
+    if sample.empty:
+        return None
+    candidates: List[str] = []
+    if guess_datetime_format is not None:
+        guessed = guess_datetime_format(sample.iloc[0])
+        if guessed:
+            candidates.append(guessed)
+    candidates += [f for f in CANDIDATE_FORMATS if f not in candidates]
+    best, best_count = None, 0
+    for fmt in candidates:
+        try:
+            count = int(pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum())
+        except (ValueError, TypeError):
+            continue
+        if count == len(sample):
+            return fmt
+        if count > best_count:
+            best, best_count = fmt, count
+    return best if best_count * 2 >= len(sample) else None
+
+
+def _to_datetime(s: pd.Series, fmt: Optional[str]) -> pd.Series:
+    if fmt is not None:
+        try:
+            return pd.to_datetime(s, format=fmt, errors='coerce')
+        except (ValueError, TypeError):
+            # タイムゾーンのオフセットが混在する等
+            logger.info("datetimes: format=%s failed, falling back to inference", fmt)
+    return pd.to_datetime(s, errors='coerce')
+
+
+def _parse(s: pd.Series) -> pd.Series:
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        categories = pd.Series(s.cat.categories.astype(str))
+        fmt = infer_format(categories)
+        parsed = pd.DatetimeIndex(_to_datetime(categories, fmt))
+        # 番号 -1（欠損）は NaT にする（fill_value を省くと -1 は末尾のカテゴリを指す）
+        res = pd.Series(parsed.take(s.cat.codes.to_numpy(), allow_fill=True, fill_value=pd.NaT),
+                        index=s.index, name=s.name)
+    elif pd.api.types.is_numeric_dtype(s) or pd.api.types.is_bool_dtype(s):
+        fmt = None
+        res = pd.to_datetime(s, errors='coerce')
+    else:
+        fmt = infer_format(s)
+        res = _to_datetime(s, fmt)
+    logger.info("datetimes.parse: column=%s rows=%d format=%s invalid=%d",
+                s.name, len(s), fmt, int(res.isna().sum() - s.isna().sum()))
+    return res
+
+
+def parse(s: pd.Series, cache: bool = True) -> pd.Series:
+    """列を datetime64 に変換する（変換できない値は NaT。datetime64 の列はそのまま返す）
+    cache=True では同じ列バッファの解析結果を再利用する（キャッシュは元の列も保持するため、
+    保持している間にバッファが別の列に再利用されることはない）。
+    """
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s
+    key = (buffer_key(s), str(s.dtype), len(s)) if cache else None
+    _, parsed = _parse_cache.get_or_compute(key, lambda: (s, _parse(s)))
+    # 同じバッファでもインデックス（reset_index 後等）や列名が異なることがあるため付け直す
+    return pd.Series(parsed.array, index=s.index, name=s.name, copy=False)
+
+
+def feature_names(column: Any, parts: Optional[Sequence[str]] = None) -> List[str]:
+    """抽出される特徴量の列名"""
+    names: List[str] = []
+    for part in DEFAULT_PARTS if parts is None else parts:
+        if part.endswith('_cyclic'):
+            unit = part[:-len('_cyclic')]
+            names += [f'{column}_{unit}_sin', f'{column}_{unit}_cos']
+        else:
+            names.append(f'{column}_{part}')
+    return names
+
+
+def _with_missing(values: np.ndarray, nat: np.ndarray, any_nat: bool) -> np.ndarray:
+    """欠損の無い列は int32（pandas の .dt.year 等と同じ）、欠損があれば float64 の NaN にする"""
+    if not any_nat:
+        return values.astype(np.int32)
+    res = values.astype(np.float64)
+    res[nat] = np.nan
+    return res
+
+
+def date_parts(dt: pd.Series, column: Any, parts: Optional[Sequence[str]] = None) -> Dict[str, pd.Series]:
+    """datetime64 の列から指定した特徴量の列を作る（休日フラグは土日）
+    タイムゾーン付きの列は現地時刻で計算する。
+    """
+    parts = DEFAULT_PARTS if parts is None else tuple(parts)
+    unknown = [p for p in parts if p not in PARTS]
+    if unknown:
+        raise ValueError(f"未対応の日付特徴量です: {unknown}")
+    if getattr(dt.dtype, 'tz', None) is not None:
+        dt = dt.dt.tz_localize(None)
+    values = dt.to_numpy()
+    nat = np.isnat(values)
+    any_nat = bool(nat.any())
+    days = values.astype('datetime64[D]')
+    units = {p[:-len('_cyclic')] if p.endswith('_cyclic') else p for p in parts}
+    fields: Dict[str, np.ndarray] = {}
+    if units & {'year', 'month'}:
+        months = days.astype('datetime64[M]').astype(np.int64)
+        fields['year'] = months // 12 + 1970
+        fields['month'] = months % 12 + 1
+    if units & {'weekday', 'is_holiday'}:
+        # 1970-01-01 は木曜日（月曜日 = 0）
+        fields['weekday'] = (days.astype(np.int64) + 3) % 7
+    if 'hour' in units:
+        fields['hour'] = (values - days).astype('timedelta64[h]').astype(np.int64)
+    res: Dict[str, pd.Series] = {}
+    for part, name in zip(parts, _part_names(column, parts)):
+        if part == 'is_holiday':
+            res[name[0]] = pd.Series((fields['weekday'] >= 5) & ~nat, index=dt.index)
+        elif part.endswith('_cyclic'):
+            unit = part[:-len('_cyclic')]
+            base = 1 if unit == 'month' else 0
+            angle = 2 * np.pi * (fields[unit] - base) / _PERIODS[unit]
+            for fn, n in zip((np.sin, np.cos), name):
+                col = fn(angle)
+                col[nat] = np.nan
+                res[n] = pd.Series(col, index=dt.index)
+        else:
+            res[name[0]] = pd.Series(_with_missing(fields[part], nat, any_nat), index=dt.index)
+    return res
+
+
+def _part_names(column: Any, parts: Sequence[str]) -> List[List[str]]:
+    return [feature_names(column, [part]) for part in parts]
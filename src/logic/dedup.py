@@ -0,0 +1,143 @@
+"""
+dedup.py
+行ハッシュによる重複行の検出・削除
+キー列（既定は全列）から行ごとの 64bit キーをベクトル化して計算し、キーの重複で候補を絞る。
+キーが一意な行は重複ではないことが確定するため、厳密な比較はキーが重複した候補行だけに行う
+（衝突の検証）。残す行は先頭（first）・末尾（last）・残さない（none）から選べる。
+メモリ上のデータでは列ごとの factorize の番号を 1 列ずつ混ぜ合わせてキーにする（長い文字列を
+ハッシュし直さず、全列の番号を同時に保持しない）。件数の確認は真偽値のマスクだけを作り、新しい
+DataFrame は作らない。メモリに載らないデータは、値の内容から決まる行ハッシュ（チャンクをまたいで
+同じ値は同じハッシュになる）だけを先に集めて全体のマスクを作り、2 回目の読み込みで行を絞り込む。
+"""
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Union
+import numpy as np
+import pandas as pd
+from src.utils.cache import DerivedCache
+from src.utils.frame import dense_view
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+KEEP_POLICIES = ('first', 'last', 'none')
+
+_count_cache = DerivedCache(64, 'DEDUP_CACHE_ENTRIES')
+
+
+def _keep(keep: str) -> Union[str, bool]:
+    """pandas の keep 引数（'none' は重複する行を全て削除する False）"""
+    if keep not in KEEP_POLICIES:
+        raise ValueError(f"未対応の keep です: {keep}")
+    return False if keep == 'none' else keep
+
+
+def _key_frame(df: pd.DataFrame, subset: Optional[Sequence[Any]]) -> pd.DataFrame:
+    return dense_view(df if not subset else df[list(subset)])
+
+
+_INT64_LIMIT = 2.0 ** 63
+
+
+def _stable(s: pd.Series) -> pd.Series:
+    """数値列を、dtype（整数・浮動小数・欠損の有無でチャンクごとに揺れる）によらず値が同じなら同じになる
+    値ごとのハッシュ（uint64）にする。整数で表せる値は int64 として、それ以外（小数・欠損・無限大）は
+    float64 としてハッシュする（float64 にそろえると 2^53 を超える整数の区別がつかなくなるため）。
+    """
+    if not pd.api.types.is_numeric_dtype(s) or pd.api.types.is_bool_dtype(s):
+        return s
+    floats = s.to_numpy(dtype=np.float64, na_value=np.nan)
+    if pd.api.types.is_integer_dtype(s):
+        integral = ~s.isna().to_numpy()
+        ints = s.to_numpy(dtype=np.int64, na_value=0)
+    else:
+        with np.errstate(invalid='ignore'):
+            integral = np.isfinite(floats) & (np.trunc(floats) == floats) & (np.abs(floats) < _INT64_LIMIT)
+        ints = np.where(integral, floats, 0).astype(np.int64)
+    hashes = np.where(integral, pd.util.hash_array(ints), pd.util.hash_array(floats))
+    return pd.Series(hashes, index=s.index, name=s.name)
+
+
+def row_hashes(df: pd.DataFrame, subset: Optional[Sequence[Any]] = None) -> np.ndarray:
+    """キー列の値の内容から行ごとの 64bit ハッシュ（uint64）を計算する（インデックスは含めない）
+    別々に読み込んだチャンクでも同じ値の行は同じハッシュになる。
+    """
+    keys = _key_frame(df, subset)
+    keys = keys.apply(_stable) if keys.shape[1] else keys
+    if keys.shape[1] == 0:
+        return np.zeros(len(keys), dtype=np.uint64)
+    try:
+        return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+    except TypeError:
+        # list 等ハッシュ不能な値を含む列は文字列表現でハッシュする
+        return pd.util.hash_pandas_object(keys.astype(str), index=False).to_numpy()
+
+
+_FNV_OFFSET = np.uint64(0xCBF29CE484222325)
+_FNV_PRIME = np.uint64(0x100000001B3)
+
+
+def row_keys(df: pd.DataFrame, subset: Optional[Sequence[Any]] = None) -> np.ndarray:
+    """キー列の値の組を表す行ごとの 64bit キー（このフレームの中でだけ意味を持つ）
+    値が同じ行は同じキーになる。異なる組が同じキーになることがあるため、重複の確定には検証が要る。
+    """
+    keys = _key_frame(df, subset)
+    h = np.full(len(keys), _FNV_OFFSET, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for i in range(keys.shape[1]):
+            # 欠損は -1（欠損同士は一致とみなす pandas の duplicated と同じ）
+            h ^= pd.factorize(keys.iloc[:, i])[0].astype(np.uint64)
+            h *= _FNV_PRIME
+    return h
+
+
+def duplicate_mask(df: pd.DataFrame, subset: Optional[Sequence[Any]] = None, keep: str = 'first',
+                   verify: bool = True) -> np.ndarray:
+    """重複として削除される行の真偽値マスク
+    verify=False では値の内容の行ハッシュの一致だけで判定する（衝突の確率は 1 / 2^64 程度）。
+    """
+    if not verify:
+        return pd.Series(row_hashes(df, subset)).duplicated(keep=_keep(keep)).to_numpy()
+    mask = np.zeros(len(df), dtype=bool)
+    candidates = np.flatnonzero(pd.Series(row_keys(df, subset)).duplicated(keep=False).to_numpy())
+    if len(candidates):
+        mask[candidates] = _key_frame(df.iloc[candidates], subset).duplicated(keep=_keep(keep)).to_numpy()
+    logger.info("duplicate_mask: rows=%d candidates=%d duplicates=%d subset=%s keep=%s",
+                len(df), len(candidates), int(mask.sum()), list(subset) if subset else None, keep)
+    return mask
+
+
+def count_duplicates(df: pd.DataFrame, subset: Optional[Sequence[Any]] = None, keep: str = 'first',
+                     token: Optional[str] = None) -> int:
+    """削除される行数（新しい DataFrame は作らない。token があればバージョンごとにキャッシュする）"""
+    key = None if token is None else (token, 'duplicates', tuple(subset or ()), keep)
+    return _count_cache.get_or_compute(key, lambda: int(duplicate_mask(df, subset, keep).sum()))
+
+
+def drop_duplicates(df: pd.DataFrame, subset: Optional[Sequence[Any]] = None, keep: str = 'first',
+                    verify: bool = True) -> pd.DataFrame:
+    """重複行を削除した DataFrame"""
+    mask = duplicate_mask(df, subset, keep, verify)
+    return df[~mask] if mask.any() else df
+
+
+def chunked_duplicate_mask(chunks: Iterable[pd.DataFrame], subset: Optional[Sequence[Any]] = None,
+                           keep: str = 'first') -> np.ndarray:
+    """チャンクごとのハッシュ（1 行 8 バイト）だけを集め、全体で重複として削除される行のマスクを作る
+    チャンクの値は保持しないため、ハッシュの一致だけで判定する。
+    """
+    parts: List[np.ndarray] = [row_hashes(chunk, subset) for chunk in chunks]
+    hashes = np.concatenate(parts) if parts else np.zeros(0, dtype=np.uint64)
+    return pd.Series(hashes).duplicated(keep=_keep(keep)).to_numpy()
+
+
+def iter_drop_duplicates(read_chunks: Callable[[], Iterator[pd.DataFrame]], subset: Optional[Sequence[Any]] = None,
+                         keep: str = 'first') -> Iterator[pd.DataFrame]:
+    """メモリに載らないデータの重複削除（read_chunks は呼ぶたびに同じチャンク列を最初から返す関数）
+    1 回目の読み込みでハッシュから全体のマスクを作り、2 回目の読み込みで各チャンクの行を絞り込む。
+    """
+    mask = chunked_duplicate_mask(read_chunks(), subset, keep)
+    logger.info("iter_drop_duplicates: rows=%d duplicates=%d", len(mask), int(mask.sum()))
+    offset = 0
+    for chunk in read_chunks():
+        drop = mask[offset:offset + len(chunk)]
+        offset += len(chunk)
+        yield chunk[~drop] if drop.any() else chunk
@@ -3,20 +3,245 @@ eda.py
 基本統計量、欠損値・分布・相関分析等のEDA処理
 """
 from typing import Optional, Dict, Any
+import threading
+import time
 import pandas as pd
 import numpy as np
+from src.logic import chart_data, correlation
+from src.logic.profile import QUANTILES, DatasetProfile, Moments, profile_dataframe
+from src.logic.sketches import HyperLogLog, KLLSketch
+from src.utils.logger import get_logger
+from src.utils.settings import get_int_env
 
-def describe_basic(df: pd.DataFrame) -> pd.DataFrame:
-    """基本統計量（describe相当）を返す"""
-    return df.describe(include='all').T
+logger = get_logger(__name__)
 
-def missing_info(df: pd.DataFrame) -> pd.DataFrame:
-    """各列の欠損数・欠損率を返す"""
-    total = df.isnull().sum()
-    percent = df.isnull().mean() * 100
-    return pd.DataFrame({'欠損数': total, '欠損率(%)': percent})
+def describe_basic(df: pd.DataFrame, profile: Optional[DatasetProfile] = None) -> pd.DataFrame:
+    """基本統計量（describe相当）を返す（計算済みのプロファイルがあればそれを使う）"""
+    return (profile or profile_dataframe(df)).describe()
 
-def corr_matrix(df: pd.DataFrame, method: str = 'pearson') -> pd.DataFrame:
-    """相関係数行列を返す"""
-    num_df = df.select_dtypes(include="number")
-    return num_df.corr(method=method)
+def missing_info(df: pd.DataFrame, profile: Optional[DatasetProfile] = None) -> pd.DataFrame:
+    """各列の欠損数・欠損率を返す（計算済みのプロファイルがあればそれを使う）"""
+    return (profile or profile_dataframe(df)).missing()
+
+def corr_matrix(df: pd.DataFrame, method: str = 'pearson', sample_size: Optional[int] = None,
+                token: Optional[str] = None) -> pd.DataFrame:
+    """相関係数行列を返す（sample_size を指定すると一様抽出した行で近似する）
+    計算は correlation モジュールに委ね、token（データセットのバージョン）があれば結果と順位をキャッシュする。
+    """
+    if sample_size is not None and len(df) > sample_size:
+        df = sample_rows(df, sample_size)
+        token = None if token is None else f'{token}:sample{sample_size}'
+    return correlation.corr_matrix(df, method=method, token=token)
+
+
+# --- 近似モード（大規模データ向け、オプトイン） ---
+
+def approx_sample_size() -> int:
+    return get_int_env('APPROX_EDA_SAMPLE_ROWS', 100_000)
+
+
+def sample_rows(df: pd.DataFrame, n: int, seed: int = 0, stratify: Optional[str] = None) -> pd.DataFrame:
+    """行を非復元で一様抽出する（元の順序を保つ）
+    stratify を指定すると、その列の各値（層）が少なくとも 1 行は含まれるようにする（比例配分に、
+    抽出されなかった少数の層の先頭行を加える）。
+    """
+    idx = chart_data.sample_indices(len(df), n, seed)
+    if stratify is not None and len(idx) < len(df):
+        codes, uniques = pd.factorize(df[stratify], use_na_sentinel=False)
+        missing = np.setdiff1d(np.arange(len(uniques)), codes[idx])
+        if len(missing):
+            first = pd.Series(np.arange(len(codes))).groupby(codes).first().to_numpy()
+            idx = np.union1d(idx, first[missing])
+    return df.iloc[idx]
+
+
+class _ApproxColumn:
+    """1 列分のストリーミング集計状態（モーメント・最小/最大・KLL・HyperLogLog・上位値の候補）"""
+    _MAX_TOP_CANDIDATES = 10_000
+
+    def __init__(self, s: pd.Series):
+        if pd.api.types.is_bool_dtype(s):
+            self.kind = 'categorical'
+        elif pd.api.types.is_datetime64_any_dtype(s):
+            self.kind = 'datetime'
+        elif pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_complex_dtype(s):
+            self.kind = 'numeric'
+        else:
+            self.kind = 'categorical'
+        self.rows = 0
+        self.nulls = 0
+        self.moments = Moments()
+        self.lo, self.hi = np.inf, -np.inf
+        self.kll = KLLSketch()
+        self.hll = HyperLogLog()
+        self.top = pd.Series(dtype='float64')
+
+    def update(self, s: pd.Series) -> None:
+        self.rows += len(s)
+        if self.kind == 'categorical':
+            try:
+                vc = s.value_counts(dropna=True)
+                self.hll.update(s.dropna())
+            except TypeError:
+                # ハッシュ不能な値を含む列は欠損数だけを数える
+                self.nulls += int(s.isna().sum())
+                return
+            self.nulls += len(s) - int(vc.sum())
+            top = self.top.add(vc.astype('float64'), fill_value=0)
+            if len(top) > self._MAX_TOP_CANDIDATES:
+                top = top.nlargest(self._MAX_TOP_CANDIDATES)
+            self.top = top
+            return
+        if self.kind == 'datetime':
+            if getattr(s.dt, 'tz', None) is not None:
+                s = s.dt.tz_localize(None)
+            ints = s.to_numpy(dtype='datetime64[ns]').view(np.int64)
+            values = ints[ints != np.iinfo(np.int64).min].astype(np.float64)
+        else:
+            values = s.to_numpy(dtype=np.float64, na_value=np.nan)
+            values = values[~np.isnan(values)]
+        self.nulls += len(s) - len(values)
+        if len(values) == 0:
+            return
+        self.moments.merge(Moments.from_array(values))
+        self.lo, self.hi = min(self.lo, float(values.min())), max(self.hi, float(values.max()))
+        self.kll.update(values)
+        self.hll.update(values)
+
+    def summary(self, n_total: int, z: float) -> Dict[str, Any]:
+        """見た行から全体を推定し、信頼区間の半幅（*_ci）を付けた 1 行分の統計量を返す"""
+        m = self.rows
+        fpc = np.sqrt(max(0.0, 1 - m / n_total)) if n_total else 0.0  # 有限母集団修正
+        nonnull = m - self.nulls
+        p = nonnull / m if m else 0.0
+        row: Dict[str, Any] = {
+            'count': n_total * p,
+            'count_ci': z * n_total * np.sqrt(p * (1 - p) / m) * fpc if m else np.nan,
+        }
+        exact = m >= n_total
+        if self.kind == 'categorical':
+            if len(self.top):
+                best = self.top.idxmax()
+                row['top'], row['freq'] = best, self.top[best] * n_total / m
+            row['unique'] = self.hll.estimate()
+            # 全行を見終わるまでは見た範囲の値の種類数（下限）なので区間は出さない
+            row['unique_ci'] = z * self.hll.relative_error * row['unique'] if exact else np.nan
+            return row
+        if self.moments.count == 0:
+            return row
+        se = self.moments.std / np.sqrt(self.moments.count) * fpc
+        qs = self.kll.quantiles(QUANTILES)
+        row.update({
+            'mean': self.moments.mean, 'mean_ci': z * se, 'std': self.moments.std,
+            'min': self.lo, 'max': self.hi,
+            'unique': self.hll.estimate(),
+            'unique_ci': z * self.hll.relative_error * self.hll.estimate() if exact else np.nan,
+            'quantile_rank_err': z * 0.5 / np.sqrt(self.moments.count) * fpc + self.kll.rank_error(z),
+        })
+        row.update({f'{q:.0%}': v for q, v in zip(QUANTILES, qs)})
+        if self.kind == 'datetime':
+            for key in ['mean', 'min', 'max'] + [f'{q:.0%}' for q in QUANTILES]:
+                row[key] = pd.Timestamp(int(round(row[key])))
+            row['mean_ci'] = pd.to_timedelta(row['mean_ci'], unit='ns')
+            del row['std']
+        return row
+
+
+class ApproxDescribe:
+    """近似モードの基本統計量・欠損値情報
+    生成時に一様（または層化）サンプルから推定値と信頼区間を計算して即座に返せるようにし、
+    `start()` 後はバックグラウンドスレッドで全行を無作為な順に（ブロックの行数ずつ）集計して、推定値を
+    正確な値へ近づけていく（全行処理後の件数・欠損数・平均・最小/最大は正確な値になる）。
+    """
+
+    def __init__(self, df: pd.DataFrame, sample_size: Optional[int] = None, block_rows: Optional[int] = None,
+                 seed: int = 0, stratify: Optional[str] = None, z: float = 1.96):
+        self.df = df
+        self.n_rows = len(df)
+        self.z = z
+        self.seed = seed
+        self.block_rows = block_rows or get_int_env('APPROX_EDA_BLOCK_ROWS', 1_000_000)
+        self.sample = sample_rows(df, sample_size or approx_sample_size(), seed=seed, stratify=stratify)
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        columns = self._new_state()
+        for state, (_, s) in zip(columns.values(), self.sample.items()):
+            state.update(s)
+        self._publish(columns, len(self.sample))
+
+    def _new_state(self) -> Dict[Any, _ApproxColumn]:
+        return {name: _ApproxColumn(s) for name, s in self.df.items()}
+
+    def _publish(self, columns: Dict[Any, _ApproxColumn], seen: int) -> None:
+        table = pd.DataFrame.from_dict(
+            {name: state.summary(self.n_rows, self.z) for name, state in columns.items()}, orient='index')
+        order = ['count', 'count_ci', 'unique', 'unique_ci', 'top', 'freq', 'mean', 'mean_ci', 'std', 'min'] \
+            + [f'{q:.0%}' for q in QUANTILES] + ['max', 'quantile_rank_err']
+        table = table.reindex(columns=[c for c in order if c in table.columns])
+        with self._lock:
+            self._table = table
+            self._seen = seen
+
+    # --- バックグラウンドでの精緻化 ---
+    def start(self) -> 'ApproxDescribe':
+        if self._thread is None and self.n_rows > len(self.sample):
+            self._thread = threading.Thread(target=self._refine, name='approx-eda', daemon=True)
+            self._thread.start()
+        return self
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def _refine(self) -> None:
+        columns = self._new_state()
+        # 行を無作為に並べ替えた順に block_rows 行ずつ集計する（途中で公開する推定値も一様な非復元抽出に
+        # 基づくため、ソート済みの列でも信頼区間が成り立つ）。連続したブロックを無作為な順に読むと、
+        # 見た範囲が値の偏ったブロックに限られる。
+        order = np.arange(self.n_rows, dtype=np.int32 if self.n_rows < 2 ** 31 else np.int64)
+        np.random.default_rng(self.seed).shuffle(order)
+        seen = 0
+        started = time.perf_counter()
+        for start in range(0, self.n_rows, self.block_rows):
+            if self._cancel.is_set():
+                return
+            chunk = self.df.iloc[np.sort(order[start:start + self.block_rows])]
+            for state, (_, s) in zip(columns.values(), chunk.items()):
+                state.update(s)
+            seen += len(chunk)
+            # サンプルより多くの行を見てから公開する（初期推定より精度が落ちないように）
+            if seen > len(self.sample):
+                self._publish(columns, seen)
+        logger.info("approx eda: refined to exact counts rows=%d seconds=%.2f", seen, time.perf_counter() - started)
+
+    # --- 参照 ---
+    @property
+    def rows_seen(self) -> int:
+        with self._lock:
+            return self._seen
+
+    @property
+    def progress(self) -> float:
+        return self.rows_seen / self.n_rows if self.n_rows else 1.0
+
+    @property
+    def done(self) -> bool:
+        return self.rows_seen >= self.n_rows
+
+    def describe(self) -> pd.DataFrame:
+        """describe 相当の推定値と、信頼区間の半幅（count_ci, unique_ci, mean_ci）・分位点の順位誤差"""
+        with self._lock:
+            return self._table.copy()
+
+    def missing(self) -> pd.DataFrame:
+        """各列の欠損数・欠損率の推定値"""
+        table = self.describe()
+        nulls = self.n_rows - table['count']
+        return pd.DataFrame({'欠損数': nulls.round().astype('int64'),
+                             '欠損率(%)': nulls * 100 / self.n_rows if self.n_rows else 0.0,
+                             '欠損数 ±': table['count_ci']})
+
+    def numeric_columns(self) -> list:
+        return [name for name, s in self.df.items()
+                if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s)
+                and not pd.api.types.is_complex_dtype(s)]
@@ -0,0 +1,148 @@
+"""
+encoding.py
+カテゴリ列の One-Hot エンコーディング（疎な出力と値の種類数のガード）
+値の種類が多い列を密な列に展開すると列数 × 行数のメモリを使うため、出力は CSR 行列か pandas の疎な列
+（SparseDtype）にし、展開する前に値の種類数を確認する。種類数が多い列は、出現数の上位 k 個と「その他」
+への集約か、ハッシュ値を列数で割った余りへの振り分け（ハッシュトリック）で列数を抑える。
+学習した対応（値 → 列）は `OneHotEncoding` に保持し、`to_params` で操作のパラメータ（JSON）にできるため、
+パイプラインで新しいバッチに再適用しても同じ列が作られる（再学習しない）。
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from src.utils.frame import shallow_copy
+from src.utils.logger import get_logger
+from src.utils.settings import get_int_env
+
+logger = get_logger(__name__)
+
+# 'onehot' … 全ての値に 1 列ずつ、'top_k' … 上位 k 個 + その他、'hash' … ハッシュトリック
+METHODS = ('onehot', 'top_k', 'hash')
+# 上位 k 個に入らない値（と学習時に無かった値）をまとめる列の接尾辞
+OTHER = '(other)'
+DEFAULT_HASH_FEATURES = 256
+
+
+class CardinalityError(ValueError):
+    """値の種類数が上限を超えているため、そのまま One-Hot にできない"""
+
+    def __init__(self, column: Any, n_unique: int, limit: int):
+        super().__init__(f"列 {column} の値の種類数（{n_unique}）が One-Hot の上限（{limit}）を超えています。"
+                         f"上位 k 個 + その他、またはハッシュを使ってください")
+        self.column = column
+        self.n_unique = n_unique
+        self.limit = limit
+
+
+def max_categories() -> int:
+    """そのまま One-Hot にできる値の種類数の上限（`ONE_HOT_MAX_CATEGORIES`）"""
+    return get_int_env('ONE_HOT_MAX_CATEGORIES', 1000)
+
+
+def _py(value: Any) -> Any:
+    """NumPy のスカラーを JSON にできる Python の値にする"""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+@dataclass
+class OneHotEncoding:
+    """学習済みの One-Hot の対応（列 → 出力列）"""
+    column: Any
+    method: str = 'onehot'
+    categories: List[Any] = field(default_factory=list)
+    n_features: int = 0
+
+    @property
+    def width(self) -> int:
+        if self.method == 'hash':
+            return self.n_features
+        return len(self.categories) + (self.method == 'top_k')
+
+    @property
+    def feature_names(self) -> List[str]:
+        """出力列名（pd.get_dummies と同じ '列_値' 形式）"""
+        if self.method == 'hash':
+            return [f'{self.column}_hash_{i}' for i in range(self.n_features)]
+        names = [f'{self.column}_{c}' for c in self.categories]
+        return names + [f'{self.column}_{OTHER}'] if self.method == 'top_k' else names
+
+    def to_params(self) -> Dict[str, Any]:
+        """操作のパラメータ（バージョンストア・パイプラインに記録する）"""
+        params: Dict[str, Any] = {'column': self.column, 'method': self.method}
+        if self.method == 'hash':
+            params['n_features'] = self.n_features
+        else:
+            params['categories'] = [_py(c) for c in self.categories]
+        return params
+
+    def codes(self, s: pd.Series) -> np.ndarray:
+        """各行が 1 になる出力列の位置（欠損は -1 で、どの列も 0）"""
+        missing = s.isna().to_numpy()
+        if self.method == 'hash':
+            hashed = pd.util.hash_array(s.astype(str).to_numpy(dtype=object), categorize=True)
+            codes = (hashed % np.uint64(self.n_features)).astype(np.int64)
+        else:
+            codes = pd.Index(self.categories).get_indexer(s)
+            if self.method == 'top_k':
+                codes[codes < 0] = len(self.categories)
+        codes[missing] = -1
+        return codes
+
+    def transform_sparse(self, s: pd.Series) -> sp.csr_matrix:
+        """行数 × 出力列数の CSR 行列（uint8）"""
+        codes = self.codes(s)
+        rows = np.flatnonzero(codes >= 0)
+        data = np.ones(len(rows), dtype=np.uint8)
+        return sp.csr_matrix((data, (rows, codes[rows])), shape=(len(s), self.width))
+
+    def transform_frame(self, s: pd.Series, sparse: bool = True) -> pd.DataFrame:
+        """出力列の DataFrame（sparse なら Sparse[uint8, 0] の列、それ以外は密な bool 列）"""
+        matrix = self.transform_sparse(s)
+        if sparse:
+            return pd.DataFrame.sparse.from_spmatrix(matrix.tocsc(), index=s.index, columns=self.feature_names)
+        return pd.DataFrame(matrix.toarray().astype(bool), index=s.index, columns=self.feature_names)
+
+    def apply(self, df: pd.DataFrame, sparse: bool = True) -> pd.DataFrame:
+        """元の列を出力列に置き換えた DataFrame（出力列は末尾に追加する）"""
+        encoded = self.transform_frame(df[self.column], sparse=sparse)
+        res = shallow_copy(df).drop(columns=[self.column])
+        return pd.concat([res, encoded], axis=1)
+
+
+def _sorted(values: pd.Index) -> List[Any]:
+    try:
+        return list(values.sort_values())
+    except TypeError:
+        # 型が混在して並べられない場合は出現順
+        return list(values)
+
+
+def fit_one_hot(s: pd.Series, method: str = 'onehot', top_k: Optional[int] = None,
+                n_features: Optional[int] = None, limit: Optional[int] = None) -> OneHotEncoding:
+    """列から One-Hot の対応を学習する
+    Args:
+        method: METHODS のいずれか
+        top_k: 'top_k' で残す値の数（既定は上限と同じ）
+        n_features: 'hash' の出力列数
+        limit: 'onehot' の値の種類数の上限（既定は `max_categories()`）
+    Raises:
+        CardinalityError: 'onehot' で値の種類数が上限を超えている場合
+    """
+    if method not in METHODS:
+        raise ValueError(f"未対応のエンコーディング方法です: {method}")
+    if method == 'hash':
+        return OneHotEncoding(s.name, method, n_features=int(n_features or DEFAULT_HASH_FEATURES))
+    limit = limit or max_categories()
+    counts = s.value_counts(dropna=True, sort=(method == 'top_k'))
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        counts = counts[counts > 0]
+    if method == 'top_k':
+        enc = OneHotEncoding(s.name, method, categories=list(counts.index[:int(top_k or limit)]))
+    elif len(counts) > limit:
+        raise CardinalityError(s.name, len(counts), limit)
+    else:
+        enc = OneHotEncoding(s.name, method, categories=_sorted(counts.index))
+    logger.info("fit_one_hot: column=%s method=%s n_unique=%d width=%d", s.name, method, len(counts), enc.width)
+    return enc
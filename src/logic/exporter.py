@@ -0,0 +1,151 @@
+"""
+exporter.py
+DataFrame の CSV/Parquet エクスポート。
+ダウンロード要求時にのみチャンク単位でディスクへ書き出し、DataFrame のフィンガープリントをキーにキャッシュする。
+"""
+from typing import BinaryIO, Callable
+import functools
+import hashlib
+import io
+import os
+import uuid
+import pandas as pd
+from src.utils.frame import dense_view
+from src.utils.logger import get_logger
+from src.utils.settings import get_cache_dir, get_int_env
+
+logger = get_logger(__name__)
+
+EXPORT_FORMATS = ('csv', 'parquet')
+
+
+def _chunk_rows() -> int:
+    return get_int_env('EXPORT_CHUNK_ROWS', 100_000)
+
+
+def dataframe_fingerprint(df: pd.DataFrame, chunk_rows: int = 1_000_000) -> str:
+    """DataFrame の内容（列名・型・値・インデックス）から決定的なフィンガープリントを返す
+    シリアライズは行わず、`hash_pandas_object` の行ハッシュを行チャンクごとに畳み込む。
+    """
+    h = hashlib.sha256()
+    h.update(repr((df.shape, [str(c) for c in df.columns], [str(t) for t in df.dtypes])).encode('utf-8'))
+    try:
+        for start in range(0, len(df), chunk_rows):
+            row_hash = pd.util.hash_pandas_object(df.iloc[start:start + chunk_rows], index=True)
+            h.update(row_hash.to_numpy().tobytes())
+    except TypeError:
+        # list 等ハッシュ不能な値を含む場合はキャッシュを共有しない（毎回ユニーク）
+        h.update(uuid.uuid4().bytes)
+    return h.hexdigest()
+
+
+def write_csv(df: pd.DataFrame, dest: BinaryIO, chunk_rows: int = 0) -> None:
+    """DataFrame を UTF-8 (BOM付き) の CSV として `dest` にチャンク単位で書き出す
+    列名は header 引数で文字列化するため、DataFrame のコピーは作らない。
+    """
+    text = io.TextIOWrapper(dest, encoding='utf-8-sig', newline='')
+    try:
+        df.to_csv(text, index=False, header=[str(c) for c in df.columns],
+                  chunksize=chunk_rows or _chunk_rows())
+        text.flush()
+    finally:
+        # dest 自体は呼び出し側が管理するため、ラッパーだけを切り離す
+        text.detach()
+
+
+def write_parquet(df: pd.DataFrame, dest: BinaryIO, row_group_size: int = 0) -> None:
+    """DataFrame を Parquet として `dest` に行グループ単位で書き出す
+    全体を一度に Arrow テーブルへ変換せず、行グループごとに変換して書き込む。
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Arrow は疎な列（One-Hot の出力等）を扱えないため、変換するチャンクごとに密にする
+    step = row_group_size or _chunk_rows()
+    if len(df) <= step:
+        pq.write_table(pa.Table.from_pandas(dense_view(df), preserve_index=False), dest)
+        return
+
+    first = pa.Table.from_pandas(dense_view(df.iloc[:step]), preserve_index=False)
+    try:
+        with pq.ParquetWriter(dest, first.schema) as writer:
+            writer.write_table(first)
+            for start in range(step, len(df), step):
+                chunk = pa.Table.from_pandas(dense_view(df.iloc[start:start + step]), schema=first.schema,
+                                             preserve_index=False)
+                writer.write_table(chunk)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # 先頭チャンクから推論したスキーマに後続チャンクが合わない場合（全欠損の object 列等）は一括変換にフォールバック
+        logger.info("write_parquet: schema mismatch across row groups, falling back to single conversion")
+        dest.seek(0)
+        dest.truncate()
+        pq.write_table(pa.Table.from_pandas(dense_view(df), preserve_index=False), dest, row_group_size=step)
+
+
+_WRITERS = {
+    'csv': write_csv,
+    'parquet': write_parquet,
+}
+
+
+def _prune_cache(cache_dir: str, keep: str) -> None:
+    """キャッシュ総量が上限を超えた場合、更新日時の古いファイルから削除する"""
+    max_bytes = get_int_env('EXPORT_CACHE_MAX_BYTES', 2 * 1024 ** 3)
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.endswith('.tmp') or not os.path.isfile(path):
+            continue
+        st_ = os.stat(path)
+        entries.append((st_.st_mtime, st_.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+            logger.info("export cache evicted: %s bytes=%d", os.path.basename(path), size)
+        except OSError:
+            pass
+
+
+def export_to_cache(df: pd.DataFrame, fmt: str) -> str:
+    """エクスポート済みファイルのパスを返す（未生成ならチャンク書き出しで生成する）"""
+    if fmt not in _WRITERS:
+        raise ValueError(f'unsupported export format: {fmt}')
+    cache_dir = get_cache_dir('exports')
+    fingerprint = dataframe_fingerprint(df)
+    path = os.path.join(cache_dir, f'{fingerprint}.{fmt}')
+    if os.path.exists(path):
+        os.utime(path)
+        logger.info("export cache hit: fmt=%s fingerprint=%s", fmt, fingerprint)
+        return path
+
+    # 同時ダウンロードでも壊れたファイルを参照しないよう、一時ファイルに書いてから置き換える
+    tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+    try:
+        with open(tmp, 'wb') as f:
+            _WRITERS[fmt](df, f)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    logger.info("export encoded: fmt=%s fingerprint=%s bytes=%d", fmt, fingerprint, os.path.getsize(path))
+    _prune_cache(cache_dir, keep=path)
+    return path
+
+
+def read_export(df: pd.DataFrame, fmt: str) -> bytes:
+    """エクスポート済みファイルの内容を返す（ファイルは読み終えたら閉じる）"""
+    with open(export_to_cache(df, fmt), 'rb') as f:
+        return f.read()
+
+
+def deferred_export(df: pd.DataFrame, fmt: str) -> Callable[[], bytes]:
+    """`st.download_button` の data に渡す遅延生成関数を返す
+    ボタンが押されたときにだけエンコード（またはキャッシュ参照）が実行される。
+    """
+    return functools.partial(read_export, df, fmt)
@@ -2,69 +2,124 @@
 feature_engineering.py
 列演算、エンコーディング、スケーリング、日付特徴量抽出
 """
-from typing import Optional, List
+from typing import Any, Callable, Optional, List, Dict, Tuple
 import pandas as pd
-from sklearn.preprocessing import OneHotEncoder, LabelEncoder, StandardScaler, MinMaxScaler
-import numpy as np
+from src.logic import datetimes, parallel, transforms
+from src.logic.encoding import OneHotEncoding, fit_one_hot
 from src.utils.logger import get_logger
-try:
-    import streamlit as st
-    _session_uid = st.session_state.get('session_uid') if hasattr(st, 'session_state') else None
-except Exception:
-    _session_uid = None
+from src.utils.frame import shallow_copy, widen_numeric
+logger = get_logger(__name__)
 
-logger = get_logger(__name__, session_uid=_session_uid)
-
-def add_column_by_operation(df: pd.DataFrame, col1: str, col2: Optional[str], op: str, const: Optional[float] = None) -> pd.DataFrame:
-    """列同士または定数による新規列生成"""
-    df = df.copy()
+def operation_column(df: pd.DataFrame, col1: str, col2: Optional[str], op: str, const: Optional[float] = None) -> Optional[Tuple[str, pd.Series]]:
+    """列同士または定数による演算結果の (列名, 値) を返す（該当しない演算は None）"""
+    # ダウンキャスト済みの列は 64bit に戻してから計算する（int8 同士の乗算の桁あふれや float32 の精度低下を防ぐ）
+    a = widen_numeric(df[col1])
     if op == '加算':
-        df[f'{col1}_plus_{col2}'] = df[col1] + df[col2]
+        return f'{col1}_plus_{col2}', a + widen_numeric(df[col2])
     elif op == '減算':
-        df[f'{col1}_minus_{col2}'] = df[col1] - df[col2]
+        return f'{col1}_minus_{col2}', a - widen_numeric(df[col2])
     elif op == '乗算':
-        df[f'{col1}_mul_{col2}'] = df[col1] * df[col2]
+        return f'{col1}_mul_{col2}', a * widen_numeric(df[col2])
     elif op == '除算':
-        df[f'{col1}_div_{col2}'] = df[col1] / df[col2]
+        return f'{col1}_div_{col2}', a / widen_numeric(df[col2])
     elif op == '定数加算' and const is not None:
-        df[f'{col1}_plus_{const}'] = df[col1] + const
+        return f'{col1}_plus_{const}', a + const
+    return None
+
+def add_column_by_operation(df: pd.DataFrame, col1: str, col2: Optional[str], op: str, const: Optional[float] = None) -> pd.DataFrame:
+    """列同士または定数による新規列生成"""
+    df = shallow_copy(df)
+    result = operation_column(df, col1, col2, op, const)
+    if result is not None:
+        name, values = result
+        df[name] = values
     return df
 
-def one_hot_encode(df: pd.DataFrame, column: str) -> pd.DataFrame:
-    """One-Hot Encoding"""
-    logger.info("one_hot_encode: column=%s", column)
-    return pd.get_dummies(df, columns=[column], drop_first=False)
+def one_hot_encode(df: pd.DataFrame, column: str, method: str = 'onehot', categories: Optional[List[Any]] = None,
+                   top_k: Optional[int] = None, n_features: Optional[int] = None, sparse: bool = True) -> pd.DataFrame:
+    """One-Hot Encoding（既定では疎な列で出力する）
+    categories（'hash' では n_features）を渡すと学習済みの対応をそのまま適用し、無ければこのデータから学習する。
+    """
+    if categories is not None or (method == 'hash' and n_features):
+        enc = OneHotEncoding(column, method, categories=list(categories or []), n_features=int(n_features or 0))
+    else:
+        enc = fit_one_hot(df[column], method, top_k=top_k, n_features=n_features)
+    logger.info("one_hot_encode: column=%s method=%s width=%d sparse=%s", column, method, enc.width, sparse)
+    return enc.apply(df, sparse=sparse)
+
+def _fitted_column(kind: str, s: pd.Series, **params: Any) -> Tuple[pd.Series, Dict[str, Any]]:
+    """学習済みのパラメータで 1 列を変換する（パラメータが揃っていなければこの列で学習する）"""
+    if any(v is None for v in params.values()):
+        params = transforms.fit(kind, s.to_frame(), [s.name]).column_params(s.name)
+    return transforms.KINDS[kind].apply(s, **params), params
 
-def label_encode(df: pd.DataFrame, column: str) -> pd.DataFrame:
+def label_encode_column(s: pd.Series, classes: Optional[List[Any]] = None) -> pd.Series:
+    """1 列の Label Encoding（classes を渡すと学習済みの対応で変換し、無かった値は -1）"""
+    res, params = _fitted_column('label', s, classes=classes)
+    logger.info("label_encode: column=%s classes=%d", s.name, len(params['classes']))
+    return res
+
+def label_encode(df: pd.DataFrame, column: str, classes: Optional[List[Any]] = None) -> pd.DataFrame:
     """Label Encoding"""
-    df = df.copy()
-    le = LabelEncoder()
-    df[column] = le.fit_transform(df[column].astype(str))
-    logger.info("label_encode: column=%s classes=%s", column, getattr(le, 'classes_', None))
+    df = shallow_copy(df)
+    df[column] = label_encode_column(df[column], classes)
     return df
 
-def standard_scale(df: pd.DataFrame, column: str) -> pd.DataFrame:
-    """標準化（StandardScaler）"""
-    df = df.copy()
-    scaler = StandardScaler()
-    df[column] = scaler.fit_transform(df[[column]])
-    logger.info("standard_scale: column=%s mean=%s std=%s", column, float(scaler.mean_[0]) if hasattr(scaler, 'mean_') else None, float(scaler.scale_[0]) if hasattr(scaler, 'scale_') else None)
-    return df
+def standard_scale_column(s: pd.Series, mean: Optional[float] = None, scale: Optional[float] = None) -> pd.Series:
+    """1 列の標準化（mean・scale を渡すと学習済みのパラメータで変換する）"""
+    res, params = _fitted_column('standard', s, mean=mean, scale=scale)
+    logger.info("standard_scale: column=%s mean=%s std=%s", s.name, params['mean'], params['scale'])
+    return res
 
-def minmax_scale(df: pd.DataFrame, column: str) -> pd.DataFrame:
-    """正規化（MinMaxScaler）"""
-    df = df.copy()
-    scaler = MinMaxScaler()
-    df[column] = scaler.fit_transform(df[[column]])
-    logger.info("minmax_scale: column=%s data_min=%s data_max=%s", column, float(scaler.data_min_[0]) if hasattr(scaler, 'data_min_') else None, float(scaler.data_max_[0]) if hasattr(scaler, 'data_max_') else None)
+def fitted_columns(kind: str, df: pd.DataFrame, columns: List[Any], **params: Any) -> Dict[Any, pd.Series]:
+    """学習済みのパラメータ（列ごとの値のリスト）で複数列を変換する
+    パラメータが揃っていなければ選択列をまとめた 1 つの配列に対して 1 回の走査で学習する。
+    """
+    if any(v is None for v in params.values()):
+        fitted = transforms.fit(kind, df, columns)
+    else:
+        fitted = transforms.FittedTransform(kind, list(columns), {k: list(v) for k, v in params.items()})
+    logger.info("%s: columns=%s params=%s", kind, list(columns), fitted.params)
+    return parallel.map_columns(lambda cols: {c: fitted.transform_column(df[c], c) for c in cols}, columns, len(df))
+
+def _scaled(kind: str, df: pd.DataFrame, column: Optional[str], columns: Optional[List[str]],
+            column_fn: Callable[..., pd.Series], **params: Any) -> pd.DataFrame:
+    df = shallow_copy(df)
+    if columns:
+        for c, s in fitted_columns(kind, df, list(columns), **params).items():
+            df[c] = s
+    else:
+        df[column] = column_fn(df[column], **params)
     return df
 
-def extract_date_features(df: pd.DataFrame, column: str) -> pd.DataFrame:
-    """日付型から年・月・曜日・休日フラグを抽出"""
-    df = df.copy()
-    df[f'{column}_year'] = pd.to_datetime(df[column], errors='coerce').dt.year
-    df[f'{column}_month'] = pd.to_datetime(df[column], errors='coerce').dt.month
-    df[f'{column}_weekday'] = pd.to_datetime(df[column], errors='coerce').dt.weekday
-    df[f'{column}_is_holiday'] = pd.to_datetime(df[column], errors='coerce').dt.weekday >= 5
-    logger.info("extract_date_features: column=%s", column)
+def standard_scale(df: pd.DataFrame, column: Optional[str], mean: Optional[Any] = None, scale: Optional[Any] = None,
+                   columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """標準化（StandardScaler と同じく母標準偏差で割る）
+    columns を渡すと複数列をまとめて学習・変換する（mean・scale は列ごとの値のリスト）。
+    """
+    return _scaled('standard', df, column, columns, standard_scale_column, mean=mean, scale=scale)
+
+def minmax_scale_column(s: pd.Series, data_min: Optional[float] = None, data_max: Optional[float] = None) -> pd.Series:
+    """1 列の正規化（data_min・data_max を渡すと学習済みのパラメータで変換する）"""
+    res, params = _fitted_column('minmax', s, data_min=data_min, data_max=data_max)
+    logger.info("minmax_scale: column=%s data_min=%s data_max=%s", s.name, params['data_min'], params['data_max'])
+    return res
+
+def minmax_scale(df: pd.DataFrame, column: Optional[str], data_min: Optional[Any] = None, data_max: Optional[Any] = None,
+                 columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """正規化（MinMaxScaler と同じく [0, 1] に写す）
+    columns を渡すと複数列をまとめて学習・変換する（data_min・data_max は列ごとの値のリスト）。
+    """
+    return _scaled('minmax', df, column, columns, minmax_scale_column, data_min=data_min, data_max=data_max)
+
+def date_feature_columns(s: pd.Series, column: str, parts: Optional[List[str]] = None) -> Dict[str, pd.Series]:
+    """日付列から年・月・曜日・休日フラグ等の列を作る（文字列は 1 回だけ解析し、解析結果はキャッシュする）"""
+    return datetimes.date_parts(datetimes.parse(s), column, parts)
+
+def extract_date_features(df: pd.DataFrame, column: str, parts: Optional[List[str]] = None) -> pd.DataFrame:
+    """日付型から年・月・曜日・休日フラグ（parts で時・周期の sin/cos も）を抽出"""
+    df = shallow_copy(df)
+    for name, values in date_feature_columns(df[column], column, parts).items():
+        df[name] = values
+    logger.info("extract_date_features: column=%s parts=%s", column, parts)
     return df
@@ -0,0 +1,123 @@
+"""
+fingerprint.py
+アップロードデータのフィンガープリント計算
+- パーサがストリームを読み進めるのと同時に SHA256 を計算する `HashingReader`
+- バイト列を複製せずに参照する `source_view`
+- サイズと先頭・中間・末尾のサンプルから計算する高速な事前チェック `quick_fingerprint`
+"""
+from typing import Any, Iterator, Optional
+import contextlib
+import hashlib
+import io
+
+try:
+    import xxhash  # 任意依存: あればサンプルハッシュに使う
+except ImportError:  # pragma: no cover - optional dependency
+    xxhash = None
+
+QUICK_SAMPLES = 16
+QUICK_SAMPLE_BYTES = 64 * 1024
+
+
+@contextlib.contextmanager
+def source_view(file: Any) -> Iterator[memoryview]:
+    """UploadedFile / BytesIO / bytes の内容をコピーせずに memoryview として参照する
+    getbuffer() を持たないファイルオブジェクトのみ、一度だけ読み込む。
+    """
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        view = memoryview(file)
+    elif hasattr(file, 'getbuffer'):
+        view = file.getbuffer()
+    elif hasattr(file, 'read'):
+        if hasattr(file, 'seek'):
+            file.seek(0)
+        view = memoryview(file.read())
+    else:
+        raise TypeError('file must be a file-like object or bytes')
+    try:
+        yield view
+    finally:
+        # BytesIO の getbuffer() はビューが生きている間リサイズできないため解放する
+        # （他のオブジェクトがまだ参照している場合は GC に任せる）
+        try:
+            view.release()
+        except BufferError:
+            pass
+
+
+def quick_fingerprint(view: memoryview) -> str:
+    """サイズと等間隔サンプルのハッシュから高速なフィンガープリントを返す
+    衝突の可能性があるため、キャッシュ未登録の判定（確実なミス）にのみ使い、ヒット時は SHA256 で検証する。
+    """
+    size = len(view)
+    h = xxhash.xxh3_128() if xxhash is not None else hashlib.blake2b(digest_size=16)
+    h.update(size.to_bytes(8, 'little'))
+    if size <= QUICK_SAMPLES * QUICK_SAMPLE_BYTES:
+        h.update(view)
+    else:
+        step = (size - QUICK_SAMPLE_BYTES) // (QUICK_SAMPLES - 1)
+        for i in range(QUICK_SAMPLES):
+            start = i * step
+            h.update(view[start:start + QUICK_SAMPLE_BYTES])
+    return f'{size:x}-{h.hexdigest()}'
+
+
+def sha256_view(view: memoryview, block_size: int = 8 << 20) -> str:
+    """memoryview をスライス（コピーなし）で順に渡して SHA256 を計算する"""
+    h = hashlib.sha256()
+    for start in range(0, len(view), block_size):
+        h.update(view[start:start + block_size])
+    return h.hexdigest()
+
+
+class HashingReader(io.RawIOBase):
+    """memoryview を読み出しながら SHA256 を逐次計算するリーダー
+    パーサにファイルオブジェクトとして渡すことで、ハッシュ計算と解析を 1 回の走査で行う。
+    先頭への seek（パーサのフォールバック時の再読込）ではハッシュ状態もリセットする。
+    """
+
+    def __init__(self, view: memoryview):
+        super().__init__()
+        self._view = view
+        self._pos = 0
+        self._hash = hashlib.sha256()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b: Any) -> int:
+        n = min(len(b), len(self._view) - self._pos)
+        if n <= 0:
+            return 0
+        chunk = self._view[self._pos:self._pos + n]
+        b[:n] = chunk
+        self._hash.update(chunk)
+        self._pos += n
+        return n
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET and offset == 0:
+            self._pos = 0
+            self._hash = hashlib.sha256()
+            return 0
+        if whence == io.SEEK_CUR and offset == 0:
+            return self._pos
+        raise io.UnsupportedOperation('HashingReader only supports rewinding to the start')
+
+    def hexdigest(self) -> str:
+        """未読部分があれば読み切ってから SHA256 を返す"""
+        if self._pos < len(self._view):
+            self._hash.update(self._view[self._pos:])
+            self._pos = len(self._view)
+        return self._hash.hexdigest()
+
+
+def buffered_reader(reader: HashingReader, buffer_size: Optional[int] = None) -> io.BufferedReader:
+    """パーサに渡すためのバッファ付きリーダーを返す"""
+    return io.BufferedReader(reader, buffer_size or io.DEFAULT_BUFFER_SIZE * 128)
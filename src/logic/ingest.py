@@ -0,0 +1,160 @@
+"""
+ingest.py
+大容量 CSV のチャンク読み込み（アウトオブコア）
+チャンクごとに型をダウンキャストして Arrow テーブルとして保持し、メモリ予算を超えたらディスクへ退避する
+（退避ファイルは DataFrame に変換した後で削除する）。
+メモリ予算が抑えるのは読み込み中に保持する Arrow の中間データだけで、返す DataFrame 自体は全行分の
+メモリを使う（退避した場合はメモリマップしたファイルから変換するため、変換中もほぼ DataFrame 分で済む）。
+"""
+from typing import Any, BinaryIO, Dict, List, Optional
+import os
+import uuid
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from src.utils.frame import downcast_numeric
+from src.utils.logger import get_logger
+from src.utils.settings import get_cache_dir, get_int_env
+
+logger = get_logger(__name__)
+
+
+def default_chunk_rows() -> int:
+    return get_int_env('INGEST_CHUNK_ROWS', 500_000)
+
+
+def default_memory_budget() -> int:
+    """チャンク読み込み時にメモリ上に保持する Arrow データの上限（バイト）
+    読み込み中の中間データの上限であり、最終的な DataFrame の大きさは制限しない。
+    """
+    return get_int_env('INGEST_MEMORY_BUDGET_MB', 1024) * 1024 ** 2
+
+
+def downcast_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    """全数値列を `downcast_numeric` でダウンキャストする"""
+    for col in df.columns:
+        df[col] = downcast_numeric(df[col])
+    return df
+
+
+def _unify_type(types: List[pa.DataType]) -> pa.DataType:
+    """チャンク間で異なる列型を、全チャンクを表現できる共通型にまとめる"""
+    concrete = [t for t in types if not pa.types.is_null(t)]
+    if not concrete:
+        return pa.null()
+    if all(t == concrete[0] for t in concrete):
+        return concrete[0]
+    if all(pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_boolean(t) for t in concrete):
+        np_type = np.result_type(*[t.to_pandas_dtype() for t in concrete])
+        return pa.from_numpy_dtype(np_type)
+    # 数値と文字列が混在する列などは文字列として扱う
+    return pa.large_string()
+
+
+class _ChunkStore:
+    """Arrow テーブルのチャンクを保持し、予算超過時は Arrow IPC ファイルとしてディスクへ退避する"""
+
+    def __init__(self, memory_budget: int, spill_dir: str):
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.tables: List[pa.Table] = []
+        self.spilled: List[str] = []
+        self.in_memory_bytes = 0
+        self.types: Dict[str, List[pa.DataType]] = {}
+        self.names: Optional[List[str]] = None
+
+    def add(self, table: pa.Table) -> None:
+        if self.names is None:
+            self.names = table.column_names
+        for field in table.schema:
+            self.types.setdefault(field.name, []).append(field.type)
+        self.tables.append(table)
+        self.in_memory_bytes += table.nbytes
+        if self.in_memory_bytes > self.memory_budget:
+            self._spill()
+
+    def _spill(self) -> None:
+        for table in self.tables:
+            path = os.path.join(self.spill_dir, f'chunk-{uuid.uuid4().hex}.arrow')
+            with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            self.spilled.append(path)
+        logger.info("ingest: spilled %d chunks (%d bytes) to disk", len(self.tables), self.in_memory_bytes)
+        self.tables = []
+        self.in_memory_bytes = 0
+
+    @property
+    def schema(self) -> pa.Schema:
+        return pa.schema([(name, _unify_type(self.types[name])) for name in (self.names or [])])
+
+    def to_pandas(self, final_path: str) -> pd.DataFrame:
+        schema = self.schema
+        if not self.spilled:
+            table = pa.concat_tables([t.cast(schema) for t in self.tables]) if self.tables else schema.empty_table()
+            self.tables = []
+            return table.to_pandas(split_blocks=True, self_destruct=True)
+
+        # 退避済みの場合は 1 チャンクずつ共通スキーマに揃えて最終ファイルへ書き、メモリマップで読み戻す
+        self._spill()
+        try:
+            with pa.OSFile(final_path, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+                for path in self.spilled:
+                    with pa.memory_map(path, 'r') as src:
+                        writer.write_table(pa.ipc.open_file(src).read_all().cast(schema))
+                    _remove(path)
+            self.spilled = [final_path]
+            with pa.memory_map(final_path, 'r') as src:
+                # メモリ上で読み込んだ場合と同じ NumPy ベースの dtype にする（ArrowDtype にしない）
+                return pa.ipc.open_file(src).read_all().to_pandas()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """退避ファイルを削除する"""
+        for path in self.spilled:
+            _remove(path)
+        self.spilled = []
+        self.tables = []
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def read_csv_chunked(source: BinaryIO, read_kwargs: Dict[str, Any], chunk_rows: Optional[int] = None,
+                     memory_budget: Optional[int] = None, spill_key: Optional[str] = None) -> pd.DataFrame:
+    """CSV をチャンク単位で読み込み、ダウンキャスト済みの DataFrame を返す
+    Args:
+        source: 読み込み元のファイルオブジェクト
+        read_kwargs: `pd.read_csv` に渡す引数（encoding/header/names 等）
+        chunk_rows: 1 チャンクの行数
+        memory_budget: 読み込み中にメモリ上に保持する Arrow データの上限バイト数。超過分はディスクへ退避する
+            （返す DataFrame はこの上限によらず全行をメモリ上に持つ）
+        spill_key: 退避ファイル名に使うキー（チェックサム等）
+    Returns:
+        DataFrame（退避の有無によらず NumPy ベースの dtype。退避ファイルは返す前に削除する）
+    """
+    chunk_rows = chunk_rows or default_chunk_rows()
+    budget = memory_budget if memory_budget is not None else default_memory_budget()
+    spill_dir = get_cache_dir('spill')
+    store = _ChunkStore(budget, spill_dir)
+
+    n_chunks = 0
+    try:
+        with pd.read_csv(source, chunksize=chunk_rows, **read_kwargs) as reader:
+            for chunk in reader:
+                chunk = downcast_chunk(chunk)
+                store.add(pa.Table.from_pandas(chunk, preserve_index=False))
+                n_chunks += 1
+        # 同じファイルを他のセッションが同時に読み込んでいても衝突しないよう一意な名前にする
+        final_path = os.path.join(spill_dir, f'{spill_key or "chunks"}-{uuid.uuid4().hex}.arrow')
+        spilled = bool(store.spilled)
+        df = store.to_pandas(final_path)
+    finally:
+        store.close()
+    logger.info("read_csv_chunked: chunks=%d chunk_rows=%d spilled=%s rows=%d cols=%d",
+                n_chunks, chunk_rows, spilled, df.shape[0], df.shape[1])
+    return df
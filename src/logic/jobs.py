@@ -0,0 +1,226 @@
+"""
+jobs.py
+重い変換をバックグラウンドで実行するジョブ実行基盤
+サーバー（プロセス）共通のスレッドプールとジョブ表を持ち、各ジョブは ID・状態・進捗・キャンセル要求を持つ。
+変換は元データのスナップショットに対して実行し、結果をセッションへ反映する（コミットする）のは UI 側の
+スクリプト実行スレッドだけが行う。ジョブ実行中にデータが変更された場合、結果は破棄される。
+列を書き換える変換は行チャンク・列ごとに分けて実行し、単位ごとに進捗の報告とキャンセル要求の確認を行う。
+pandas / NumPy の重い処理は GIL を解放するため、プロセスプールでなくスレッドプールで DataFrame をコピー
+せずに共有する。
+"""
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import functools
+import os
+import threading
+import time
+import uuid
+import pandas as pd
+from src.logic import parallel, pipeline
+from src.logic.versioning import resolve_op
+from src.utils.frame import shallow_copy
+from src.utils.logger import get_logger
+from src.utils.settings import get_int_env
+
+logger = get_logger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """キャンセル要求を受けたジョブが処理を打ち切るときに送出する"""
+
+
+@dataclass
+class Job:
+    """1 つのバックグラウンド処理の状態（状態・進捗はワーカースレッドが更新する）"""
+    id: str
+    session_uid: str
+    label: str
+    meta: Dict[str, Any] = field(default_factory=dict)
+    status: str = QUEUED
+    progress: float = 0.0
+    message: str = ''
+    result: Any = None
+    error: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def report(self, progress: float, message: str = '') -> None:
+        """進捗（0〜1）を更新する。キャンセル要求があれば JobCancelled を送出する"""
+        self.check_cancelled()
+        self.progress = min(1.0, max(0.0, progress))
+        if message:
+            self.message = message
+
+    def check_cancelled(self) -> None:
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+
+
+class JobExecutor:
+    """ジョブキュー付きのスレッドプール（サーバー内の全セッションで共有）"""
+
+    def __init__(self, workers: int, retention_seconds: int = 3600):
+        self.workers = max(1, workers)
+        self.retention_seconds = retention_seconds
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, session_uid: str, label: str, func: Callable[..., Any], *args: Any,
+               meta: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Job:
+        """func(job, *args, **kwargs) をキューに入れ、ジョブを返す（戻り値が job.result になる）"""
+        job = Job(id=uuid.uuid4().hex, session_uid=session_uid, label=label, meta=dict(meta or {}))
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, func, args, kwargs)
+        logger.info("job queued: id=%s session=%s label=%s", job.id, session_uid, label)
+        return job
+
+    def _run(self, job: Job, func: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]) -> None:
+        if job.cancel_requested:
+            self._finish(job, CANCELLED)
+            return
+        job.status, job.started_at = RUNNING, time.time()
+        try:
+            result = func(job, *args, **kwargs)
+            job.check_cancelled()
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            logger.exception("job failed: id=%s label=%s", job.id, job.label)
+            job.error = f'{type(e).__name__}: {e}'
+            self._finish(job, FAILED)
+        else:
+            job.result, job.progress = result, 1.0
+            self._finish(job, DONE)
+
+    def _finish(self, job: Job, status: str) -> None:
+        job.finished_at = time.time()
+        job.status = status
+        logger.info("job %s: id=%s session=%s label=%s wait=%.2fs run=%.2fs", status, job.id, job.session_uid,
+                    job.label, (job.started_at or job.finished_at) - job.submitted_at,
+                    job.finished_at - (job.started_at or job.finished_at))
+
+    def _prune(self) -> None:
+        """取り出されないまま保持期間を過ぎた完了済みジョブ（放棄されたセッション分）を捨てる"""
+        limit = time.time() - self.retention_seconds
+        for job_id in [j.id for j in self._jobs.values() if j.finished and (j.finished_at or 0) < limit]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pop(self, job_id: str) -> Optional[Job]:
+        """完了済みのジョブをジョブ表から取り出す（未完了なら None）"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.finished:
+                return None
+            return self._jobs.pop(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """キャンセルを要求する。待機中のジョブは実行されず、実行中のジョブは次の進捗報告か完了時に打ち切られる"""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        job._cancel.set()
+        logger.info("job cancel requested: id=%s label=%s", job.id, job.label)
+        return True
+
+    def jobs_for(self, session_uid: str) -> List[Job]:
+        with self._lock:
+            return [j for j in self._jobs.values() if j.session_uid == session_uid]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {status: sum(j.status == status for j in jobs) for status in (QUEUED, RUNNING) + FINISHED}
+
+
+@functools.lru_cache(maxsize=1)
+def get_executor() -> JobExecutor:
+    """プロセス共通の JobExecutor を返す（ワーカー数は `JOB_WORKERS`、既定は CPU 数と 4 の小さい方）"""
+    return JobExecutor(get_int_env('JOB_WORKERS', min(4, os.cpu_count() or 1)),
+                       get_int_env('JOB_RETENTION_SECONDS', 3600))
+
+
+def run_in_background(df: pd.DataFrame) -> bool:
+    """この大きさのデータに対する変換をバックグラウンドで実行するか（`JOB_BACKGROUND_MIN_CELLS` 以上）"""
+    return df.shape[0] * max(1, df.shape[1]) >= get_int_env('JOB_BACKGROUND_MIN_CELLS', 2_000_000)
+
+
+def _transform_units(df: pd.DataFrame, op: str,
+                     params: Dict[str, Any]) -> Optional[Tuple[str, List[Callable[[], parallel.Columns]]]]:
+    """変換を進捗を報告できる単位の計算に分け、('rows' | 'columns', 単位の列) を返す。分けられない操作は None
+    列を書き換える操作（pipeline の kernel を持つもの）のうち、行ローカルなものは行チャンク
+    （`JOB_CHUNK_ROWS` 行、既定 500,000）、複数列が対象のものは列ごとに分ける。
+    """
+    try:
+        spec = pipeline.op_spec(pipeline.Step(op, params))
+    except KeyError:
+        return None
+    if spec.kernel is None:
+        return None
+    if spec.row_local(params) and len(df) > 1:
+        parts = -(-len(df) // max(1, get_int_env('JOB_CHUNK_ROWS', 500_000)))
+        return 'rows', [functools.partial(spec.kernel, df.iloc[start:end], params)
+                        for start, end in parallel.row_bounds(len(df), max(2, parts))]
+    columns = params.get('columns') or []
+    # 列ごとの学習済みパラメータ（リスト）を持つ場合は列に分けない
+    if len(columns) > 1 and not any(isinstance(v, (list, tuple)) for k, v in params.items() if k != 'columns'):
+        return 'columns', [functools.partial(spec.kernel, df, {**params, 'columns': [c]}) for c in columns]
+    return None
+
+
+def reports_progress(df: pd.DataFrame, op: str, params: Dict[str, Any]) -> bool:
+    """`run_transform` が途中の進捗を報告し、実行中のキャンセルに応じられる変換か"""
+    return _transform_units(df, op, params) is not None
+
+
+def run_transform(job: Job, df: pd.DataFrame, op: str, params: Dict[str, Any],
+                  fit: Optional[Callable[[pd.DataFrame], Dict[str, Any]]] = None) -> pd.DataFrame:
+    """ジョブとして 'cleaning.fill_missing' 形式の変換を実行する
+    fit を渡すと、先に fit(df) でデータから学習したパラメータを params に加え、job.meta['params'] に記録する
+    （結果を反映する側はこれを操作のパラメータとして記録する）。
+    行チャンク・列に分けられる変換は単位ごとに進捗を報告し、その間にキャンセル要求を確認する。
+    """
+    if fit is not None:
+        job.report(0.0, '学習中')
+        params = {**params, **fit(df)}
+        job.meta['params'] = params
+    job.report(0.0, '実行中')
+    split = _transform_units(df, op, params)
+    if split is None:
+        return resolve_op(op)(df, **params)
+    by, units = split
+
+    def done(n: int) -> None:
+        job.report(n / len(units), f'実行中（{n}/{len(units)}）')
+
+    parts = parallel.map_units(lambda unit: unit(), units, on_done=done)
+    written: parallel.Columns = {}
+    if by == 'rows':
+        written = parallel.concat_row_chunks(parts)
+    else:
+        for part in parts:
+            written.update(part)
+    out = shallow_copy(df)
+    for name, values in written.items():
+        out[name] = values
+    return out
@@ -0,0 +1,221 @@
+"""
+memory_governor.py
+セッションごとのメモリ使用量の計上と、セッション単位・サーバー全体のメモリ予算の適用
+各セッションが保持する DataFrame（バージョンストアのスナップショットとプレビュー等、共有列は 1 回だけ数える）と、
+そのセッションのデータセットバージョンをキーにした派生キャッシュ（プロファイル・グラフ集計・相関等）の
+バイト数を記録する。セッションの予算を超えたら、そのセッションの古いバージョンの派生キャッシュと現在以外の
+スナップショットを手放す。全体の予算を超えたら、しばらく操作のないセッションから順にデータをディスクへ
+退避し、メモリ上の参照を解放する（次に操作されたときにディスクから読み戻す）。
+ガバナーはセッションのデータを弱参照で持ち、長く（`SESSION_FORGET_SECONDS`）操作のないセッションの記録は
+退避したうえで忘れるため、終了したセッションのデータを生かし続けることはない。
+"""
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import functools
+import threading
+import time
+import weakref
+import pandas as pd
+from src.utils.cache import all_caches
+from src.utils.logger import get_logger
+from src.utils.settings import get_int_env
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class SessionUsage:
+    """1 セッションのメモリ使用量（バイト）"""
+    session_uid: str
+    frames: int = 0
+    caches: int = 0
+    spilled: bool = False
+    last_seen: float = 0.0
+
+    @property
+    def total(self) -> int:
+        return self.frames + self.caches
+
+
+class _Session:
+    def __init__(self, uid: str):
+        self.uid = uid
+        self._store: Optional[weakref.ref] = None
+        self._frames: List[weakref.ref] = []
+        self.release: Optional[Callable[[], None]] = None
+        self.usage = SessionUsage(session_uid=uid)
+
+    @property
+    def store(self) -> Any:
+        return None if self._store is None else self._store()
+
+    @store.setter
+    def store(self, store: Any) -> None:
+        self._store = None if store is None else weakref.ref(store)
+
+    @property
+    def frames(self) -> List[pd.DataFrame]:
+        return [df for df in (ref() for ref in self._frames) if df is not None]
+
+    @frames.setter
+    def frames(self, frames: Sequence[Optional[pd.DataFrame]]) -> None:
+        self._frames = [weakref.ref(df) for df in frames if df is not None]
+
+    @property
+    def gone(self) -> bool:
+        """セッションが終了してストアが回収された"""
+        return self._store is not None and self._store() is None
+
+
+def _cache_prefix(store: Any) -> Optional[str]:
+    return None if store is None else f'{store.uid}:'
+
+
+def cache_bytes(store: Any) -> int:
+    """このストアのバージョンをキーにした派生キャッシュのバイト数"""
+    prefix = _cache_prefix(store)
+    return 0 if prefix is None else sum(cache.nbytes(prefix) for cache in all_caches())
+
+
+def discard_caches(store: Any, keep_current: bool = True) -> int:
+    """このストアの派生キャッシュを捨てる（keep_current なら現在のバージョンの分は残す）"""
+    prefix = _cache_prefix(store)
+    if prefix is None:
+        return 0
+    keep = store.token if keep_current else None
+    return sum(cache.discard(prefix, keep=keep) for cache in all_caches())
+
+
+class MemoryGovernor:
+    """サーバー内の全セッションのメモリ使用量を記録し、予算を適用する"""
+
+    def __init__(self, session_budget: int, global_budget: int, idle_seconds: int, forget_seconds: int = 86400):
+        self.session_budget = session_budget
+        self.global_budget = global_budget
+        self.idle_seconds = idle_seconds
+        self.forget_seconds = forget_seconds
+        self._sessions: Dict[str, _Session] = {}
+        self._lock = threading.RLock()
+
+    def _measure(self, session: _Session) -> SessionUsage:
+        usage = session.usage
+        store = session.store
+        if store is not None:
+            usage.frames = store.memory_usage(extra=session.frames)
+        else:
+            usage.frames = sum(int(df.memory_usage(index=True, deep=True).sum()) for df in session.frames)
+        usage.caches = cache_bytes(store)
+        return usage
+
+    def touch(self, session_uid: str, store: Any = None, frames: Sequence[Optional[pd.DataFrame]] = (),
+              release: Optional[Callable[[], None]] = None) -> SessionUsage:
+        """スクリプト実行ごとに呼び、セッションが保持しているものを登録して使用量を計上する
+        Args:
+            store: セッションの DatasetVersionStore（無ければ None）
+            frames: ストア外で保持している DataFrame（`df`・`preview_df` 等。ストアと共有している列は数えない）
+            release: 退避時にセッション側の DataFrame への参照を外すコールバック
+        """
+        with self._lock:
+            session = self._sessions.setdefault(session_uid, _Session(session_uid))
+            session.store = store
+            session.frames = frames
+            session.release = release
+            session.usage.last_seen = time.time()
+            session.usage.spilled = False
+            return self._measure(session)
+
+    def forget(self, session_uid: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_uid, None)
+
+    def _shrink(self, session: _Session) -> None:
+        """現在のバージョン以外のスナップショットと派生キャッシュを手放す"""
+        if session.store is not None:
+            discard_caches(session.store, keep_current=True)
+            session.store.spill(keep_current=True)
+        self._measure(session)
+
+    def _evict(self, session: _Session) -> int:
+        """操作のないセッションのデータを全てディスクへ退避し、セッション側の参照も外す"""
+        before = session.usage.total
+        if session.store is not None:
+            discard_caches(session.store, keep_current=False)
+            session.store.spill(keep_current=False)
+        if session.release is not None:
+            session.release()
+        session.frames = ()
+        session.usage.spilled = True
+        self._measure(session)
+        return before - session.usage.total
+
+    def enforce(self, session_uid: str) -> List[str]:
+        """予算を適用し、利用者に伝えるメッセージ（予算内に収まらなかった場合）を返す"""
+        messages: List[str] = []
+        with self._lock:
+            session = self._sessions.get(session_uid)
+            if session is None:
+                return messages
+            if self.session_budget and session.usage.total > self.session_budget:
+                self._shrink(session)
+                if session.usage.total > self.session_budget:
+                    messages.append(f"このセッションのデータ（{session.usage.total / 1024 ** 2:.0f} MB）が"
+                                    f"セッションのメモリ予算（{self.session_budget / 1024 ** 2:.0f} MB）を超えています")
+            total = self.total_bytes()
+            if self.global_budget and total > self.global_budget:
+                now = time.time()
+                idle = sorted((s for s in self._sessions.values()
+                               if s.uid != session_uid and not s.usage.spilled
+                               and now - s.usage.last_seen >= self.idle_seconds),
+                              key=lambda s: s.usage.last_seen)
+                for other in idle:
+                    if total <= self.global_budget:
+                        break
+                    freed = self._evict(other)
+                    total -= freed
+                    logger.info("memory governor: spilled idle session=%s freed_bytes=%d idle_seconds=%.0f",
+                                other.uid, freed, now - other.usage.last_seen)
+                if total > self.global_budget:
+                    self._shrink(session)
+                    total = self.total_bytes()
+                if total > self.global_budget:
+                    messages.append(f"サーバー全体のメモリ使用量（{total / 1024 ** 2:.0f} MB）が"
+                                    f"予算（{self.global_budget / 1024 ** 2:.0f} MB）を超えています")
+            logger.info("memory governor: session=%s frames=%d caches=%d total=%d | "
+                        "global=%d budget=%d sessions=%d spilled=%d",
+                        session_uid, session.usage.frames, session.usage.caches, session.usage.total,
+                        total, self.global_budget, len(self._sessions),
+                        sum(s.usage.spilled for s in self._sessions.values()))
+        return messages
+
+    def _prune(self) -> None:
+        """終了したセッションと、長く操作のないセッション（退避してから）の記録を捨てる"""
+        limit = time.time() - self.forget_seconds
+        for uid, session in list(self._sessions.items()):
+            if session.gone:
+                del self._sessions[uid]
+            elif session.usage.last_seen < limit:
+                if not session.usage.spilled:
+                    self._evict(session)
+                del self._sessions[uid]
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            self._prune()
+            return sum(s.usage.total for s in self._sessions.values())
+
+    def usage(self) -> List[SessionUsage]:
+        """全セッションの使用量（最後に計上した値）"""
+        with self._lock:
+            return [SessionUsage(**vars(s.usage)) for s in self._sessions.values()]
+
+
+@functools.lru_cache(maxsize=1)
+def get_governor() -> MemoryGovernor:
+    """プロセス共通の MemoryGovernor を返す
+    予算は `SESSION_MEMORY_BUDGET_MB`（既定 4096）・`GLOBAL_MEMORY_BUDGET_MB`（既定 16384）、0 で無制限。
+    `SESSION_IDLE_SECONDS`（既定 300）以上操作のないセッションが退避の対象になる。
+    """
+    return MemoryGovernor(get_int_env('SESSION_MEMORY_BUDGET_MB', 4096) * 1024 ** 2,
+                          get_int_env('GLOBAL_MEMORY_BUDGET_MB', 16384) * 1024 ** 2,
+                          get_int_env('SESSION_IDLE_SECONDS', 300),
+                          get_int_env('SESSION_FORGET_SECONDS', 86400))
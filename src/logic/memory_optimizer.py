@@ -0,0 +1,126 @@
+"""
+memory_optimizer.py
+読み込み後のメモリ使用量の最適化
+数値列は値を変えない範囲で最小の型へダウンキャストし、値の種類が少ない文字列列はカテゴリ型、
+それ以外の文字列列は Arrow ベースの文字列型にする。列ごとの変換前後のバイト数を記録し、
+列単位で保存形式を指定し直せる（`set_column_storage`）。
+"""
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+from src.utils.cache import DerivedCache
+from src.utils.frame import downcast_numeric, shallow_copy, widen_numeric
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 列ごとの保存形式の指定（UI の選択肢）
+STORAGE_MODES = {
+    'auto': '自動',
+    'category': 'カテゴリ',
+    'string': '文字列（Arrow）',
+    'object': 'object（変換しない）',
+    'wide': '数値（64bit）',
+}
+# 値の種類数 / 行数 がこの割合以下の文字列列をカテゴリ型にする
+CATEGORY_MAX_RATIO = 0.5
+
+_bytes_cache = DerivedCache(32, 'MEMORY_REPORT_CACHE_ENTRIES')
+
+
+def column_bytes(s: pd.Series) -> int:
+    return int(s.memory_usage(index=False, deep=True))
+
+
+def _is_text(s: pd.Series) -> bool:
+    if pd.api.types.is_string_dtype(s) and not isinstance(s.dtype, pd.CategoricalDtype):
+        # object 列は全ての値が文字列の場合だけ対象にする（数値と文字列の混在列は値が変わるため触らない）
+        return s.dtype != object or pd.api.types.infer_dtype(s, skipna=True) == 'string'
+    return False
+
+
+def _arrow_string_dtype() -> Any:
+    """欠損を NaN で表す Arrow 文字列型（pandas 3 の既定の str 型と同じ）"""
+    try:
+        return pd.StringDtype('pyarrow', na_value=np.nan)
+    except TypeError:  # pandas < 2.3
+        return 'string[pyarrow_numpy]'
+
+
+ARROW_STRING = _arrow_string_dtype()
+
+
+def _arrow_string(s: pd.Series) -> pd.Series:
+    return s.astype(ARROW_STRING)
+
+
+def optimize_column(s: pd.Series, mode: str = 'auto') -> pd.Series:
+    """1 列を指定の保存形式に変換する（値は変えない。変換できない指定はそのまま返す）"""
+    if mode == 'auto':
+        if pd.api.types.is_numeric_dtype(s):
+            return downcast_numeric(s)
+        if _is_text(s):
+            n = len(s)
+            unique = s.nunique(dropna=True)
+            if n and unique / n <= CATEGORY_MAX_RATIO:
+                return s.astype('category')
+            return s if isinstance(s.dtype, pd.StringDtype) and s.dtype.storage == 'pyarrow' else _arrow_string(s)
+        return s
+    if mode == 'category':
+        return s.astype('category')
+    if mode == 'string' and (_is_text(s) or isinstance(s.dtype, pd.CategoricalDtype)):
+        return _arrow_string(s)
+    if mode == 'object':
+        return s.astype(object)
+    if mode == 'wide':
+        if isinstance(s.dtype, pd.CategoricalDtype) and pd.api.types.is_numeric_dtype(s.cat.categories):
+            return s.astype(s.cat.categories.dtype)
+        return widen_numeric(s)
+    return s
+
+
+def optimize_dtypes(df: pd.DataFrame, overrides: Optional[Dict[Any, str]] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """全列を最適化し、(変換後の DataFrame, 列ごとの変換前後の型とバイト数) を返す
+    自動変換で小さくならなかった列は元のまま残す。overrides で列ごとに保存形式を指定できる。
+    """
+    overrides = overrides or {}
+    out = shallow_copy(df)
+    rows = []
+    for col, s in df.items():
+        mode = overrides.get(col, 'auto')
+        before = column_bytes(s)
+        converted = optimize_column(s, mode)
+        after = column_bytes(converted) if converted is not s else before
+        if converted is not s and (mode != 'auto' or after < before):
+            out[col] = converted
+        else:
+            converted, after = s, before
+        rows.append({'列': col, '変換前の型': str(s.dtype), '変換後の型': str(converted.dtype),
+                     '変換前 (bytes)': before, '変換後 (bytes)': after})
+    report = pd.DataFrame(rows).set_index('列')
+    logger.info("optimize_dtypes: before=%d after=%d bytes", report['変換前 (bytes)'].sum(), report['変換後 (bytes)'].sum())
+    return out, report
+
+
+def set_column_storage(df: pd.DataFrame, column: Any, mode: str) -> pd.DataFrame:
+    """1 列の保存形式を指定し直す（バージョン管理・パイプラインの操作として記録される）"""
+    out = shallow_copy(df)
+    out[column] = optimize_column(df[column], mode)
+    logger.info("set_column_storage: column=%s mode=%s dtype=%s", column, mode, out[column].dtype)
+    return out
+
+
+def current_bytes(df: pd.DataFrame, token: Optional[str] = None) -> pd.Series:
+    """各列の現在のバイト数（データセットのバージョンごとにキャッシュ）"""
+    return _bytes_cache.get_or_compute(
+        None if token is None else (token, df.shape),
+        lambda: pd.Series({col: column_bytes(s) for col, s in df.items()}, dtype='int64'))
+
+
+def memory_report(df: pd.DataFrame, loaded: Optional[pd.DataFrame], token: Optional[str] = None) -> pd.DataFrame:
+    """読み込み時の列ごとのバイト数（loaded = optimize_dtypes のレポート）と現在の型・バイト数を並べた表"""
+    now = current_bytes(df, token)
+    table = pd.DataFrame({'型': [str(t) for t in df.dtypes], '現在 (bytes)': now.to_numpy()}, index=df.columns)
+    if loaded is not None:
+        table.insert(0, '読み込み時 (bytes)', loaded['変換前 (bytes)'].reindex(df.columns))
+    return table
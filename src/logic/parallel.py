@@ -0,0 +1,149 @@
+"""
+parallel.py
+列単位・行チャンク単位の変換の並列実行
+複数列の変換は列をワーカー数のグループに分け、行ローカルな変換は行をワーカー数のチャンクに分けて、
+プロセス共通のスレッドプールで同時に実行する。pandas / NumPy の重い処理は GIL を解放するため、
+プロセスに分けて列バッファを pickle・共有メモリへ書き出すことはせず、各ワーカーは同じ DataFrame の
+列（行チャンクは iloc のビュー）をコピーせずに参照する。
+ワーカー数は `PARALLEL_WORKERS`（既定は CPU 数）、セル数（行数 × 列数）が `PARALLEL_MIN_CELLS`（既定 1,000,000）
+未満のデータは分割の手間の方が大きいため直列に実行する。ワーカーの中から呼ばれた場合も直列に実行する
+（入れ子の投入でプールを使い切って待ち合うことを避ける）。
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import functools
+import os
+import threading
+import pandas as pd
+from pandas.api.types import union_categoricals
+from src.utils.logger import get_logger
+from src.utils.settings import get_int_env
+
+logger = get_logger(__name__)
+
+Columns = Dict[Any, pd.Series]
+
+_local = threading.local()
+
+
+def max_workers() -> int:
+    return max(1, get_int_env('PARALLEL_WORKERS', os.cpu_count() or 1))
+
+
+@functools.lru_cache(maxsize=1)
+def get_pool() -> ThreadPoolExecutor:
+    """プロセス共通のスレッドプールを返す"""
+    return ThreadPoolExecutor(max_workers=max_workers(), thread_name_prefix='parallel')
+
+
+def in_worker() -> bool:
+    return getattr(_local, 'active', False)
+
+
+def _enabled(rows: int, width: int) -> bool:
+    return (max_workers() > 1 and not in_worker()
+            and rows * max(1, width) >= get_int_env('PARALLEL_MIN_CELLS', 1_000_000))
+
+
+def _run(fn: Callable[..., Any], arg: Any) -> Any:
+    _local.active = True
+    try:
+        return fn(arg)
+    finally:
+        _local.active = False
+
+
+def partition(items: Sequence[Any], parts: int) -> List[List[Any]]:
+    """items を順序を保った parts 個の連続したグループに分ける（大きさの差は 1 以内）"""
+    parts = max(1, min(parts, len(items)))
+    size, extra = divmod(len(items), parts)
+    groups, start = [], 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        groups.append(list(items[start:end]))
+        start = end
+    return groups
+
+
+def map_groups(fn: Callable[[List[Any]], Any], items: Sequence[Any], rows: int) -> List[Any]:
+    """items（列名等）を順序を保ったグループに分けて fn(グループ) を並列に実行し、グループ順の結果を返す"""
+    items = list(items)
+    if len(items) < 2 or not _enabled(rows, len(items)):
+        return [fn(items)]
+    groups = partition(items, max_workers())
+    logger.info("parallel.map_groups: items=%d groups=%d rows=%d", len(items), len(groups), rows)
+    return list(get_pool().map(functools.partial(_run, fn), groups))
+
+
+def map_columns(fn: Callable[[List[Any]], Columns], columns: Sequence[Any], rows: int) -> Columns:
+    """列をグループに分けて fn(グループの列) を並列に実行し、結果の列を元の順に結合する
+    fn はグループ内の列の統計量をまとめて求めてよい（列ごとに独立した処理であること）。
+    """
+    merged: Columns = {}
+    for result in map_groups(fn, columns, rows):
+        merged.update(result)
+    return merged
+
+
+def row_bounds(rows: int, parts: int) -> List[Tuple[int, int]]:
+    """rows 行を parts 個の連続した行範囲 [start, end) に分ける"""
+    parts = max(1, min(parts, rows))
+    size, extra = divmod(rows, parts)
+    bounds, start = [], 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+def map_row_chunks(fn: Callable[[pd.DataFrame], Columns], df: pd.DataFrame) -> Columns:
+    """行ローカルな列の計算 fn(行チャンク) を行チャンクに分けて並列に実行し、列ごとに連結する
+    fn の出力の各行は入力の同じ行の値だけで決まること（データ全体の統計量を使わないこと）。
+    """
+    if len(df) < 2 or not _enabled(len(df), df.shape[1]):
+        return fn(df)
+    bounds = row_bounds(len(df), max_workers())
+    parts = list(get_pool().map(functools.partial(_run, lambda b: fn(df.iloc[b[0]:b[1]])), bounds))
+    logger.info("parallel.map_row_chunks: rows=%d chunks=%d", len(df), len(bounds))
+    return concat_row_chunks(parts)
+
+
+def concat_row_chunks(parts: List[Columns]) -> Columns:
+    """行チャンクごとの計算結果（列名 → 列）を列ごとに連結する"""
+    return {name: _concat([part[name] for part in parts]) for name in parts[0]}
+
+
+def map_units(fn: Callable[[Any], Any], units: Sequence[Any],
+              on_done: Optional[Callable[[int], None]] = None) -> List[Any]:
+    """units をプールで並列に実行し（ワーカー数が 1 かワーカーの中からの呼び出しでは直列）、units の順の結果を返す
+    1 つ終わるごとに on_done(完了数) を呼ぶ。on_done が例外（キャンセル等）を送出した場合は、
+    まだ始まっていない unit を取り消してから送出する。
+    """
+    units = list(units)
+    if max_workers() <= 1 or in_worker() or len(units) < 2:
+        results = []
+        for unit in units:
+            results.append(fn(unit))
+            if on_done is not None:
+                on_done(len(results))
+        return results
+    futures = [get_pool().submit(_run, fn, unit) for unit in units]
+    try:
+        for done, future in enumerate(as_completed(futures), 1):
+            future.result()
+            if on_done is not None:
+                on_done(done)
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+    return [future.result() for future in futures]
+
+
+def _concat(parts: List[pd.Series]) -> pd.Series:
+    """行チャンクの列を連結する（カテゴリ型はチャンクごとにカテゴリが異なるため和集合のカテゴリにする）"""
+    if all(isinstance(p.dtype, pd.CategoricalDtype) for p in parts):
+        values = union_categoricals([p.array for p in parts])
+        return pd.Series(values, index=parts[0].index.append([p.index for p in parts[1:]]), name=parts[0].name)
+    return pd.concat(parts)
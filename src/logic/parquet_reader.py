@@ -0,0 +1,250 @@
+"""
+parquet_reader.py
+Parquet の遅延読み込み
+先にフッタ（スキーマと行グループごとの統計量）だけを読んで列一覧を返し、実データは選択された列と、
+フィルタ条件に合い得る行グループだけを読み込む。フィルタは pyarrow と同じ (列, 演算子, 値) のタプルの
+リストで、全条件の AND として扱う。値は列の型に合わせて変換するため、日付を文字列で指定してもよい
+（パイプラインの JSON に保存したフィルタもそのまま使える）。
+"""
+from dataclasses import dataclass, field
+from typing import Any, Iterator, List, Optional, Sequence, Tuple, Union
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# (列, 演算子, 値)。演算子は '==', '!=', '<', '<=', '>', '>=', 'in'（'in' の値はリスト）
+Filter = Tuple[str, str, Any]
+OPERATORS = ('==', '!=', '<', '<=', '>', '>=', 'in')
+
+Source = Union[str, pa.NativeFile]
+
+
+@dataclass
+class ParquetColumnInfo:
+    """1 列分のスキーマと、全行グループの統計量を集約した値（統計量が無い場合は None）"""
+    name: str
+    type: pa.DataType
+    kind: str
+    null_count: Optional[int] = None
+    min: Any = None
+    max: Any = None
+
+
+@dataclass
+class ParquetSchema:
+    """Parquet ファイルのフッタから得られる情報（データ本体は読まない）"""
+    num_rows: int
+    num_row_groups: int
+    columns: List[ParquetColumnInfo] = field(default_factory=list)
+
+    @property
+    def names(self) -> List[str]:
+        return [c.name for c in self.columns]
+
+    def column(self, name: str) -> ParquetColumnInfo:
+        return next(c for c in self.columns if c.name == name)
+
+    def names_of_kind(self, *kinds: str) -> List[str]:
+        return [c.name for c in self.columns if c.kind in kinds]
+
+    def to_frame(self) -> pd.DataFrame:
+        """表示用の列一覧（型・欠損数・最小・最大）"""
+        return pd.DataFrame({
+            '型': [str(c.type) for c in self.columns],
+            '欠損数': pd.array([c.null_count for c in self.columns], dtype='Int64'),
+            '最小': ['' if c.min is None else str(c.min) for c in self.columns],
+            '最大': ['' if c.max is None else str(c.max) for c in self.columns],
+        }, index=pd.Index(self.names, name='列'))
+
+
+def _value_type(t: pa.DataType) -> pa.DataType:
+    return t.value_type if pa.types.is_dictionary(t) else t
+
+
+def _kind(t: pa.DataType) -> str:
+    t = _value_type(t)
+    if pa.types.is_boolean(t):
+        return 'bool'
+    if pa.types.is_timestamp(t) or pa.types.is_date(t):
+        return 'datetime'
+    if pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_decimal(t):
+        return 'numeric'
+    if pa.types.is_string(t) or pa.types.is_large_string(t):
+        return 'text'
+    return 'other'
+
+
+def _open(source: Source) -> pq.ParquetFile:
+    return pq.ParquetFile(source)
+
+
+def _leaf_index(pf: pq.ParquetFile, name: str) -> Optional[int]:
+    """列名に対応する Parquet の葉列の位置（入れ子の列は統計量を使わないので None）"""
+    for i in range(pf.metadata.num_columns):
+        if pf.schema.column(i).path == name:
+            return i
+    return None
+
+
+def _row_group_stats(pf: pq.ParquetFile, rg: int, leaf: Optional[int]) -> Optional[Any]:
+    if leaf is None:
+        return None
+    stats = pf.metadata.row_group(rg).column(leaf).statistics
+    return stats if stats is not None and stats.has_min_max else None
+
+
+def read_schema(source: Source) -> ParquetSchema:
+    """フッタだけを読み、列のスキーマと行グループ統計量の集約（最小・最大・欠損数）を返す"""
+    pf = _open(source)
+    meta = pf.metadata
+    columns = []
+    for f in pf.schema_arrow:
+        if f.name.startswith('__index_level_'):
+            continue
+        info = ParquetColumnInfo(name=f.name, type=f.type, kind=_kind(f.type))
+        leaf = _leaf_index(pf, f.name)
+        nulls: Optional[int] = 0 if leaf is not None else None
+        for rg in range(meta.num_row_groups):
+            stats = meta.row_group(rg).column(leaf).statistics if leaf is not None else None
+            if stats is None or not stats.has_null_count:
+                nulls = None
+            elif nulls is not None:
+                nulls += stats.null_count
+            if stats is None or not stats.has_min_max:
+                continue
+            try:
+                info.min = stats.min if info.min is None else min(info.min, stats.min)
+                info.max = stats.max if info.max is None else max(info.max, stats.max)
+            except TypeError:
+                pass
+        info.null_count = nulls
+        columns.append(info)
+    return ParquetSchema(num_rows=meta.num_rows, num_row_groups=meta.num_row_groups, columns=columns)
+
+
+def _typed_scalar(value: Any, t: pa.DataType) -> pa.Scalar:
+    """フィルタの値を列の型のスカラーにする（文字列で渡された日付・数値も変換する）"""
+    t = _value_type(t)
+    if isinstance(value, pa.Scalar):
+        return value.cast(t)
+    try:
+        return pa.scalar(value, type=t)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError):
+        return pa.scalar(value).cast(t)
+
+
+def normalize_filters(filters: Optional[Sequence[Filter]], schema: pa.Schema) -> List[Tuple[str, str, Any]]:
+    """フィルタを (列, 演算子, 列の型の pa.Scalar または そのリスト) に正規化する"""
+    out = []
+    for column, op, value in filters or []:
+        if op not in OPERATORS:
+            raise ValueError(f"未対応のフィルタ演算子です: {op}")
+        if column not in schema.names:
+            raise KeyError(column)
+        t = schema.field(column).type
+        if op == 'in':
+            out.append((column, op, [_typed_scalar(v, t) for v in value]))
+        else:
+            out.append((column, op, _typed_scalar(value, t)))
+    return out
+
+
+def coerce_filters(filters: Sequence[Filter], schema: ParquetSchema) -> List[Filter]:
+    """UI で入力された文字列の値などを列の型の Python 値にしたフィルタ（パイプラインの読み込み設定に保存する）"""
+    arrow_schema = pa.schema([pa.field(c.name, c.type) for c in schema.columns])
+    out: List[Filter] = []
+    for column, op, value in normalize_filters(filters, arrow_schema):
+        out.append((column, op, [v.as_py() for v in value] if op == 'in' else value.as_py()))
+    return out
+
+
+def filter_expression(filters: List[Tuple[str, str, Any]]) -> Optional[pc.Expression]:
+    """正規化済みフィルタの AND を pyarrow の式にする"""
+    expr = None
+    for column, op, value in filters:
+        f = pc.field(column)
+        if op == 'in':
+            term = f.isin(pa.array([v.as_py() for v in value], type=value[0].type if value else pa.null()))
+        else:
+            term = {'==': f == value, '!=': f != value, '<': f < value, '<=': f <= value,
+                    '>': f > value, '>=': f >= value}[op]
+        expr = term if expr is None else expr & term
+    return expr
+
+
+def _may_match(op: str, value: Any, lo: Any, hi: Any) -> bool:
+    """行グループの最小・最大から、条件に合う行があり得るか"""
+    try:
+        if op == '==':
+            return lo <= value.as_py() <= hi
+        if op == 'in':
+            return any(lo <= v.as_py() <= hi for v in value)
+        if op == '!=':
+            return not (lo == hi == value.as_py())
+        v = value.as_py()
+        return {'<': lo < v, '<=': lo <= v, '>': hi > v, '>=': hi >= v}[op]
+    except TypeError:
+        # タイムゾーンの有無が違う日時など比較できない統計量は読み飛ばさない
+        return True
+
+
+def prune_row_groups(pf: pq.ParquetFile, filters: List[Tuple[str, str, Any]]) -> List[int]:
+    """統計量から条件に合う行が無いと分かる行グループを除いた、読み込むべき行グループの番号"""
+    leaves = {column: _leaf_index(pf, column) for column, _, _ in filters}
+    keep = []
+    for rg in range(pf.metadata.num_row_groups):
+        ok = True
+        for column, op, value in filters:
+            stats = _row_group_stats(pf, rg, leaves[column])
+            if stats is not None and not _may_match(op, value, stats.min, stats.max):
+                ok = False
+                break
+        if ok:
+            keep.append(rg)
+    return keep
+
+
+def _plan(pf: pq.ParquetFile, columns: Optional[Sequence[str]], filters: Optional[Sequence[Filter]]
+          ) -> Tuple[List[str], List[str], Optional[pc.Expression], List[int]]:
+    """(出力する列, 読み込む列, フィルタ式, 読み込む行グループ)"""
+    schema = pf.schema_arrow
+    names = [n for n in schema.names if not n.startswith('__index_level_')]
+    selected = names if columns is None else [n for n in dict.fromkeys(columns) if n in names]
+    normalized = normalize_filters(filters, schema)
+    needed = list(dict.fromkeys(selected + [c for c, _, _ in normalized]))
+    return selected, needed, filter_expression(normalized), prune_row_groups(pf, normalized)
+
+
+def read_table(source: Source, columns: Optional[Sequence[str]] = None,
+               filters: Optional[Sequence[Filter]] = None) -> pd.DataFrame:
+    """選択した列・条件に合う行グループだけを読み込み、行単位のフィルタを適用した DataFrame を返す"""
+    pf = _open(source)
+    selected, needed, expr, row_groups = _plan(pf, columns, filters)
+    table = pf.read_row_groups(row_groups, columns=needed, use_pandas_metadata=False)
+    if expr is not None:
+        table = table.filter(expr)
+    if needed != selected:
+        table = table.select(selected)
+    logger.info("parquet lazy read: columns=%d/%d row_groups=%d/%d rows=%d/%d",
+                len(selected), len(pf.schema_arrow.names), len(row_groups), pf.metadata.num_row_groups,
+                table.num_rows, pf.metadata.num_rows)
+    return table.to_pandas()
+
+
+def iter_batches(source: Source, columns: Optional[Sequence[str]] = None,
+                 filters: Optional[Sequence[Filter]] = None, batch_rows: int = 65_536) -> Iterator[pd.DataFrame]:
+    """read_table と同じ絞り込みを batch_rows 行ずつ行う（フィルタ後のバッチは batch_rows より短くなり得る）"""
+    pf = _open(source)
+    selected, needed, expr, row_groups = _plan(pf, columns, filters)
+    if not row_groups:
+        return
+    for batch in pf.iter_batches(batch_size=batch_rows, row_groups=row_groups, columns=needed,
+                                 use_pandas_metadata=False):
+        table = pa.Table.from_batches([batch])
+        if expr is not None:
+            table = table.filter(expr)
+        yield table.select(selected).to_pandas()
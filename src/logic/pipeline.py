@@ -0,0 +1,404 @@
+"""
+pipeline.py
+前処理パイプラインの中間表現（IR）・最適化・実行
+クリーニング／特徴量作成の各操作を (操作名, パラメータ) の Step として記録し、
+ブラウザ外（バッチ処理等）でも同じ手順を新しいファイルに再適用できるようにする。
+最適化では、連続する列単位の操作を 1 つのフレーム上でまとめて実行し、
+行フィルタを行ローカルな操作より前へ移動し、出力に使われない列を作る操作を除去する。
+"""
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set
+import json
+import pandas as pd
+from src.logic import cleaning, datetimes, feature_engineering, memory_optimizer, parallel
+from src.logic.versioning import resolve_op
+from src.utils.frame import shallow_copy
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# すべての列を参照する操作の reads に使う。'prefix_*' は接頭辞が一致する列（One-Hot の出力列等）を表す
+ALL_COLUMNS = '*'
+
+
+def _matches(pattern: str, name: str) -> bool:
+    if pattern == ALL_COLUMNS or name == ALL_COLUMNS:
+        return True
+    if pattern.endswith('*'):
+        return name.startswith(pattern[:-1])
+    if name.endswith('*'):
+        return pattern.startswith(name[:-1])
+    return pattern == name
+
+
+def _intersects(a: Set[str], b: Set[str]) -> bool:
+    return any(_matches(x, y) for x in a for y in b)
+
+
+def _subtract(live: Set[str], writes: Set[str]) -> Set[str]:
+    """live から writes が完全に上書きする列を除く（パターンは具体名のみ除去する）"""
+    return {name for name in live if not any(w != ALL_COLUMNS and _matches(w, name) and not name.endswith('*') for w in writes)}
+
+ColumnKernel = Callable[[pd.DataFrame, Dict[str, Any]], Dict[str, pd.Series]]
+
+
+@dataclass(frozen=True)
+class OpSpec:
+    """操作の性質（最適化に使うメタデータ）
+    kind:
+        'column' … 一部の列だけを書き換える／追加する（融合実行可能）
+        'filter' … 行を削除するだけで列は変えない
+        'frame'  … 列構成が変わる等、並べ替えの障壁となる操作
+    row_local: 各行の出力がその行の値だけで決まるか（True ならフィルタと順序を入れ替えても結果が同じ）
+    """
+    kind: str
+    reads: Callable[[Dict[str, Any]], Set[str]]
+    writes: Callable[[Dict[str, Any]], Set[str]]
+    row_local: Callable[[Dict[str, Any]], bool] = lambda p: False
+    kernel: Optional[ColumnKernel] = None
+
+
+def _date_names(p: Dict[str, Any]) -> Set[str]:
+    return set(datetimes.feature_names(p['column'], p.get('parts')))
+
+
+def _operation_kernel(df: pd.DataFrame, p: Dict[str, Any]) -> Dict[str, pd.Series]:
+    result = feature_engineering.operation_column(df, p['col1'], p.get('col2'), p['op'], p.get('const'))
+    return {} if result is None else {result[0]: result[1]}
+
+
+def _operation_names(p: Dict[str, Any]) -> Set[str]:
+    suffix = {'加算': 'plus', '減算': 'minus', '乗算': 'mul', '除算': 'div'}
+    if p['op'] in suffix:
+        return {f"{p['col1']}_{suffix[p['op']]}_{p.get('col2')}"}
+    if p['op'] == '定数加算' and p.get('const') is not None:
+        return {f"{p['col1']}_plus_{p['const']}"}
+    return set()
+
+
+def _col(p: Dict[str, Any]) -> Set[str]:
+    return {p['column']}
+
+
+def _targets(p: Dict[str, Any]) -> List[str]:
+    """複数列に対応する操作の対象列（columns が無ければ column の 1 列）"""
+    return list(p['columns']) if p.get('columns') else [p['column']]
+
+
+def _cols(p: Dict[str, Any]) -> Set[str]:
+    return set(_targets(p))
+
+
+def _scale_kernel(kind: str, column_fn: Callable[..., pd.Series], *names: str) -> ColumnKernel:
+    def kernel(df: pd.DataFrame, p: Dict[str, Any]) -> Dict[str, pd.Series]:
+        params = {name: p.get(name) for name in names}
+        if p.get('columns'):
+            return feature_engineering.fitted_columns(kind, df, _targets(p), **params)
+        return {p['column']: column_fn(df[p['column']], **params)}
+    return kernel
+
+
+def _fitted(p: Dict[str, Any], *names: str) -> bool:
+    """学習済みのパラメータを持つか（持つ場合は再学習せず、各行の出力がその行の値だけで決まる）"""
+    return all(p.get(name) is not None for name in names)
+
+
+OPS: Dict[str, OpSpec] = {
+    'cleaning.convert_dtype': OpSpec(
+        'column', _cols, _cols,
+        # カテゴリ化はカテゴリ集合がデータ全体に依存するため行ローカルではない
+        row_local=lambda p: p.get('dtype') != 'カテゴリ',
+        kernel=lambda df, p: cleaning.convert_dtype_columns(df, _targets(p), p['dtype'])),
+    'cleaning.fill_missing': OpSpec(
+        'column', _cols, _cols,
+        row_local=lambda p: p.get('method') == '定数',
+        kernel=lambda df, p: cleaning.fill_missing_columns(df, _targets(p), p['method'], p.get('value'))),
+    'cleaning.clip_outliers_iqr': OpSpec(
+        'column', _cols, _cols,
+        kernel=lambda df, p: cleaning.clip_outliers_iqr_columns(df, _targets(p))),
+    'cleaning.drop_missing': OpSpec(
+        'filter', lambda p: {ALL_COLUMNS}, lambda p: set(), row_local=lambda p: True),
+    'cleaning.drop_duplicates': OpSpec(
+        'filter', lambda p: set(p['subset']) if p.get('subset') else {ALL_COLUMNS}, lambda p: set()),
+    'cleaning.remove_outliers_sigma': OpSpec(
+        'filter', _cols, lambda p: set()),
+    'cleaning.promote_header': OpSpec(
+        'frame', lambda p: {ALL_COLUMNS}, lambda p: {ALL_COLUMNS}),
+    'cleaning.rename_columns': OpSpec(
+        'frame', lambda p: {ALL_COLUMNS}, lambda p: {ALL_COLUMNS}, row_local=lambda p: True),
+    'memory_optimizer.set_column_storage': OpSpec(
+        # 保存形式だけを変え、値は変えない
+        'column', _col, _col, row_local=lambda p: True,
+        kernel=lambda df, p: {p['column']: memory_optimizer.optimize_column(df[p['column']], p['mode'])}),
+    'feature_engineering.add_column_by_operation': OpSpec(
+        'column', lambda p: {p['col1']} | ({p['col2']} if p.get('col2') else set()), _operation_names,
+        row_local=lambda p: True, kernel=_operation_kernel),
+    'feature_engineering.one_hot_encode': OpSpec(
+        # 学習済みの対応（categories / ハッシュ）を持つ場合は各行の出力がその行の値だけで決まる
+        'frame', _col, lambda p: {p['column'], f"{p['column']}_*"},
+        row_local=lambda p: p.get('categories') is not None or p.get('method') == 'hash'),
+    'feature_engineering.label_encode': OpSpec(
+        'column', _col, _col, row_local=lambda p: _fitted(p, 'classes'),
+        kernel=lambda df, p: {p['column']: feature_engineering.label_encode_column(df[p['column']], p.get('classes'))}),
+    'feature_engineering.standard_scale': OpSpec(
+        'column', _cols, _cols, row_local=lambda p: _fitted(p, 'mean', 'scale'),
+        kernel=_scale_kernel('standard', feature_engineering.standard_scale_column, 'mean', 'scale')),
+    'feature_engineering.minmax_scale': OpSpec(
+        'column', _cols, _cols, row_local=lambda p: _fitted(p, 'data_min', 'data_max'),
+        kernel=_scale_kernel('minmax', feature_engineering.minmax_scale_column, 'data_min', 'data_max')),
+    'feature_engineering.extract_date_features': OpSpec(
+        'column', _col, _date_names, row_local=lambda p: True,
+        kernel=lambda df, p: feature_engineering.date_feature_columns(df[p['column']], p['column'], p.get('parts'))),
+}
+
+# cleaning.drop_missing(axis=1) は列を削除するため、フィルタではなく障壁として扱う
+_DROP_COLUMNS_SPEC = OpSpec('frame', lambda p: {ALL_COLUMNS}, lambda p: {ALL_COLUMNS})
+
+
+def op_spec(step: 'Step') -> OpSpec:
+    if step.op == 'cleaning.drop_missing' and step.params.get('axis', 0) == 1:
+        return _DROP_COLUMNS_SPEC
+    if step.op not in OPS:
+        raise KeyError(f'unknown pipeline op: {step.op}')
+    return OPS[step.op]
+
+
+@dataclass
+class Step:
+    """パイプラインの 1 ステップ（src.logic の変換関数名とそのキーワード引数）"""
+    op: str
+    params: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'op': self.op, 'params': self.params}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> 'Step':
+        return cls(op=d['op'], params=dict(d.get('params') or {}))
+
+
+@dataclass
+class FusedStep:
+    """連続する列単位の操作をまとめたステップ（1 つのフレーム上で順に列を書き換える）"""
+    steps: List[Step]
+
+
+@dataclass
+class Pipeline:
+    """読み込み設定・ステップ列・出力列からなるパイプライン"""
+    steps: List[Step] = field(default_factory=list)
+    source: Dict[str, Any] = field(default_factory=dict)
+    outputs: Optional[List[str]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'version': 1, 'source': self.source, 'steps': [s.to_dict() for s in self.steps], 'outputs': self.outputs}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2, default=str)
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> 'Pipeline':
+        return cls(steps=[Step.from_dict(s) for s in d.get('steps', [])],
+                   source=dict(d.get('source') or {}), outputs=d.get('outputs'))
+
+    @classmethod
+    def from_json(cls, text: str) -> 'Pipeline':
+        return cls.from_dict(json.loads(text))
+
+    def save(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_json())
+
+    @classmethod
+    def load(cls, path: str) -> 'Pipeline':
+        with open(path, encoding='utf-8') as f:
+            return cls.from_json(f.read())
+
+    @classmethod
+    def from_versions(cls, versions: List[Any], source: Optional[Dict[str, Any]] = None) -> 'Pipeline':
+        """バージョンストアの履歴（`DatasetVersionStore.lineage()`）からパイプラインを作る"""
+        steps = [Step(v.op, dict(v.params)) for v in versions if v.op is not None]
+        return cls(steps=steps, source=dict(source or {}))
+
+
+# --- 最適化 ---
+
+def _can_swap(filter_step: Step, prev: Step, exact: bool) -> bool:
+    """行フィルタを直前のステップより前に移動できるか"""
+    f_reads = op_spec(filter_step).reads(filter_step.params)
+    spec = op_spec(prev)
+    if spec.kind == 'filter':
+        return False
+    writes = spec.writes(prev.params)
+    if writes and _intersects(f_reads, writes):
+        return False
+    if exact:
+        return spec.row_local(prev.params)
+    # exact=False ではデータ依存の操作（エンコーディング・スケーリング等）も越えて移動する。
+    # 学習される統計量・カテゴリ集合がフィルタ後のデータから計算されるため、結果は一致しない場合がある
+    return True
+
+
+def push_down_filters(steps: List[Step], exact: bool = True) -> List[Step]:
+    """行フィルタを可能な限り前へ移動し、後続の操作が処理する行数を減らす"""
+    out: List[Step] = []
+    for step in steps:
+        out.append(step)
+        if op_spec(step).kind != 'filter':
+            continue
+        i = len(out) - 1
+        while i > 0 and _can_swap(out[i], out[i - 1], exact):
+            out[i - 1], out[i] = out[i], out[i - 1]
+            i -= 1
+    return out
+
+
+def _liveness(steps: List[Step], outputs: Optional[List[str]]):
+    """後ろから走査し、出力に寄与するステップと入力時点で必要な列集合を求める"""
+    live: Set[str] = set(outputs) if outputs else {ALL_COLUMNS}
+    kept: List[Step] = []
+    for step in reversed(steps):
+        spec = op_spec(step)
+        reads = spec.reads(step.params)
+        writes = spec.writes(step.params)
+        if spec.kind == 'column' and not _intersects(writes, live):
+            logger.info("pipeline: eliminated dead step %s %s", step.op, step.params)
+            continue
+        kept.append(step)
+        if ALL_COLUMNS in writes or ALL_COLUMNS in reads:
+            live = {ALL_COLUMNS}
+        elif ALL_COLUMNS not in live:
+            live = _subtract(live, writes) | reads
+    kept.reverse()
+    return kept, live
+
+
+def eliminate_dead_steps(steps: List[Step], outputs: Optional[List[str]]) -> List[Step]:
+    """出力列に寄与しない列単位の操作を除去する"""
+    return _liveness(steps, outputs)[0]
+
+
+def required_columns(steps: List[Step], outputs: Optional[List[str]]) -> Optional[Set[str]]:
+    """入力データのうちパイプラインが必要とする列（全列が必要なら None）"""
+    live = _liveness(steps, outputs)[1]
+    return None if ALL_COLUMNS in live else live
+
+
+def fuse(steps: List[Step]) -> List[Any]:
+    """連続する列単位の操作を FusedStep にまとめる"""
+    plan: List[Any] = []
+    run: List[Step] = []
+    for step in steps:
+        if op_spec(step).kind == 'column':
+            run.append(step)
+            continue
+        if run:
+            plan.append(FusedStep(run) if len(run) > 1 else run[0])
+            run = []
+        plan.append(step)
+    if run:
+        plan.append(FusedStep(run) if len(run) > 1 else run[0])
+    return plan
+
+
+def optimize(pipeline: Pipeline, exact: bool = True) -> List[Any]:
+    """パイプラインを実行計画（Step / FusedStep の列）に変換する"""
+    steps = eliminate_dead_steps(pipeline.steps, pipeline.outputs)
+    steps = push_down_filters(steps, exact=exact)
+    return fuse(steps)
+
+
+# --- 実行 ---
+
+def _fused_columns(df: pd.DataFrame, fused: FusedStep) -> Dict[str, pd.Series]:
+    """融合した列単位の操作を順に適用し、書き込んだ列を返す"""
+    out = shallow_copy(df)
+    written: Dict[str, pd.Series] = {}
+    for step in fused.steps:
+        for name, values in op_spec(step).kernel(out, step.params).items():
+            out[name] = values
+            written[name] = out[name]
+    return written
+
+
+def _run_fused(df: pd.DataFrame, fused: FusedStep) -> pd.DataFrame:
+    out = shallow_copy(df)
+    if all(op_spec(step).row_local(step.params) for step in fused.steps):
+        # 行ローカルな操作だけなら行チャンクに分けて並列に実行する（書き込んだ列だけを連結する）
+        written = parallel.map_row_chunks(lambda chunk: _fused_columns(chunk, fused), df)
+    else:
+        written = _fused_columns(df, fused)
+    for name, values in written.items():
+        out[name] = values
+    return out
+
+
+def run_step(df: pd.DataFrame, item: Any) -> pd.DataFrame:
+    """実行計画の 1 要素を実行する"""
+    if isinstance(item, FusedStep):
+        return _run_fused(df, item)
+    return resolve_op(item.op)(df, **item.params)
+
+
+def run_pipeline(df: pd.DataFrame, pipeline: Pipeline, optimize_plan: bool = True, exact: bool = True) -> pd.DataFrame:
+    """DataFrame にパイプラインを適用する"""
+    plan = optimize(pipeline, exact=exact) if optimize_plan else list(pipeline.steps)
+    if optimize_plan:
+        # 出力に使われない入力列は最初に落としておく（以降の操作・コピーの対象外にする）
+        needed = required_columns(pipeline.steps, pipeline.outputs)
+        if needed is not None:
+            df = df[[c for c in df.columns if c in needed]]
+    return execute_plan(df, plan, pipeline.outputs)
+
+
+def execute_plan(df: pd.DataFrame, plan: List[Any], outputs: Optional[List[str]] = None) -> pd.DataFrame:
+    """最適化済みの実行計画を順に適用し、出力列を選択する（チャンク単位の実行でも使う）"""
+    for item in plan:
+        df = run_step(df, item)
+    if outputs:
+        df = df[[c for c in outputs if c in df.columns]]
+    return df
+
+
+def is_streamable(steps: List[Step]) -> bool:
+    """全ステップが行ローカルか（チャンクごとに実行しても全体に適用した場合と結果が同じか）"""
+    return all(op_spec(step).row_local(step.params) for step in steps)
+
+
+def source_format(path: str, source: Dict[str, Any]) -> str:
+    """入力ファイルの形式（拡張子を優先し、不明なら読み込み設定の形式）"""
+    ext = path.lower().rsplit('.', 1)[-1]
+    if ext in ('parquet', 'pq'):
+        return 'parquet'
+    if ext in ('csv', 'tsv', 'txt'):
+        return 'csv'
+    return source.get('format') or 'csv'
+
+
+def parquet_columns(path: str, source: Dict[str, Any], columns: Optional[Set[str]] = None) -> Optional[List[str]]:
+    """Parquet から読み込む列（読み込み設定の列指定と、パイプラインが必要とする列の共通部分）"""
+    selected = (source.get('read_kwargs') or {}).get('columns')
+    if columns is None:
+        return selected
+    if selected is None:
+        import pyarrow.parquet as pq
+        selected = pq.read_schema(path).names
+    return [c for c in selected if c in columns]
+
+
+def read_source(path: str, source: Dict[str, Any], columns: Optional[Set[str]] = None) -> pd.DataFrame:
+    """パイプラインの読み込み設定に従ってファイルを読み込む（Streamlit に依存しない）
+    columns を指定すると、その列だけを読み込む（`required_columns` の結果を渡す）。
+    Parquet の読み込み設定（read_kwargs）の columns / filters は `parquet_reader` で射影・行グループの絞り込みに使う。
+    """
+    if source_format(path, source) == 'parquet':
+        kwargs = source.get('read_kwargs') or {}
+        if columns is None and kwargs.get('columns') is None and not kwargs.get('filters'):
+            return pd.read_parquet(path)
+        from src.logic import parquet_reader
+        return parquet_reader.read_table(path, columns=parquet_columns(path, source, columns),
+                                         filters=kwargs.get('filters'))
+    kwargs = dict(source.get('read_kwargs') or {})
+    if columns is not None:
+        kwargs['usecols'] = lambda c: c in columns
+    return pd.read_csv(path, **kwargs)
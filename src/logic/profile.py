@@ -0,0 +1,229 @@
+"""
+profile.py
+EDA 用のデータセットプロファイル
+列ごとに値を 1 度だけ NumPy 配列として取り出し、件数・欠損数・最小/最大・平均/分散（Welford の併合式）・
+分位点・ヒストグラム、カテゴリ列の上位値をまとめて計算する。結果は小さなプロファイルオブジェクトとして
+データセットのバージョンごとにキャッシュし、EDA タブの各表示はこれを参照する。
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from src.utils.logger import get_logger
+from src.utils.cache import DerivedCache
+
+logger = get_logger(__name__)
+
+DEFAULT_BINS = 30
+DEFAULT_TOP_K = 10
+QUANTILES = (0.25, 0.5, 0.75)
+# 平均・分散はこの要素数ずつ計算して併合する（キャッシュに乗る大きさで配列を走査する）
+_BLOCK = 1 << 20
+
+
+@dataclass
+class Moments:
+    """件数・平均・偏差平方和。ブロックごとの結果を Welford/Chan の式で併合できる"""
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+
+    @classmethod
+    def from_array(cls, x: np.ndarray) -> 'Moments':
+        if len(x) == 0:
+            return cls()
+        mean = float(x.mean())
+        d = x - mean
+        return cls(len(x), mean, float(np.dot(d, d)))
+
+    def merge(self, other: 'Moments') -> 'Moments':
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            return self
+        n = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / n
+        self.m2 += other.m2 + delta * delta * self.count * other.count / n
+        self.count = n
+        return self
+
+    @property
+    def var(self) -> float:
+        """不偏分散（pandas の `std()` と同じ ddof=1）"""
+        return self.m2 / (self.count - 1) if self.count > 1 else float('nan')
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.var))
+
+
+@dataclass
+class ColumnProfile:
+    """1 列分の統計量
+    kind: 'numeric' / 'datetime' / 'categorical'（bool・文字列・カテゴリ型等）
+    """
+    name: Any
+    dtype: str
+    kind: str
+    count: int
+    nulls: int
+    distinct: Optional[int] = None
+    mean: Any = None
+    std: Optional[float] = None
+    min: Any = None
+    max: Any = None
+    quantiles: Dict[float, Any] = field(default_factory=dict)
+    top: List[Tuple[Any, int]] = field(default_factory=list)
+    hist_counts: Optional[np.ndarray] = None
+    hist_edges: Optional[np.ndarray] = None
+
+
+@dataclass
+class DatasetProfile:
+    """データセット全体のプロファイル（列名 → ColumnProfile）"""
+    n_rows: int
+    columns: Dict[Any, ColumnProfile]
+
+    def numeric_columns(self) -> List[Any]:
+        return [name for name, c in self.columns.items() if c.kind == 'numeric']
+
+    def histogram(self, column: Any) -> Tuple[np.ndarray, np.ndarray]:
+        """(度数, ビン境界) を返す"""
+        c = self.columns[column]
+        if c.hist_counts is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        return c.hist_counts, c.hist_edges
+
+    def describe(self) -> pd.DataFrame:
+        """`df.describe(include='all').T` と同じ列構成の表"""
+        rows = {}
+        for name, c in self.columns.items():
+            row: Dict[str, Any] = {'count': float(c.count)}
+            if c.kind == 'categorical':
+                row['unique'] = c.distinct
+                if c.top:
+                    row['top'], row['freq'] = c.top[0]
+            else:
+                row['mean'] = c.mean
+                if c.kind == 'numeric':
+                    row['std'] = c.std
+                row['min'] = c.min
+                for q, v in c.quantiles.items():
+                    row[f'{q:.0%}'] = v
+                row['max'] = c.max
+            rows[name] = row
+        order = ['count', 'unique', 'top', 'freq', 'mean', 'std', 'min'] + [f'{q:.0%}' for q in QUANTILES] + ['max']
+        table = pd.DataFrame.from_dict(rows, orient='index')
+        return table.reindex(columns=[c for c in order if c in table.columns])
+
+    def missing(self) -> pd.DataFrame:
+        """各列の欠損数・欠損率"""
+        names = list(self.columns)
+        nulls = [self.columns[n].nulls for n in names]
+        percent = [n * 100 / self.n_rows if self.n_rows else 0.0 for n in nulls]
+        return pd.DataFrame({'欠損数': nulls, '欠損率(%)': percent}, index=names)
+
+
+def _numeric_stats(values: np.ndarray, bins: int) -> Dict[str, Any]:
+    """欠損を除いた float64 配列から統計量を計算する（values は分位点計算で並べ替えられる）"""
+    moments = Moments()
+    lo, hi = np.inf, -np.inf
+    for start in range(0, len(values), _BLOCK):
+        block = values[start:start + _BLOCK]
+        moments.merge(Moments.from_array(block))
+        lo, hi = min(lo, float(block.min())), max(hi, float(block.max()))
+    finite = values if np.isfinite(lo) and np.isfinite(hi) else values[np.isfinite(values)]
+    if len(finite):
+        counts, edges = np.histogram(finite, bins=bins, range=(float(finite.min()), float(finite.max())))
+    else:
+        counts, edges = np.zeros(0, dtype=np.int64), np.zeros(0)
+    # ヒストグラムの後で分位点を計算する（overwrite_input により配列をその場で部分ソートし、コピーを作らない）
+    qs = np.quantile(values, QUANTILES, overwrite_input=True)
+    return {'moments': moments, 'min': lo, 'max': hi, 'quantiles': dict(zip(QUANTILES, qs.tolist())),
+            'hist_counts': counts, 'hist_edges': edges}
+
+
+def _profile_numeric(name: Any, s: pd.Series, bins: int) -> ColumnProfile:
+    values = s.to_numpy(dtype=np.float64, na_value=np.nan)
+    valid = values[~np.isnan(values)]  # コピー（元の列バッファは並べ替えない）
+    prof = ColumnProfile(name, str(s.dtype), 'numeric', count=len(valid), nulls=len(values) - len(valid))
+    if len(valid) == 0:
+        return prof
+    stats = _numeric_stats(valid, bins)
+    prof.mean, prof.std = stats['moments'].mean, stats['moments'].std
+    prof.min, prof.max, prof.quantiles = stats['min'], stats['max'], stats['quantiles']
+    prof.hist_counts, prof.hist_edges = stats['hist_counts'], stats['hist_edges']
+    return prof
+
+
+def _profile_datetime(name: Any, s: pd.Series, bins: int) -> ColumnProfile:
+    if getattr(s.dt, 'tz', None) is not None:
+        s = s.dt.tz_localize(None)
+    ints = s.to_numpy(dtype='datetime64[ns]').view(np.int64)
+    mask = ints != np.iinfo(np.int64).min  # NaT
+    valid = ints[mask].astype(np.float64)
+    prof = ColumnProfile(name, str(s.dtype), 'datetime', count=len(valid), nulls=len(ints) - len(valid))
+    if len(valid) == 0:
+        return prof
+    stats = _numeric_stats(valid, bins)
+
+    def ts(v: float) -> pd.Timestamp:
+        return pd.Timestamp(int(round(v)))
+
+    prof.mean, prof.min, prof.max = ts(stats['moments'].mean), ts(stats['min']), ts(stats['max'])
+    prof.quantiles = {q: ts(v) for q, v in stats['quantiles'].items()}
+    prof.hist_counts = stats['hist_counts']
+    prof.hist_edges = stats['hist_edges'].astype('int64').view('datetime64[ns]')
+    return prof
+
+
+def _profile_categorical(name: Any, s: pd.Series, top_k: int) -> ColumnProfile:
+    try:
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            codes, uniques = s.cat.codes.to_numpy(), s.cat.categories
+        else:
+            codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    except TypeError:
+        # list 等ハッシュ不能な値を含む列は欠損数だけを数える
+        nulls = int(s.isna().sum())
+        return ColumnProfile(name, str(s.dtype), 'categorical', count=len(s) - nulls, nulls=nulls)
+    present = codes[codes >= 0]
+    counts = np.bincount(present, minlength=len(uniques))
+    order = np.argsort(-counts, kind='stable')[:top_k]
+    top = [(uniques[i], int(counts[i])) for i in order if counts[i] > 0]
+    return ColumnProfile(name, str(s.dtype), 'categorical', count=len(present), nulls=len(codes) - len(present),
+                         distinct=int(np.count_nonzero(counts)), top=top)
+
+
+def profile_column(name: Any, s: pd.Series, bins: int = DEFAULT_BINS, top_k: int = DEFAULT_TOP_K) -> ColumnProfile:
+    """1 列のプロファイルを計算する"""
+    if pd.api.types.is_bool_dtype(s):
+        return _profile_categorical(name, s, top_k)
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return _profile_datetime(name, s, bins)
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_complex_dtype(s):
+        return _profile_numeric(name, s, bins)
+    return _profile_categorical(name, s, top_k)
+
+
+def profile_dataframe(df: pd.DataFrame, bins: int = DEFAULT_BINS, top_k: int = DEFAULT_TOP_K) -> DatasetProfile:
+    """DataFrame 全列のプロファイルを計算する"""
+    columns = {name: profile_column(name, s, bins, top_k) for name, s in df.items()}
+    return DatasetProfile(n_rows=len(df), columns=columns)
+
+
+_cache = DerivedCache(32, 'PROFILE_CACHE_ENTRIES')
+
+
+def get_profile(df: pd.DataFrame, token: Optional[str] = None, bins: int = DEFAULT_BINS) -> DatasetProfile:
+    """データセットのバージョントークンをキーにキャッシュしたプロファイルを返す（token が None なら毎回計算）
+    保持数は `PROFILE_CACHE_ENTRIES`（既定 32）で、古いものから破棄する。
+    """
+    def compute() -> DatasetProfile:
+        profile = profile_dataframe(df, bins=bins)
+        logger.info("profile computed: token=%s rows=%d cols=%d", token, df.shape[0], df.shape[1])
+        return profile
+
+    return _cache.get_or_compute(None if token is None else (token, df.shape, bins), compute)
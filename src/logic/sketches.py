@@ -0,0 +1,129 @@
+"""
+sketches.py
+近似集計用のストリーミングスケッチ（分位点: KLL、重複を除いた件数: HyperLogLog）
+どちらも NumPy 配列単位で更新でき、チャンクごと・プロセスごとに作ったスケッチを併合できる。
+"""
+from typing import List, Sequence
+import numpy as np
+import pandas as pd
+
+
+class KLLSketch:
+    """KLL 分位点スケッチ
+    レベル h のバッファの要素は重み 2^h を持つ。バッファが容量を超えたらソートして 1 つおきに
+    （開始位置は無作為に）上のレベルへ送る。容量は最上位を k とし、下のレベルほど 2/3 倍ずつ小さくする。
+    """
+
+    def __init__(self, k: int = 1024, seed: int = 0):
+        self.k = k
+        self.n = 0
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+        # 圧縮 1 回あたりの順位誤差は ±重み の無作為な符号なので、その分散を積算しておく
+        self._err_var = 0.0
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(8, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values: np.ndarray) -> 'KLLSketch':
+        """欠損を除いた数値配列を追加する"""
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return self
+        self.n += len(values)
+        level = 0
+        # 大きなブロックは 1 度だけソートし、h 回の圧縮と同じ 2^h 個おきの抽出で直接レベル h に入れる
+        if len(values) > 2 * self.k:
+            values = np.sort(values)
+            while len(values) >> level > self.k:
+                level += 1
+            step = 1 << level
+            offset = int(self._rng.integers(step))
+            self._err_var += float(step) ** 2
+            values = values[offset::step]
+            while len(self.levels) <= level:
+                self.levels.append(np.empty(0))
+        self.levels[level] = np.concatenate([self.levels[level], values])
+        self._compress()
+        return self
+
+    def merge(self, other: 'KLLSketch') -> 'KLLSketch':
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, buf in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], buf])
+        self.n += other.n
+        self._err_var += other._err_var
+        self._compress()
+        return self
+
+    def _compress(self) -> None:
+        h = 0
+        while h < len(self.levels):
+            buf = self.levels[h]
+            if len(buf) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                buf = np.sort(buf)
+                keep = buf[-1:] if len(buf) % 2 else buf[:0]
+                pairs = buf[:len(buf) - len(keep)]
+                self.levels[h] = keep
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], pairs[int(self._rng.integers(2))::2]])
+                self._err_var += float(1 << h) ** 2
+            h += 1
+
+    def quantiles(self, qs: Sequence[float]) -> np.ndarray:
+        items = np.concatenate(self.levels)
+        if len(items) == 0:
+            return np.full(len(qs), np.nan)
+        weights = np.concatenate([np.full(len(buf), 1 << h, dtype=np.float64) for h, buf in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items, cum = items[order], np.cumsum(weights[order])
+        idx = np.searchsorted(cum, np.asarray(qs, dtype=np.float64) * cum[-1], side='left')
+        return items[np.minimum(idx, len(items) - 1)]
+
+    def rank_error(self, z: float = 1.96) -> float:
+        """分位点の順位誤差（全件数に対する割合）の z 倍の標準偏差"""
+        return z * float(np.sqrt(self._err_var)) / self.n if self.n else 0.0
+
+
+class HyperLogLog:
+    """HyperLogLog による重複を除いた件数の推定（相対標準誤差 ≒ 1.04 / sqrt(2^p)）"""
+
+    def __init__(self, p: int = 14):
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def update(self, values) -> 'HyperLogLog':
+        """値（Series または ndarray。欠損は呼び出し側で除く）を追加する"""
+        if len(values) == 0:
+            return self
+        series = values if isinstance(values, pd.Series) else pd.Series(values, copy=False)
+        # カテゴリ型・文字列型でも同じ値は同じハッシュになる
+        h = pd.util.hash_pandas_object(series, index=False).to_numpy()
+        idx = (h >> np.uint64(64 - self.p)).astype(np.intp)
+        rest = h << np.uint64(self.p)
+        # 残りのビット列の先頭 0 の個数 + 1（frexp の指数 = ビット長）
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = np.minimum(64 - bit_length + 1, 64 - self.p + 1).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rank)
+        return self
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self) -> float:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return m * float(np.log(m / zeros))
+        return raw
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / float(np.sqrt(self.m))
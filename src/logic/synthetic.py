@@ -0,0 +1,101 @@
+"""
+synthetic.py
+ベンチマーク用の合成データの生成
+行数・列の種類ごとの列数・欠損率・カテゴリの種類数・重複行の割合を指定して、シードから決まる同じデータを
+生成する。列ごとに独立した乱数列を使うため、列数を変えても同じ名前の列の値は変わらない。
+日付列は文字列（ISO 8601 形式、日付の解析の計測用）で出力する。
+"""
+from dataclasses import asdict, dataclass
+from typing import Any, Dict
+import numpy as np
+import pandas as pd
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_DATE_START = np.datetime64('2000-01-01T00:00:00', 's')
+_DATE_SPAN_SECONDS = 25 * 365 * 86400
+
+
+@dataclass(frozen=True)
+class SyntheticSpec:
+    """合成データの形
+    numeric … 正規分布の float64 列（f0, f1, ...）
+    integer … 欠損の無い int64 列（i0, i1, ...）
+    categorical … カテゴリ型の列（c0, c1, ...。値の種類は cardinality）
+    strings … 文字列の列（s0, s1, ...。値の種類は cardinality）
+    dates … 日付の文字列の列（d0, d1, ...）
+    duplicate_ratio … 他の行の複製で置き換える行の割合
+    """
+    rows: int = 100_000
+    numeric: int = 4
+    integer: int = 2
+    categorical: int = 2
+    strings: int = 1
+    dates: int = 1
+    null_ratio: float = 0.05
+    cardinality: int = 100
+    duplicate_ratio: float = 0.01
+    seed: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _labels(prefix: str, cardinality: int) -> np.ndarray:
+    return np.array([f'{prefix}{i:06d}' for i in range(max(1, cardinality))], dtype=object)
+
+
+def _column(kind: str, i: int, spec: SyntheticSpec, rng: np.random.Generator) -> Any:
+    n = spec.rows
+    if kind == 'f':
+        return rng.normal(loc=i, scale=1.0 + i, size=n)
+    if kind == 'i':
+        return rng.integers(0, 1_000_000, size=n, dtype=np.int64)
+    if kind == 'd':
+        offsets = rng.integers(0, _DATE_SPAN_SECONDS, size=n)
+        return np.datetime_as_string(_DATE_START + offsets, unit='s').astype(object)
+    codes = rng.integers(0, max(1, spec.cardinality), size=n)
+    if kind == 'c':
+        return pd.Categorical.from_codes(codes, categories=_labels(f'c{i}_', spec.cardinality))
+    return _labels(f's{i}_', spec.cardinality)[codes]
+
+
+def _with_nulls(values: Any, rng: np.random.Generator, ratio: float) -> Any:
+    if ratio <= 0:
+        return values
+    mask = rng.random(len(values)) < ratio
+    if isinstance(values, pd.Categorical):
+        codes = values.codes.copy()
+        codes[mask] = -1
+        return pd.Categorical.from_codes(codes, dtype=values.dtype)
+    values = values.copy()
+    values[mask] = np.nan if values.dtype.kind == 'f' else None
+    return values
+
+
+def generate(spec: SyntheticSpec) -> pd.DataFrame:
+    """仕様どおりの合成データを生成する（同じ仕様からは常に同じデータ）"""
+    kinds = [('f', spec.numeric), ('i', spec.integer), ('c', spec.categorical), ('s', spec.strings), ('d', spec.dates)]
+    # 行の複製元（列ごとの乱数とは別の系列）
+    dup_rng = np.random.default_rng([spec.seed, 0xD0])
+    source = None
+    n_dup = int(spec.rows * spec.duplicate_ratio)
+    if n_dup and spec.rows > 1:
+        source = np.arange(spec.rows)
+        positions = dup_rng.choice(spec.rows, size=n_dup, replace=False)
+        source[positions] = dup_rng.integers(0, spec.rows, size=n_dup)
+    data: Dict[str, Any] = {}
+    for kind, count in kinds:
+        for i in range(count):
+            # 列ごとに（種類・番号から決まる）独立した乱数列を使う
+            rng = np.random.default_rng([spec.seed, ord(kind), i])
+            values = _column(kind, i, spec, rng)
+            if kind != 'i':
+                values = _with_nulls(values, rng, spec.null_ratio)
+            if source is not None:
+                values = values.take(source)
+            data[f'{kind}{i}'] = values
+    df = pd.DataFrame(data)
+    logger.info("synthetic.generate: spec=%s bytes=%d", spec.to_dict(), int(df.memory_usage(deep=False).sum()))
+    return df
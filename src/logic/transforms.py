@@ -0,0 +1,195 @@
+"""
+transforms.py
+学習が必要な列変換（標準化・正規化・ラベルエンコーディング）の学習済みパラメータの登録・保存
+変換の種類ごとに「チャンクの統計量」「統計量の結合」「統計量 → 変換パラメータ」「列への適用」を KINDS に
+登録する。複数列の学習は列をまとめた 1 つの配列に対して 1 回の走査で行い、`partial_fit` でチャンクごとの
+統計量を結合できるため、メモリに載らないデータも分割して学習できる。学習結果は列ごとのパラメータ
+（平均と標準偏差など）だけを JSON にでき、新しいデータには再学習せずに適用する。
+"""
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+from src.logic import parallel
+from src.utils.frame import shallow_copy
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+Stats = Dict[str, Any]
+
+
+def _values(df: pd.DataFrame, columns: Sequence[Any]) -> np.ndarray:
+    """数値列を 1 つの float64 の 2 次元配列にする（欠損は NaN）"""
+    return df[list(columns)].to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _moments(df: pd.DataFrame, columns: Sequence[Any]) -> Stats:
+    x = _values(df, columns)
+    n = np.sum(~np.isnan(x), axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(n > 0, np.nansum(x, axis=0) / np.maximum(n, 1), 0.0)
+        m2 = np.nansum((x - mean) ** 2, axis=0)
+    return {'n': n.astype(np.int64), 'mean': mean, 'm2': m2}
+
+
+def _merge_moments(a: Stats, b: Stats) -> Stats:
+    """2 つのチャンクの件数・平均・偏差平方和を結合する（Chan らの方法）"""
+    n = a['n'] + b['n']
+    delta = b['mean'] - a['mean']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(n > 0, a['mean'] + delta * b['n'] / np.maximum(n, 1), 0.0)
+        m2 = a['m2'] + b['m2'] + np.where(n > 0, delta ** 2 * a['n'] * b['n'] / np.maximum(n, 1), 0.0)
+    return {'n': n, 'mean': mean, 'm2': m2}
+
+
+def _standard_params(stats: Stats) -> Dict[str, List[float]]:
+    # StandardScaler と同じく母標準偏差を使い、分散 0 の列は 1 で割る
+    std = np.sqrt(stats['m2'] / np.maximum(stats['n'], 1))
+    return {'mean': stats['mean'].tolist(), 'scale': np.where(std > 0, std, 1.0).tolist()}
+
+
+def _standard_apply(s: pd.Series, mean: float, scale: float) -> pd.Series:
+    return (s.astype(np.float64) - mean) / scale
+
+
+def _range(df: pd.DataFrame, columns: Sequence[Any]) -> Stats:
+    x = _values(df, columns)
+    # 値の無い列は最小 +inf・最大 -inf（結合で他のチャンクの値がそのまま残る）
+    return {'min': np.fmin.reduce(x, axis=0, initial=np.inf), 'max': np.fmax.reduce(x, axis=0, initial=-np.inf)}
+
+
+def _merge_range(a: Stats, b: Stats) -> Stats:
+    return {'min': np.minimum(a['min'], b['min']), 'max': np.maximum(a['max'], b['max'])}
+
+
+def _minmax_params(stats: Stats) -> Dict[str, List[float]]:
+    lo = np.where(np.isfinite(stats['min']), stats['min'], 0.0)
+    hi = np.where(np.isfinite(stats['max']), stats['max'], 0.0)
+    return {'data_min': lo.tolist(), 'data_max': hi.tolist()}
+
+
+def _minmax_apply(s: pd.Series, data_min: float, data_max: float) -> pd.Series:
+    # MinMaxScaler と同じく値の幅が 0 の列は幅 1 として扱う
+    width = data_max - data_min
+    return (s.astype(np.float64) - data_min) / (width if width else 1.0)
+
+
+def _labels(s: pd.Series) -> pd.Series:
+    return s.astype(str)
+
+
+def _classes(df: pd.DataFrame, columns: Sequence[Any]) -> Stats:
+    return {'classes': [set(_labels(df[c]).unique().tolist()) for c in columns]}
+
+
+def _merge_classes(a: Stats, b: Stats) -> Stats:
+    return {'classes': [x | y for x, y in zip(a['classes'], b['classes'])]}
+
+
+def _sorted(values: Iterable[Any]) -> List[Any]:
+    return pd.Index(list(values)).sort_values().tolist()
+
+
+def _label_params(stats: Stats) -> Dict[str, List[List[Any]]]:
+    return {'classes': [_sorted(c) for c in stats['classes']]}
+
+
+def _label_apply(s: pd.Series, classes: List[Any]) -> pd.Series:
+    """LabelEncoder と同じく文字列化した値のソート順の番号（学習時に無かった値は -1）"""
+    return pd.Series(pd.Index(classes).get_indexer(_labels(s)), index=s.index, name=s.name)
+
+
+@dataclass(frozen=True)
+class TransformKind:
+    """変換の種類ごとの処理
+    chunk … DataFrame の指定列の統計量（列ごとの配列）
+    merge … 2 つの統計量の結合
+    params … 統計量 → 列ごとの変換パラメータ（{名前: 列ごとの値のリスト}）
+    apply … 1 列の変換（パラメータはキーワード引数で受け取る）
+    """
+    chunk: Callable[[pd.DataFrame, Sequence[Any]], Stats]
+    merge: Callable[[Stats, Stats], Stats]
+    params: Callable[[Stats], Dict[str, List[Any]]]
+    apply: Callable[..., pd.Series]
+
+
+KINDS: Dict[str, TransformKind] = {
+    'standard': TransformKind(_moments, _merge_moments, _standard_params, _standard_apply),
+    'minmax': TransformKind(_range, _merge_range, _minmax_params, _minmax_apply),
+    'label': TransformKind(_classes, _merge_classes, _label_params, _label_apply),
+}
+
+
+@dataclass
+class FittedTransform:
+    """1 種類の変換を複数列に学習した結果"""
+    kind: str
+    columns: List[Any]
+    params: Dict[str, List[Any]] = field(default_factory=dict)
+    _stats: Optional[Stats] = field(default=None, repr=False)
+
+    def __post_init__(self) -> None:
+        if self.kind not in KINDS:
+            raise ValueError(f"未対応の変換です: {self.kind}")
+
+    def partial_fit(self, df: pd.DataFrame) -> 'FittedTransform':
+        """チャンクの統計量をこれまでの統計量に結合してパラメータを更新する"""
+        spec = KINDS[self.kind]
+        stats = spec.chunk(df, self.columns)
+        self._stats = stats if self._stats is None else spec.merge(self._stats, stats)
+        self.params = spec.params(self._stats)
+        return self
+
+    def fit(self, df: pd.DataFrame) -> 'FittedTransform':
+        self._stats = None
+        return self.partial_fit(df)
+
+    @property
+    def fitted(self) -> bool:
+        return bool(self.params)
+
+    def column_params(self, column: Any) -> Dict[str, Any]:
+        """1 列分の変換パラメータ（操作のパラメータとしてそのまま渡せる）"""
+        i = self.columns.index(column)
+        return {name: values[i] for name, values in self.params.items()}
+
+    def transform_column(self, s: pd.Series, column: Any = None) -> pd.Series:
+        return KINDS[self.kind].apply(s, **self.column_params(s.name if column is None else column))
+
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        """学習済みのパラメータで各列を変換する（再学習しない）"""
+        if not self.fitted:
+            raise ValueError("学習していない変換は適用できません")
+        df = shallow_copy(df)
+        for column in self.columns:
+            df[column] = self.transform_column(df[column], column)
+        return df
+
+    def to_dict(self) -> Dict[str, Any]:
+        """変換パラメータだけの JSON にできる dict（途中の統計量は含めない）"""
+        return {'kind': self.kind, 'columns': list(self.columns), 'params': self.params}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> 'FittedTransform':
+        return cls(kind=d['kind'], columns=list(d['columns']), params={k: list(v) for k, v in d['params'].items()})
+
+
+def fit(kind: str, df: pd.DataFrame, columns: Sequence[Any]) -> FittedTransform:
+    """複数列をまとめて学習する（列のグループごとに並列に学習し、列ごとのパラメータを結合する）"""
+    parts = parallel.map_groups(lambda cols: FittedTransform(kind, cols).fit(df), columns, len(df))
+    fitted = FittedTransform(kind, list(columns),
+                             {name: [v for part in parts for v in part.params[name]] for name in parts[0].params})
+    logger.info("transforms.fit: kind=%s columns=%s rows=%d", kind, list(columns), len(df))
+    return fitted
+
+
+def fit_chunks(kind: str, chunks: Iterable[pd.DataFrame], columns: Sequence[Any]) -> FittedTransform:
+    """チャンクの列（batch.iter_source_chunks 等）を順に partial_fit して学習する"""
+    fitted = FittedTransform(kind, list(columns))
+    rows = 0
+    for chunk in chunks:
+        fitted.partial_fit(chunk)
+        rows += len(chunk)
+    logger.info("transforms.fit_chunks: kind=%s columns=%s rows=%d", kind, list(columns), rows)
+    return fitted
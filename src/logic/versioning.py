@@ -0,0 +1,228 @@
+"""
+versioning.py
+DataFrame のバージョン管理（元に戻す・やり直し・任意バージョンへの移動）
+各変換結果をスナップショットとして保持する。Copy-on-Write により変更されていない列のバッファは
+バージョン間で共有されるため、列単位の構造共有になる。メモリ上限を超えた場合は古いスナップショットを破棄し、
+必要になったときに直前のスナップショットと記録済みの操作から再計算する。メモリガバナーの要求で
+スナップショットをディスクへ退避し（`spill`）、参照されたときに読み戻すこともできる。
+"""
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import importlib
+import os
+import uuid
+import pandas as pd
+from src.utils.frame import buffer_key
+from src.utils.logger import get_logger
+from src.utils.settings import get_cache_dir, get_int_env
+
+logger = get_logger(__name__)
+
+
+def resolve_op(op: str) -> Callable[..., pd.DataFrame]:
+    """'cleaning.fill_missing' 形式の操作名を src.logic 配下の関数に解決する"""
+    module_name, func_name = op.rsplit('.', 1)
+    module = importlib.import_module(f'src.logic.{module_name}')
+    return getattr(module, func_name)
+
+
+@dataclass
+class Version:
+    """1 つのバージョン（変換操作とその結果のスナップショット）"""
+    id: int
+    label: str
+    op: Optional[str] = None
+    params: Dict[str, Any] = field(default_factory=dict)
+    df: Optional[pd.DataFrame] = None
+    spill_path: Optional[str] = None
+
+    @property
+    def replayable(self) -> bool:
+        """操作名が記録されており、直前のバージョンから再計算できるか"""
+        return self.op is not None
+
+
+class DatasetVersionStore:
+    """線形のバージョン履歴。undo/redo/jump はポインタの移動のみで O(1)"""
+
+    def __init__(self, df: pd.DataFrame, label: str = '読み込み', max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes if max_bytes is not None else get_int_env('VERSION_STORE_MAX_MB', 2048) * 1024 ** 2
+        self.versions: List[Version] = [Version(id=0, label=label, df=df)]
+        self.position = 0
+        self._next_id = 1
+        self._column_bytes: Dict[Any, int] = {}
+        self._uid = uuid.uuid4().hex
+
+    # --- 参照 ---
+    @property
+    def current_version(self) -> Version:
+        return self.versions[self.position]
+
+    @property
+    def uid(self) -> str:
+        """ストアの識別子（トークンの接頭辞）"""
+        return self._uid
+
+    @property
+    def token(self) -> str:
+        """現在のバージョンを一意に表すトークン（プロファイル等の派生データのキャッシュキー）"""
+        return f'{self._uid}:{self.current_version.id}'
+
+    @property
+    def current(self) -> pd.DataFrame:
+        return self._materialize(self.position)
+
+    @property
+    def can_undo(self) -> bool:
+        return self.position > 0
+
+    @property
+    def can_redo(self) -> bool:
+        return self.position < len(self.versions) - 1
+
+    def labels(self) -> List[str]:
+        return [f'v{v.id}: {v.label}' for v in self.versions]
+
+    def lineage(self) -> List[Version]:
+        """先頭から現在位置までのバージョン（コード生成・パイプライン記録用）"""
+        return self.versions[:self.position + 1]
+
+    # --- 更新 ---
+    def apply(self, op: str, label: Optional[str] = None, **params: Any) -> pd.DataFrame:
+        """現在のデータに操作を適用し、新しいバージョンとして記録する"""
+        df = resolve_op(op)(self.current, **params)
+        self.commit(df, label or op, op=op, params=params)
+        return df
+
+    def commit(self, df: pd.DataFrame, label: str, op: Optional[str] = None,
+               params: Optional[Dict[str, Any]] = None) -> None:
+        """計算済みの DataFrame を新しいバージョンとして記録する（やり直し用の後続バージョンは破棄）"""
+        for v in self.versions[self.position + 1:]:
+            self._remove_spill(v)
+        del self.versions[self.position + 1:]
+        self.versions.append(Version(id=self._next_id, label=label, op=op, params=dict(params or {}), df=df))
+        self._next_id += 1
+        self.position = len(self.versions) - 1
+        self._enforce_cap()
+
+    def undo(self) -> pd.DataFrame:
+        if self.can_undo:
+            self.position -= 1
+        return self.current
+
+    def redo(self) -> pd.DataFrame:
+        if self.can_redo:
+            self.position += 1
+        return self.current
+
+    def jump(self, version_id: int) -> pd.DataFrame:
+        """指定 ID のバージョンへ移動する"""
+        for i, v in enumerate(self.versions):
+            if v.id == version_id:
+                self.position = i
+                return self.current
+        raise KeyError(f'unknown version: {version_id}')
+
+    # --- メモリ管理 ---
+    def _materialize(self, index: int) -> pd.DataFrame:
+        """スナップショットを返す。破棄済みなら直近の保持済みバージョンから操作を再生して復元する"""
+        version = self.versions[index]
+        if version.df is None and version.spill_path is not None:
+            self._load_spilled(version)
+        if version.df is not None:
+            return version.df
+        start = index
+        while self.versions[start].df is None and self.versions[start].spill_path is None:
+            start -= 1
+        if self.versions[start].df is None:
+            self._load_spilled(self.versions[start])
+        df = self.versions[start].df
+        for v in self.versions[start + 1:index + 1]:
+            df = resolve_op(v.op)(df, **v.params)
+        logger.info("version store: re-derived v%d from v%d (%d ops)", version.id, self.versions[start].id, index - start)
+        version.df = df
+        self._enforce_cap(keep=index)
+        return df
+
+    def _series_bytes(self, key: Any, series: pd.Series) -> int:
+        if key not in self._column_bytes:
+            self._column_bytes[key] = int(series.memory_usage(index=False, deep=True))
+        return self._column_bytes[key]
+
+    def memory_usage(self, extra: Sequence[pd.DataFrame] = ()) -> int:
+        """保持中のスナップショットの合計バイト数（共有されている列は 1 回だけ数える）
+        extra にはストア外で保持されている DataFrame（プレビュー等）を渡せる。ストアと列を共有していれば重複して数えない。
+        """
+        seen: Dict[Any, int] = {}
+        frames = [v.df for v in self.versions if v.df is not None] + [df for df in extra if df is not None]
+        for frame in frames:
+            for _, series in frame.items():
+                key = buffer_key(series)
+                if key not in seen:
+                    seen[key] = self._series_bytes(key, series)
+        self._column_bytes = {k: b for k, b in self._column_bytes.items() if k in seen}
+        return sum(seen.values())
+
+    # --- ディスクへの退避 ---
+    def spill(self, keep_current: bool = True, directory: Optional[str] = None) -> int:
+        """保持中のスナップショットをメモリから外し、減ったバイト数を返す
+        再計算できるスナップショットは破棄するだけにし、先頭（読み込み直後）と再計算できないもの、
+        keep_current=False の場合は現在のバージョンも、ディスクへ書き出してから外す。
+        """
+        directory = directory or get_cache_dir('spill')
+        before = self.memory_usage()
+        for i, v in enumerate(self.versions):
+            if v.df is None or (keep_current and i == self.position):
+                continue
+            if i != 0 and v.replayable and i != self.position:
+                v.df = None
+                continue
+            path = os.path.join(directory, f'version-{self._uid}-{v.id}.pkl')
+            v.df.to_pickle(path)
+            v.spill_path, v.df = path, None
+        after = self.memory_usage()
+        logger.info("version store: spilled to disk keep_current=%s freed_bytes=%d", keep_current, before - after)
+        return before - after
+
+    @property
+    def spilled(self) -> bool:
+        """現在のバージョンがディスクへ退避されているか"""
+        return self.current_version.df is None and self.current_version.spill_path is not None
+
+    def _load_spilled(self, version: Version) -> None:
+        version.df = pd.read_pickle(version.spill_path)
+        logger.info("version store: loaded v%d from disk", version.id)
+        self._remove_spill(version)
+
+    def _remove_spill(self, version: Version) -> None:
+        if version.spill_path is not None:
+            try:
+                os.remove(version.spill_path)
+            except OSError:
+                pass
+            version.spill_path = None
+
+    def close(self) -> None:
+        """退避ファイルを削除する（セッションのリセット時）"""
+        for v in self.versions:
+            self._remove_spill(v)
+
+    def __del__(self) -> None:
+        # 終了したセッションのストアが回収されたときに退避ファイルを残さない
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def _enforce_cap(self, keep: Optional[int] = None) -> None:
+        """上限を超えている間、古い順に再計算可能なスナップショットを破棄する"""
+        keep_index = self.position if keep is None else keep
+        total = self.memory_usage()
+        for i, v in enumerate(self.versions):
+            if total <= self.max_bytes:
+                break
+            if i in (0, keep_index, self.position) or v.df is None or not v.replayable:
+                continue
+            v.df = None
+            total = self.memory_usage()
+            logger.info("version store: evicted snapshot v%d total_bytes=%d", v.id, total)
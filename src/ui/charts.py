@@ -2,19 +2,74 @@
 charts.py
 EDA用グラフ（ヒストグラム・箱ひげ図・相関ヒートマップ等）
 """
+from typing import Optional
 import streamlit as st
 import plotly.express as px
+import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
+from src.logic import chart_data
 
-def plot_histogram(df: pd.DataFrame, column: str):
-    fig = px.histogram(df, x=column, nbins=30, title=f"ヒストグラム: {column}")
+def plot_histogram(df: pd.DataFrame, column: str, bins: int = 30, token: Optional[str] = None):
+    """サーバー側で集計した度数からヒストグラムを描画する"""
+    data = chart_data.histogram(df, column, bins=bins, token=token)
+    plot_histogram_bins(data['counts'], data['edges'], column)
+
+def plot_histogram_bins(counts: np.ndarray, edges: np.ndarray, column: str):
+    """集計済みの度数（プロファイルのヒストグラム）から描画する。生データはブラウザに送らない"""
+    centers = (edges[:-1] + edges[1:]) / 2 if len(edges) else edges
+    widths = np.diff(edges) if len(edges) else edges
+    fig = go.Figure(go.Bar(x=centers, y=counts, width=widths, marker_line_width=0))
+    fig.update_layout(title=f"ヒストグラム: {column}", xaxis_title=str(column), yaxis_title="count", bargap=0)
+    st.plotly_chart(fig, width='stretch')
+
+def plot_box(df: pd.DataFrame, column: str, token: Optional[str] = None):
+    """四分位数・ひげ・外れ値サンプルだけを送って箱ひげ図を描画する"""
+    stats = chart_data.box_stats(df, column, token=token)
+    fig = go.Figure()
+    if stats['n']:
+        fig.add_trace(go.Box(
+            name=str(column), q1=[stats['q1']], median=[stats['median']], q3=[stats['q3']],
+            lowerfence=[stats['lower']], upperfence=[stats['upper']], mean=[stats['mean']],
+            boxpoints=False))
+        if len(stats['outliers']):
+            fig.add_trace(go.Scatter(
+                x=[str(column)] * len(stats['outliers']), y=stats['outliers'], mode='markers',
+                marker=dict(size=4), name=f"外れ値 ({stats['n_outliers']:,} 件中 {len(stats['outliers']):,} 件)"))
+    fig.update_layout(title=f"箱ひげ図: {column}", showlegend=False)
     st.plotly_chart(fig, width='stretch')
 
-def plot_box(df: pd.DataFrame, column: str):
-    fig = px.box(df, y=column, title=f"箱ひげ図: {column}")
+def plot_scatter(df: pd.DataFrame, x: str, y: str, token: Optional[str] = None, method: str = 'sample'):
+    """間引いた点で散布図（method='lttb' では x 順の折れ線）を描画する"""
+    data = chart_data.scatter_points(df, x, y, token=token, method=method)
+    mode = 'lines' if method == 'lttb' else 'markers'
+    fig = go.Figure(go.Scattergl(x=data['x'], y=data['y'], mode=mode, marker=dict(size=3)))
+    shown = f"{len(data['x']):,} / {data['n']:,} 点"
+    fig.update_layout(title=f"散布図: {x} × {y}（{shown}）", xaxis_title=str(x), yaxis_title=str(y))
     st.plotly_chart(fig, width='stretch')
 
+def approx_stats_area(approx):
+    """近似モードの基本統計量・欠損値情報。全行の集計が終わるまで 1 秒ごとに表示を更新する"""
+    refreshing = not approx.done
+
+    @st.fragment(run_every=1.0 if refreshing else None)
+    def _render():
+        if approx.done:
+            st.caption(f"全 {approx.n_rows:,} 行の集計が完了しました（種類数・分位点はスケッチによる推定値）")
+        else:
+            st.progress(approx.progress, text=f"推定値を精緻化中: {approx.rows_seen:,} / {approx.n_rows:,} 行"
+                                              f"（*_ci は 95% 信頼区間の半幅）")
+        st.subheader("基本統計量（近似）")
+        st.dataframe(approx.describe())
+        st.subheader("欠損値情報（近似）")
+        st.dataframe(approx.missing())
+        if refreshing and approx.done:
+            # 完了したら自動更新を止めるため、アプリ全体を 1 回だけ再実行する
+            st.rerun()
+
+    _render()
+
 def plot_corr_heatmap(corr_df: pd.DataFrame):
-    fig = px.imshow(corr_df, text_auto=True, color_continuous_scale='RdBu', title="相関ヒートマップ")
+    # 列数が多い場合はセルごとの数値ラベルを付けない（描画データと表示の読みやすさのため）
+    fig = px.imshow(corr_df, text_auto=len(corr_df.columns) <= 20, color_continuous_scale='RdBu', title="相関ヒートマップ")
     st.plotly_chart(fig, width='stretch')
@@ -3,56 +3,194 @@ forms.py
 クリーニング・特徴量エンジニアリング用フォームUI
 """
 import streamlit as st
-from typing import List
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import pandas as pd
 import re
+import time
+from src.utils.frame import dense_view
+from src.utils.settings import get_int_env
+
+
+def _apply_transform(op: str, label: str, **params) -> None:
+    """変換をバージョンストアに記録して実行し、結果をセッションの df に反映する"""
+    store = st.session_state.get('versions')
+    if store is None:
+        from src.logic.versioning import resolve_op
+        st.session_state['df'] = resolve_op(op)(st.session_state['df'], **params)
+        return
+    st.session_state['df'] = store.apply(op, label=label, **params)
+
+
+def _target_params(cols: List[Any]) -> Dict[str, Any]:
+    """選択した列を操作のパラメータにする（1 列なら従来どおり column、複数列なら columns）"""
+    return {'column': cols[0]} if len(cols) == 1 else {'column': None, 'columns': list(cols)}
+
+
+def _names(cols: List[Any]) -> str:
+    return ', '.join(map(str, cols))
+
+
+def _run_transform(op: str, label: str, fit: Optional[Callable[[pd.DataFrame], Dict[str, Any]]] = None,
+                   **params) -> bool:
+    """重い変換の実行。大きなデータではバックグラウンドのジョブとして投入し、完了をポーリングで待つ
+    fit を渡すと、データから学習したパラメータ（fit(df) の戻り値）を params に加えて実行・記録する。
+    ジョブとして投入する場合は学習もジョブの中で行う（スクリプト実行スレッドで全行を走査しない）。
+    Returns:
+        その場で実行を終えた場合は True（ジョブとして投入した・投入できなかった場合は False）
+    """
+    from src.logic import jobs
+    df = st.session_state['df']
+    if not jobs.run_in_background(df):
+        if fit is not None:
+            params = {**params, **fit(df)}
+        _apply_transform(op, label, **params)
+        return True
+    if st.session_state.get('transform_job') is not None:
+        st.warning("別の処理を実行中です。完了またはキャンセルしてから実行してください。")
+        return False
+    store = st.session_state.get('versions')
+    job = jobs.get_executor().submit(
+        st.session_state.get('session_uid', ''), label, jobs.run_transform, df, op, params, fit=fit,
+        meta={'op': op, 'params': params, 'base_token': store.token if store is not None else None,
+              'progress': jobs.reports_progress(df, op, params)})
+    st.session_state['transform_job'] = job.id
+    # 進捗表示（transform_job_status）を出すため再実行する
+    st.rerun()
+
+
+def collect_transform_job() -> None:
+    """完了したジョブの結果をセッションの df に反映する（スクリプト実行の先頭で呼ぶ）
+    ジョブの投入後にデータが変更されていた（元に戻す等）場合は、古いデータに対する結果なので破棄する。
+    """
+    from src.logic import jobs
+    job_id = st.session_state.get('transform_job')
+    if job_id is None:
+        return
+    executor = jobs.get_executor()
+    if executor.get(job_id) is None:
+        st.session_state['transform_job'] = None
+        return
+    job = executor.pop(job_id)
+    if job is None:
+        return
+    st.session_state['transform_job'] = None
+    if job.status == jobs.DONE:
+        store = st.session_state.get('versions')
+        if store is None:
+            st.session_state['df'] = job.result
+        elif store.token == job.meta['base_token']:
+            store.commit(job.result, job.label, op=job.meta['op'], params=job.meta['params'])
+            st.session_state['df'] = store.current
+        else:
+            st.warning(f"{job.label}: 実行中にデータが変更されたため、結果を破棄しました")
+            return
+        st.success(f"{job.label} が完了しました")
+    elif job.status == jobs.FAILED:
+        st.error(f"{job.label} に失敗しました: {job.error}")
+    else:
+        st.info(f"{job.label} をキャンセルしました")
+
+
+def _poll_interval() -> float:
+    """ジョブの進捗表示の更新間隔（秒、`JOB_POLL_MS` で変更可）"""
+    return get_int_env('JOB_POLL_MS', 500) / 1000
+
+
+def transform_job_status() -> None:
+    """実行中のジョブの進捗とキャンセルボタン。完了するまで定期的に表示を更新し、完了したらアプリを再実行する"""
+    from src.logic import jobs
+    job_id = st.session_state.get('transform_job')
+    if job_id is None:
+        return
+
+    @st.fragment(run_every=_poll_interval())
+    def _render():
+        job = jobs.get_executor().get(job_id)
+        if job is None or job.finished:
+            # 結果の反映（collect_transform_job）はアプリ全体の再実行で行う
+            st.rerun()
+        elapsed = time.time() - job.submitted_at
+        text = f"{job.label}: {'待機中' if job.status == jobs.QUEUED else job.message or '実行中'}（{elapsed:.0f} 秒）"
+        # 途中の進捗を報告できない変換は進捗バーを出さず、キャンセルも開始前（待機中）だけ受け付ける
+        reports = job.meta.get('progress', False)
+        if reports:
+            st.progress(job.progress, text=text)
+        else:
+            st.info(text)
+        if job.cancel_requested:
+            st.caption("キャンセルを要求しました")
+        elif (reports or job.status == jobs.QUEUED) and st.button("キャンセル", key="transform_job_cancel_btn"):
+            jobs.get_executor().cancel(job_id)
+
+    _render()
 
 
 def cleaning_form(df, num_cols: List[str], obj_cols: List[str], cat_cols: List[str], date_cols: List[str]):
     st.subheader("型変換")
-    col = st.selectbox("型変換する列を選択", df.columns, key="clean_dtype_col")
+    cols = st.multiselect("型変換する列を選択", list(df.columns), key="clean_dtype_cols")
     dtype = st.selectbox("変換後の型", ["数値", "文字列", "カテゴリ", "日付"], key="clean_dtype_type")
     if st.button("型変換実行", key="clean_dtype_btn"):
-        import src.logic.cleaning as cleaning
-        st.session_state['df'] = cleaning.convert_dtype(st.session_state['df'], col, dtype)
-        st.success(f"{col} を {dtype} に変換しました")
+        if not cols:
+            st.warning("列を選択してください。")
+        elif _run_transform('cleaning.convert_dtype', f"型変換: {_names(cols)} → {dtype}", dtype=dtype, **_target_params(cols)):
+            st.success(f"{_names(cols)} を {dtype} に変換しました")
 
     st.subheader("欠損値処理")
-    col2 = st.selectbox("欠損値処理する列を選択", df.columns, key="clean_na_col")
+    cols2 = st.multiselect("欠損値処理する列を選択", list(df.columns), key="clean_na_cols")
     method = st.selectbox("処理方法", ["削除(行)", "削除(列)", "平均", "中央値", "最頻値", "定数"], key="clean_na_method")
     value = None
     if method == "定数":
         value = st.text_input("補完値を入力", key="clean_na_value")
     if st.button("欠損値処理実行", key="clean_na_btn"):
-        import src.logic.cleaning as cleaning
+        done = False
+        # 平均・中央値で補完できない列（数値・日付以外）
+        invalid = [c for c in cols2 if c not in num_cols and c not in date_cols] if method in ("平均", "中央値") else []
         if method == "削除(行)":
-            st.session_state['df'] = cleaning.drop_missing(st.session_state['df'], axis=0)
+            done = _run_transform('cleaning.drop_missing', "欠損行削除", axis=0)
         elif method == "削除(列)":
-            st.session_state['df'] = cleaning.drop_missing(st.session_state['df'], axis=1)
+            done = _run_transform('cleaning.drop_missing', "欠損列削除", axis=1)
+        elif not cols2:
+            st.warning("補完する列を選択してください。")
+        elif invalid:
+            st.warning(f"{method}で補完できるのは数値・日付の列だけです: {_names(invalid)}")
         else:
-            m = method if method != "定数" else "定数"
-            st.session_state['df'] = cleaning.fill_missing(st.session_state['df'], col2, m, value)
-        st.success("欠損値処理を実行しました")
+            done = _run_transform('cleaning.fill_missing', f"欠損値補完: {_names(cols2)} ({method})",
+                                  method=method, value=value, **_target_params(cols2))
+        if done:
+            st.success("欠損値処理を実行しました")
 
     st.subheader("重複削除")
-    if st.button("重複行を削除", key="clean_dup_btn"):
-        import src.logic.cleaning as cleaning
-        st.session_state['df'] = cleaning.drop_duplicates(st.session_state['df'])
-        st.success("重複行を削除しました")
+    from src.logic import dedup
+    subset = st.multiselect("重複を判定する列（未選択なら全列）", list(df.columns), key="clean_dup_subset")
+    keep_labels = {'first': "最初の行を残す", 'last': "最後の行を残す", 'none': "重複する行を全て削除"}
+    keep = st.selectbox("残す行", list(keep_labels), format_func=keep_labels.get, key="clean_dup_keep")
+    c1, c2 = st.columns(2)
+    if c1.button("削除される行数を確認", key="clean_dup_count_btn"):
+        store = st.session_state.get('versions')
+        n = dedup.count_duplicates(df, subset or None, keep, token=store.token if store is not None else None)
+        st.info(f"{n:,} 行が削除されます（{len(df):,} 行中）")
+    if c2.button("重複行を削除", key="clean_dup_btn"):
+        label = f"重複削除: {', '.join(map(str, subset))}" if subset else "重複削除"
+        if _run_transform('cleaning.drop_duplicates', label, subset=subset or None, keep=keep):
+            st.success("重複行を削除しました")
 
     st.subheader("外れ値処理")
-    col3 = st.selectbox("外れ値処理する数値列を選択", num_cols, key="clean_outlier_col")
+    cols3 = st.multiselect("外れ値処理する数値列を選択", num_cols, key="clean_outlier_cols")
     method2 = st.selectbox("外れ値処理方法", ["IQRクリッピング", "3σ削除"], key="clean_outlier_method")
     if st.button("外れ値処理実行", key="clean_outlier_btn"):
-        import src.logic.cleaning as cleaning
-        if method2 == "IQRクリッピング":
-            st.session_state['df'] = cleaning.clip_outliers_iqr(st.session_state['df'], col3)
+        done = False
+        if not cols3:
+            st.warning("列を選択してください。")
+        elif method2 == "IQRクリッピング":
+            done = _run_transform('cleaning.clip_outliers_iqr', f"IQRクリッピング: {_names(cols3)}", **_target_params(cols3))
         else:
-            st.session_state['df'] = cleaning.remove_outliers_sigma(st.session_state['df'], col3)
-        st.success("外れ値処理を実行しました")
+            done = _run_transform('cleaning.remove_outliers_sigma', f"3σ削除: {_names(cols3)}", **_target_params(cols3))
+        if done:
+            st.success("外れ値処理を実行しました")
 
 
 def feature_engineering_form(df, num_cols: List[str], obj_cols: List[str], cat_cols: List[str], date_cols: List[str]):
+    from src.logic import transforms
     st.subheader("新規列生成（演算）")
     col1 = st.selectbox("演算元の列", num_cols, key="fe_op_col1")
     op = st.selectbox("演算種別", ["加算", "減算", "乗算", "除算", "定数加算"], key="fe_op_type")
@@ -63,77 +201,135 @@ def feature_engineering_form(df, num_cols: List[str], obj_cols: List[str], cat_c
     elif op == "定数加算":
         const = st.number_input("加算する定数", value=0.0, key="fe_op_const")
     if st.button("新規列生成", key="fe_op_btn"):
-        import src.logic.feature_engineering as feature
-        st.session_state['df'] = feature.add_column_by_operation(st.session_state['df'], col1, col2, op, const)
-        st.success("新規列を生成しました")
+        if _run_transform('feature_engineering.add_column_by_operation', f"列演算: {col1} {op}", col1=col1, col2=col2, op=op, const=const):
+            st.success("新規列を生成しました")
 
     st.subheader("エンコーディング")
     col3 = st.selectbox("エンコーディングする列", cat_cols + obj_cols, key="fe_enc_col")
-    enc_method = st.selectbox("エンコーディング手法", ["One-Hot", "Label"], key="fe_enc_method")
+    enc_methods = {"One-Hot": 'onehot', "One-Hot（上位 k + その他）": 'top_k', "One-Hot（ハッシュ）": 'hash', "Label": None}
+    enc_method = st.selectbox("エンコーディング手法", list(enc_methods), key="fe_enc_method")
+    method = enc_methods[enc_method]
+    top_k = n_features = None
+    if method == 'top_k':
+        top_k = st.number_input("残す値の数（出現数の上位）", min_value=1, value=20, step=1, key="fe_enc_top_k")
+    elif method == 'hash':
+        n_features = st.number_input("出力列数", min_value=2, value=256, step=1, key="fe_enc_n_features")
+    sparse = method is not None and st.checkbox("疎な列で出力する", value=True, key="fe_enc_sparse",
+                                                help="0 の多い One-Hot の列を、1 の位置だけを保持する形式で持ちます")
     if st.button("エンコーディング実行", key="fe_enc_btn"):
-        import src.logic.feature_engineering as feature
-        if enc_method == "One-Hot":
-            st.session_state['df'] = feature.one_hot_encode(st.session_state['df'], col3)
-        else:
-            st.session_state['df'] = feature.label_encode(st.session_state['df'], col3)
-        st.success("エンコーディングを実行しました")
+        from src.logic.encoding import CardinalityError, fit_one_hot
+        try:
+            if method is None:
+                # 対応（値 → 番号）を学習してパラメータに記録する（新しいデータには再学習せずに適用される）
+                done = _run_transform('feature_engineering.label_encode', f"Label: {col3}", column=col3,
+                                      fit=lambda d: transforms.fit('label', d, [col3]).column_params(col3))
+            else:
+                # 対応（値 → 列）を学習してパラメータに記録し、再実行・パイプラインでも同じ列にする
+                done = _run_transform('feature_engineering.one_hot_encode', f"{enc_method}: {col3}", column=col3,
+                                      sparse=sparse,
+                                      fit=lambda d: fit_one_hot(d[col3], method, top_k=top_k,
+                                                                n_features=n_features).to_params())
+        except CardinalityError as e:
+            st.error(str(e))
+            done = False
+        if done:
+            st.success("エンコーディングを実行しました")
 
     st.subheader("スケーリング")
-    col4 = st.selectbox("スケーリングする数値列", num_cols, key="fe_scale_col")
+    cols4 = st.multiselect("スケーリングする数値列", num_cols, key="fe_scale_cols")
     scale_method = st.selectbox("スケーリング手法", ["StandardScaler", "MinMaxScaler"], key="fe_scale_method")
     if st.button("スケーリング実行", key="fe_scale_btn"):
-        import src.logic.feature_engineering as feature
-        if scale_method == "StandardScaler":
-            st.session_state['df'] = feature.standard_scale(st.session_state['df'], col4)
+        kind, op, label = (('standard', 'feature_engineering.standard_scale', "標準化") if scale_method == "StandardScaler"
+                           else ('minmax', 'feature_engineering.minmax_scale', "正規化"))
+        if not cols4:
+            st.warning("列を選択してください。")
         else:
-            st.session_state['df'] = feature.minmax_scale(st.session_state['df'], col4)
-        st.success("スケーリングを実行しました")
+            def fit_scaler(d: pd.DataFrame) -> Dict[str, Any]:
+                # 選択列をまとめて 1 回で学習し、学習済みのパラメータを操作に記録する
+                fitted = transforms.fit(kind, d, cols4)
+                return fitted.column_params(cols4[0]) if len(cols4) == 1 else fitted.params
+
+            if _run_transform(op, f"{label}: {_names(cols4)}", fit=fit_scaler, **_target_params(cols4)):
+                st.success("スケーリングを実行しました")
 
     st.subheader("日付特徴量抽出")
-    if date_cols:
-        col5 = st.selectbox("日付特徴量を抽出する列", date_cols, key="fe_date_col")
+    from src.logic import datetimes
+    # 文字列の列も日付として解析できる（フォーマットは先頭のサンプルから推定する）
+    candidates = date_cols + [c for c in obj_cols if c not in date_cols]
+    if candidates:
+        col5 = st.selectbox("日付特徴量を抽出する列", candidates, key="fe_date_col")
+        if col5 not in date_cols:
+            fmt = datetimes.infer_format(df[col5])
+            st.caption(f"推定フォーマット: {fmt}" if fmt else "フォーマットを推定できませんでした（値ごとに解析します）")
+        part_labels = {'year': "年", 'month': "月", 'weekday': "曜日", 'hour': "時", 'is_holiday': "休日フラグ（土日）",
+                       'month_cyclic': "月（sin/cos）", 'weekday_cyclic': "曜日（sin/cos）", 'hour_cyclic': "時（sin/cos）"}
+        parts = st.multiselect("抽出する特徴量", list(datetimes.PARTS), default=list(datetimes.DEFAULT_PARTS),
+                               format_func=part_labels.get, key="fe_date_parts")
         if st.button("日付特徴量抽出実行", key="fe_date_btn"):
-            import src.logic.feature_engineering as feature
-            st.session_state['df'] = feature.extract_date_features(st.session_state['df'], col5)
-            st.success("日付特徴量を抽出しました")
+            if not parts:
+                st.warning("抽出する特徴量を選択してください。")
+            elif _run_transform('feature_engineering.extract_date_features', f"日付特徴量: {col5}", column=col5,
+                                parts=None if tuple(parts) == datetimes.DEFAULT_PARTS else parts):
+                st.success("日付特徴量を抽出しました")
+
+
+def _preview_token(df: pd.DataFrame) -> Any:
+    """プレビューの状態を紐づけるデータセットのバージョントークン（ストアが無い場合は DataFrame の id）"""
+    store = st.session_state.get('versions')
+    return store.token if store is not None else id(df)
+
+
+def _preview_head(df: pd.DataFrame, names: Optional[List[str]] = None, rows: int = 10) -> pd.DataFrame:
+    """表示する先頭行だけを取り出す（列名の付け替えは先頭行のメタデータに対してだけ行う）"""
+    head = dense_view(df.head(rows))
+    return head if names is None else head.set_axis(names, axis=1)
+
+
+def _set_preview(key_prefix: str, token: Any, use_header: bool, head: pd.DataFrame) -> None:
+    """ヘッダの選択かデータのバージョンが変わったときだけ `preview_df` を更新する"""
+    state = (token, use_header)
+    if st.session_state.get(f"{key_prefix}_state") != state:
+        st.session_state[f"{key_prefix}_state"] = state
+        st.session_state['preview_df'] = head
 
 
 def render_data_preview_with_header_input(df: pd.DataFrame, key_prefix: str = "preview") -> pd.DataFrame:
     """データプレビューと、ヘッダがない場合に手動で列名を入力できるUIを提供する。
-    戻り値はプレビュー用に列名が反映された DataFrame。セッションに `preview_df` を保存する。
+    戻り値は列名を反映した表示用の先頭行（データ全体はコピーしない）。セッションの `preview_df` にも保存する。
+    先頭行のヘッダへの昇格は、チェックボックスの選択が変わったときだけ実行する（元に戻した後に再実行しない）。
     """
     st.subheader("列名の確認")
     # 簡易的なヘッダ推定: 現在のカラム名に 'Unnamed' が含まれているか、整数の RangeIndex であればヘッダなしとみなす
     cols = df.columns
     likely_header = not any(str(c).startswith("Unnamed") for c in cols) and not all(isinstance(c, (int,)) for c in cols)
     use_header = st.checkbox("1行目を列名として使う", value=likely_header, key=f"{key_prefix}_use_header")
+    # 選択が変わったか（別のデータセットを読み込んだ場合も変わったとみなす）
+    previous = st.session_state.get(f"{key_prefix}_state")
+    token = _preview_token(df)
+    choice_changed = (previous is None or previous[1] != use_header
+                      or str(previous[0]).split(':')[0] != str(token).split(':')[0])
 
     if use_header:
-        # もし現在のカラムが自動付与の整数インデックスやUnnamedの場合、先頭行をヘッダに昇格する
-        if any(str(c).startswith("Unnamed") for c in cols) or all(isinstance(c, (int,)) for c in cols):
-            if df.shape[0] >= 1:
-                df2 = df.copy()
-                df2.columns = df2.iloc[0].astype(str)
-                df2 = df2.iloc[1:].reset_index(drop=True)
-            else:
-                df2 = df.copy()
-        else:
-            df2 = df.copy()
-        st.dataframe(df2.head(10))
-        st.session_state['preview_df'] = df2
-        # プレビューで先頭行をヘッダに昇格した場合、メインの df も更新して他タブ（EDA等）に反映する
-        st.session_state['df'] = df2
-        return df2
+        # チェックを入れた時点でカラムが自動付与の整数インデックスやUnnamedなら、先頭行をヘッダに昇格する
+        if (choice_changed and (any(str(c).startswith("Unnamed") for c in cols) or all(isinstance(c, (int,)) for c in cols))
+                and df.shape[0] >= 1):
+            # メインの df も更新して他タブ（EDA等）に反映する
+            _apply_transform('cleaning.promote_header', "先頭行をヘッダに昇格")
+            df = st.session_state['df']
+            token = _preview_token(df)
+        head = _preview_head(df)
+        st.dataframe(head)
+        _set_preview(key_prefix, token, use_header, head)
+        return head
 
     # ヘッダなしモード: ユーザーに列名を入力させる
     num_cols = df.shape[1]
     st.info("列名がないデータとして扱います。各列の名前を入力してください。")
     default_names = [f"column_{i+1}" for i in range(num_cols)]
 
-    # プレビュー表示用: チェックがOFFの時点で仮の列名を付けて表示する
-    df_preview = df.copy()
-    df_preview.columns = default_names
-    st.dataframe(df_preview.head(10))
+    # プレビュー表示用: チェックがOFFの時点で仮の列名を付けて表示する（先頭行だけ）
+    head = _preview_head(df, default_names)
+    st.dataframe(head)
 
     # 入力欄の初期値は既にセッションにある user_column_names を優先
     existing = st.session_state.get('user_column_names')
@@ -164,16 +360,52 @@ def render_data_preview_with_header_input(df: pd.DataFrame, key_prefix: str = "p
 
     apply_btn = st.button("列名を適用", key=f"{key_prefix}_apply")
     if apply_btn and len(set(names)) == len(names):
-        df2 = df.copy()
-        df2.columns = names
-        st.session_state['user_column_names'] = names
-        st.session_state['preview_df'] = df2
         # 適用時はメインの df も更新しておく
-        st.session_state['df'] = df2
+        _apply_transform('cleaning.rename_columns', "列名を適用", names=list(names))
+        df = st.session_state['df']
+        st.session_state['user_column_names'] = names
+        head = _preview_head(df)
+        _set_preview(key_prefix, _preview_token(df), use_header, head)
         st.success("列名を適用しました。プレビューとメインデータを更新しました。")
-        st.dataframe(df2.head(10))
-        return df2
+        st.dataframe(head)
+        return head
 
     # 適用していない場合は仮のプレビューをセッションにセット
-    st.session_state['preview_df'] = df_preview
-    return df_preview
+    _set_preview(key_prefix, token, use_header, head)
+    return head
+
+
+def parquet_load_form(schema) -> Optional[Tuple[List[str], List[Tuple[str, str, Any]]]]:
+    """Parquet の遅延読み込み設定（フッタから得た列一覧・統計量を表示し、読み込む列とフィルタを選ぶ）
+    Returns:
+        読み込みボタンが押された場合は (列, フィルタ)。それ以外は None
+    """
+    st.subheader("Parquet 読み込み設定")
+    st.caption(f"{schema.num_rows} 行 × {len(schema.columns)} 列（行グループ {schema.num_row_groups} 個）。"
+               "選択した列と、条件に合う行グループだけを読み込みます。")
+    st.dataframe(schema.to_frame())
+    with st.form("parquet_lazy_form"):
+        columns = st.multiselect("読み込む列", schema.names, default=schema.names, key="parquet_lazy_columns")
+        filters: List[Tuple[str, str, Any]] = []
+
+        date_cols = schema.names_of_kind('datetime')
+        date_col = st.selectbox("日付範囲で絞り込む列", [None] + date_cols, key="parquet_lazy_date_col",
+                                format_func=lambda c: "なし" if c is None else str(c))
+        date_range = st.date_input("日付範囲", value=(), key="parquet_lazy_date_range")
+
+        eq_cols = schema.names_of_kind('text', 'numeric', 'bool')
+        eq_col = st.selectbox("値が一致する行に絞り込む列", [None] + eq_cols, key="parquet_lazy_eq_col",
+                              format_func=lambda c: "なし" if c is None else str(c))
+        eq_values = st.text_input("値（カンマ区切りで複数指定可）", key="parquet_lazy_eq_values")
+
+        if not st.form_submit_button("読み込む"):
+            return None
+    if date_col is not None and len(date_range) == 2:
+        start, end = date_range
+        # 終了日はその日の終わりまで含める
+        filters.append((date_col, '>=', pd.Timestamp(start)))
+        filters.append((date_col, '<', pd.Timestamp(end) + pd.Timedelta(days=1)))
+    values = [v.strip() for v in eq_values.split(',') if v.strip()]
+    if eq_col is not None and values:
+        filters.append((eq_col, '==', values[0]) if len(values) == 1 else (eq_col, 'in', values))
+    return list(columns) or schema.names, filters
@@ -1,9 +1,10 @@
 """
 sidebar.py
-サイドバーUI（ファイルアップロード、データサイズ表示、リセット・ダウンロードボタン）
+サイドバーUI（ファイルアップロード、データサイズ・メモリ使用量表示、リセット・ダウンロードボタン）
 """
 import streamlit as st
-from typing import Optional
+import pandas as pd
+from typing import Optional, Union, Callable, BinaryIO, Tuple, List, Dict, Any
 
 def sidebar_file_uploader() -> Optional[bytes]:
     """CSV/ParquetファイルアップロードUI"""
@@ -15,20 +16,74 @@ def sidebar_file_uploader() -> Optional[bytes]:
     st.sidebar.markdown('---')
     return uploaded
 
+def sidebar_ingest_options() -> Tuple[Optional[bool], int, bool, bool]:
+    """読み込み設定（チャンク読み込みの有無、メモリ予算[MB]、読み込み後の型最適化・Parquet 遅延読み込みの有無）"""
+    with st.sidebar.expander('読み込み設定'):
+        mode = st.selectbox('チャンク読み込み（大容量CSV向け）', ['自動', '常に使う', '使わない'], key='ingest_chunk_mode')
+        budget_mb = st.number_input('メモリ予算 (MB)', min_value=64, value=1024, step=64, key='ingest_budget_mb')
+        optimize = st.checkbox('読み込み後に型を最適化', value=True, key='ingest_optimize_dtypes')
+        lazy_parquet = st.checkbox('Parquet は列・行を選んで読み込む', value=False, key='ingest_lazy_parquet',
+                                   help='先に列一覧と統計量だけを読み、選択した列と条件に合う行グループだけを読み込みます。')
+    chunked = {'自動': None, '常に使う': True, '使わない': False}[mode]
+    return chunked, int(budget_mb), optimize, lazy_parquet
+
 def sidebar_data_shape(df):
     """データサイズ（行・列）表示"""
     if df is not None:
         st.sidebar.info(f"データサイズ: {df.shape[0]} 行 × {df.shape[1]} 列")
 
+def sidebar_memory_report(report: pd.DataFrame, modes: Dict[str, str]) -> Optional[Tuple[Any, str]]:
+    """列ごとのメモリ使用量（読み込み時と現在）と保存形式の指定UI
+    Returns:
+        (列名, 保存形式) を指定して適用ボタンが押された場合はそのタプル。それ以外は None
+    """
+    now = int(report['現在 (bytes)'].sum())
+    with st.sidebar.expander(f"メモリ使用量: {now / 1024 ** 2:.1f} MB"):
+        if '読み込み時 (bytes)' in report.columns:
+            before = int(report['読み込み時 (bytes)'].sum())
+            st.caption(f"読み込み時 {before / 1024 ** 2:.1f} MB → 現在 {now / 1024 ** 2:.1f} MB")
+        st.dataframe(report, width='stretch')
+        column = st.selectbox('列', report.index, key='memory_override_col')
+        mode = st.selectbox('保存形式', list(modes), format_func=lambda m: modes[m], key='memory_override_mode')
+        if st.button('保存形式を変更', key='memory_override_btn'):
+            return column, mode
+    return None
+
+def sidebar_warnings(messages: List[str]):
+    """サイドバーに警告（メモリ予算の超過等）を表示する"""
+    for message in messages:
+        st.sidebar.warning(message)
+
+def sidebar_version_controls(labels: List[str], position: int, can_undo: bool, can_redo: bool) -> Optional[Tuple[str, int]]:
+    """バージョン操作UI（元に戻す・やり直し・バージョン選択）
+    Returns:
+        ('undo', -1) / ('redo', -1) / ('jump', 位置) のいずれか。操作がなければ None
+    """
+    st.sidebar.markdown('**処理履歴**')
+    col_undo, col_redo = st.sidebar.columns(2)
+    undo = col_undo.button('元に戻す', key='version_undo_btn', disabled=not can_undo)
+    redo = col_redo.button('やり直す', key='version_redo_btn', disabled=not can_redo)
+    # 履歴が変わったら選択状態を作り直すため、キーに件数と現在位置を含める
+    selected = st.sidebar.selectbox('バージョン', range(len(labels)), index=position,
+                                    format_func=lambda i: labels[i], key=f'version_select_{len(labels)}_{position}')
+    if undo:
+        return ('undo', -1)
+    if redo:
+        return ('redo', -1)
+    if selected != position:
+        return ('jump', selected)
+    return None
+
 def sidebar_reset_button() -> bool:
     """リセットボタン"""
     return st.sidebar.button('リセット', key='reset_btn')
 
-def sidebar_download_button(label: str, data: bytes, file_name: str, mime: str):
-    """ダウンロードボタン"""
+def sidebar_download_button(label: str, data: Union[bytes, Callable[[], BinaryIO]], file_name: str, mime: str):
+    """ダウンロードボタン（data に関数を渡すと押下時に遅延生成される）"""
     st.sidebar.download_button(
         label=label,
         data=data,
         file_name=file_name,
-        mime=mime
+        mime=mime,
+        on_click="ignore"
     )
@@ -0,0 +1,123 @@
+"""Small in-process caches for values derived from a dataset version.
+
+Derived results (profiles, chart aggregates, ...) are keyed by the dataset
+version token plus their own parameters, so they never have to hash the
+DataFrame itself and become unreachable as soon as the data changes.
+"""
+from __future__ import annotations
+
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.utils.settings import get_int_env
+
+_instances: "weakref.WeakSet[DerivedCache]" = weakref.WeakSet()
+
+
+def all_caches() -> List["DerivedCache"]:
+    """Every live DerivedCache in the process (used for memory accounting)."""
+    return list(_instances)
+
+
+def approx_nbytes(value: Any, _seen: Optional[set] = None) -> int:
+    """Approximate memory held by a cached value.
+
+    pandas objects use `memory_usage(deep=True)`, NumPy arrays their buffer
+    size; containers and plain objects are summed recursively.
+    """
+    seen = _seen if _seen is not None else set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approx_nbytes(k, seen) + approx_nbytes(v, seen) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(approx_nbytes(v, seen) for v in value)
+    if hasattr(value, "__dict__"):
+        return sys.getsizeof(value) + approx_nbytes(vars(value), seen)
+    return sys.getsizeof(value)
+
+
+def _key_token(key: Hashable) -> str:
+    """The dataset version token a key starts with ('' when there is none)."""
+    head = key[0] if isinstance(key, tuple) and key else key
+    return head if isinstance(head, str) else ""
+
+
+class DerivedCache:
+    """Thread-safe LRU mapping `key -> value` with a bounded number of entries.
+
+    `max_entries_env` names an environment variable that overrides the
+    default size at lookup time.
+    """
+
+    def __init__(self, default_entries: int, max_entries_env: Optional[str] = None):
+        self.default_entries = default_entries
+        self.max_entries_env = max_entries_env
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        _instances.add(self)
+
+    @property
+    def max_entries(self) -> int:
+        if self.max_entries_env is None:
+            return self.default_entries
+        return max(1, get_int_env(self.max_entries_env, self.default_entries))
+
+    def get_or_compute(self, key: Optional[Hashable], compute: Callable[[], Any]) -> Any:
+        """Return the cached value for `key`, computing it on a miss.
+
+        A `key` of None disables caching for this call.
+        """
+        if key is None:
+            return compute()
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key]
+        value = compute()
+        with self._lock:
+            self._data[key] = value
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return value
+
+    def nbytes(self, prefix: str = "") -> int:
+        """Approximate bytes held by entries whose version token starts with `prefix`."""
+        with self._lock:
+            values = [v for k, v in self._data.items() if _key_token(k).startswith(prefix)]
+        return sum(approx_nbytes(v) for v in values)
+
+    def discard(self, prefix: str, keep: Optional[str] = None) -> int:
+        """Drop entries whose version token starts with `prefix` (except token `keep`).
+
+        Returns the number of entries removed.
+        """
+        def kept(token: str) -> bool:
+            # derived tokens such as "<token>:sample..." belong to the same version
+            return keep is not None and (token == keep or token.startswith(keep + ":"))
+
+        with self._lock:
+            doomed = [k for k in self._data if _key_token(k).startswith(prefix) and not kept(_key_token(k))]
+            for k in doomed:
+                del self._data[k]
+        return len(doomed)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
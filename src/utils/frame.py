@@ -0,0 +1,126 @@
+"""DataFrame helpers shared by the transform modules.
+
+Transforms return a new DataFrame instead of mutating their input. With
+pandas Copy-on-Write enabled, a shallow copy shares every column buffer with
+the input and only the columns that are assigned afterwards are allocated,
+so the cost of a transform is proportional to the columns it touches.
+"""
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+
+def _pandas_major() -> int:
+    try:
+        return int(pd.__version__.split(".")[0])
+    except ValueError:  # pragma: no cover - unusual version strings
+        return 0
+
+
+def enable_copy_on_write() -> bool:
+    """Enable pandas Copy-on-Write where it is optional.
+
+    pandas >= 3.0 always uses Copy-on-Write; pandas 2.x needs the option.
+    Returns True when Copy-on-Write is active.
+    """
+    major = _pandas_major()
+    if major >= 3:
+        return True
+    if major == 2:
+        pd.set_option("mode.copy_on_write", True)
+        return True
+    return False
+
+
+COPY_ON_WRITE = enable_copy_on_write()
+
+
+def shallow_copy(df: pd.DataFrame) -> pd.DataFrame:
+    """Return a copy of `df` for a transform to modify.
+
+    Under Copy-on-Write this is a shallow copy sharing the column buffers of
+    `df`; on older pandas it falls back to a deep copy to keep the input intact.
+    """
+    return df.copy(deep=not COPY_ON_WRITE)
+
+
+def downcast_numeric(s: pd.Series) -> pd.Series:
+    """Downcast a numeric series to the smallest dtype that keeps its values.
+
+    Integers go to the narrowest integer type that holds their range; floats
+    become float32 only when that round-trips exactly. Non-numeric, bool and
+    sparse series (one-hot output, already small) are returned unchanged.
+    """
+    if pd.api.types.is_bool_dtype(s) or isinstance(s.dtype, pd.SparseDtype):
+        return s
+    if pd.api.types.is_integer_dtype(s):
+        return pd.to_numeric(s, downcast="integer")
+    if pd.api.types.is_float_dtype(s) and s.dtype != np.float32:
+        f32 = s.astype(np.float32)
+        if np.array_equal(f32.to_numpy(dtype=np.float64, na_value=np.nan),
+                          s.to_numpy(dtype=np.float64, na_value=np.nan), equal_nan=True):
+            return f32
+    return s
+
+
+def widen_numeric(s: pd.Series) -> pd.Series:
+    """Widen a downcast numeric series back to 64 bits.
+
+    NumPy series become int64/float64 and masked integers Int64. Series with
+    an ArrowDtype stay pyarrow-backed (int64/double), since mixing them with
+    masked dtypes in arithmetic raises. Non-numeric, bool and sparse series are
+    returned unchanged.
+    """
+    if (pd.api.types.is_bool_dtype(s) or not pd.api.types.is_numeric_dtype(s)
+            or isinstance(s.dtype, pd.SparseDtype)):
+        return s
+    if isinstance(s.dtype, pd.ArrowDtype):
+        import pyarrow as pa
+
+        t = s.dtype.pyarrow_dtype
+        if pa.types.is_integer(t) and t.bit_width < 64:
+            return s.astype(pd.ArrowDtype(pa.int64()))
+        if pa.types.is_floating(t) and t.bit_width < 64:
+            return s.astype(pd.ArrowDtype(pa.float64()))
+        return s
+    if pd.api.types.is_integer_dtype(s) and s.dtype.itemsize < 8:
+        extension = isinstance(s.dtype, pd.api.extensions.ExtensionDtype)
+        return s.astype("Int64" if extension else np.int64)
+    if pd.api.types.is_float_dtype(s) and s.dtype.itemsize < 8:
+        return s.astype(np.float64)
+    return s
+
+
+def dense_view(df: pd.DataFrame) -> pd.DataFrame:
+    """Return `df` with its SparseDtype columns converted to dense.
+
+    Arrow (``st.dataframe``, Parquet) and several pandas reductions do not
+    accept sparse columns, so callers convert only the slice they hand over,
+    e.g. the displayed head or one export chunk. Dense columns are shared.
+    """
+    positions = [i for i, t in enumerate(df.dtypes) if isinstance(t, pd.SparseDtype)]
+    if not positions:
+        return df
+    res = shallow_copy(df)
+    for i in positions:
+        res.isetitem(i, df.iloc[:, i].sparse.to_dense())
+    return res
+
+
+def buffer_key(series: pd.Series) -> Any:
+    """Return a key identifying the buffer behind `series`.
+
+    Columns shared between shallow copies (and so between dataset versions)
+    map to the same key. The key is only meaningful while the buffer is alive.
+    """
+    values = series.array
+    ndarray = getattr(values, "_ndarray", None)
+    if ndarray is None and hasattr(values, "_data"):
+        ndarray = values._data
+    try:
+        return ("ptr", ndarray.__array_interface__["data"][0], ndarray.nbytes)
+    except (AttributeError, TypeError):
+        return ("id", id(values))
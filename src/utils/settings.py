@@ -0,0 +1,31 @@
+"""Runtime settings shared by the logic modules.
+
+Values are read from environment variables so that the Streamlit app, the
+batch tools and tests can be configured without code changes.
+"""
+from __future__ import annotations
+
+import os
+from typing import Optional
+
+
+def get_int_env(name: str, default: int) -> int:
+    """Return an integer environment variable, falling back to `default`."""
+    raw = os.getenv(name)
+    if raw is None or raw.strip() == "":
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        return default
+
+
+def get_cache_dir(subdir: Optional[str] = None) -> str:
+    """Return (and create) the on-disk cache directory.
+
+    The base directory is taken from `CACHE_DIR` (default: `.cache`).
+    """
+    base = os.getenv("CACHE_DIR", ".cache")
+    path = os.path.join(base, subdir) if subdir else base
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.fixture(params=[1, 2, 4])
+def workers(request, monkeypatch):
+    """並列実行のワーカー数（小さなデータでも列のグループ・行チャンクに分けるよう PARALLEL_MIN_CELLS を下げる）"""
+    monkeypatch.setenv('PARALLEL_WORKERS', str(request.param))
+    monkeypatch.setenv('PARALLEL_MIN_CELLS', '1')
+    return request.param
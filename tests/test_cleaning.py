@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.logic import cleaning, codegen
+
+
+def _frame() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    n = 1000
+    df = pd.DataFrame({name: rng.normal(i, 1 + i, n) for i, name in enumerate(['a', 'b', 'c'])})
+    df.loc[rng.random(n) < 0.1, 'a'] = np.nan
+    df.loc[rng.random(n) < 0.2, 'c'] = np.nan
+    df['t'] = pd.to_datetime('2024-01-01') + pd.to_timedelta(rng.integers(0, 1000, n), unit='D')
+    df.loc[rng.random(n) < 0.1, 't'] = pd.NaT
+    df['s'] = np.array(['x', None, 'y', 'x'] * (n // 4), dtype=object)
+    return df
+
+
+@pytest.mark.parametrize('method', ['平均', '中央値'])
+def test_fill_missing_numeric_and_datetime(workers, method):
+    df = _frame()
+    cols = ['a', 'b', 'c', 't']
+    res = cleaning.fill_missing(df, None, method, columns=cols)
+    for c in cols:
+        fill = df[c].mean() if method == '平均' else df[c].median()
+        pd.testing.assert_series_equal(res[c], df[c].fillna(fill))
+    pd.testing.assert_series_equal(res['s'], df['s'])
+
+
+@pytest.mark.parametrize('columns', [['a', 's'], ['s'], ['a', 'b', 's']])
+def test_fill_missing_rejects_non_numeric_for_any_worker_count(workers, columns):
+    with pytest.raises(ValueError):
+        cleaning.fill_missing(_frame(), None, '平均', columns=columns)
+
+
+@pytest.mark.parametrize('method', ['平均', '中央値'])
+def test_generated_fill_missing_code_matches(method):
+    df = _frame()
+    cols = ['a', 'c', 't']
+    lines = codegen.STEP_TEMPLATES['cleaning.fill_missing']({'column': None, 'columns': cols, 'method': method})
+    scope = {'pd': pd, 'df': df.copy()}
+    exec('\n'.join(lines), scope)
+    pd.testing.assert_frame_equal(scope['df'], cleaning.fill_missing(df, None, method, columns=cols))
+
+
+@pytest.mark.parametrize('dtype', ['数値', '文字列', 'カテゴリ'])
+def test_convert_dtype_columns_match_single_column(workers, dtype):
+    df = _frame()
+    res = cleaning.convert_dtype(df, None, dtype, columns=['a', 's'])
+    for c in ['a', 's']:
+        pd.testing.assert_series_equal(res[c], cleaning.convert_dtype(df, c, dtype)[c])
+
+
+@pytest.mark.parametrize('method, value', [('最頻値', None), ('定数', 0)])
+def test_fill_missing_columns_match_single_column(workers, method, value):
+    df = _frame().drop(columns=['t', 's'])
+    res = cleaning.fill_missing(df, None, method, value, columns=['a', 'c'])
+    for c in ['a', 'c']:
+        pd.testing.assert_series_equal(res[c], cleaning.fill_missing(df, c, method, value)[c])
+
+
+def test_clip_outliers_columns_match_single_column(workers):
+    df = _frame()
+    df.loc[::50, 'b'] = 1e3
+    res = cleaning.clip_outliers_iqr(df, None, columns=['a', 'b', 'c'])
+    for c in ['a', 'b', 'c']:
+        pd.testing.assert_series_equal(res[c], cleaning.clip_outliers_iqr(df, c)[c])
+
+
+def test_remove_outliers_sigma_uses_pre_filter_statistics(workers):
+    df = _frame()
+    df.loc[::40, 'b'] = 1e3
+    cols = ['a', 'b', 'c']
+    res = cleaning.remove_outliers_sigma(df, None, sigma=2.0, columns=cols)
+    # 各列の範囲は削除前のデータで求め、いずれかの列が範囲外または欠損の行を削除する
+    keep = np.logical_and.reduce([df.index.isin(cleaning.remove_outliers_sigma(df, c, sigma=2.0).index) for c in cols])
+    assert keep.sum() < len(df)
+    pd.testing.assert_frame_equal(res, df[keep])
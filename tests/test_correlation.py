@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.logic import correlation
+
+
+def _frame(missing: bool) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    n = 2000
+    x = rng.normal(size=n)
+    df = pd.DataFrame({
+        'x': x,
+        'y': 2 * x + rng.normal(size=n),
+        'z': rng.normal(1e6, 1, n),  # 平均が大きく分散が小さい列（桁落ちしやすい）
+        'i': rng.integers(0, 100, n).astype('int16'),
+        'n': pd.array(rng.integers(0, 5, n), dtype='Int64'),
+        'const': np.ones(n),
+        's': rng.choice(['a', 'b'], n),
+    })
+    if missing:
+        for col, frac in [('x', 0.1), ('z', 0.3)]:
+            df.loc[rng.random(n) < frac, col] = np.nan
+        df['n'] = df['n'].mask(rng.random(n) < 0.2)
+    return df
+
+
+@pytest.mark.parametrize('missing', [False, True])
+@pytest.mark.parametrize('block_rows', [64, 0])
+def test_pearson_matches_pandas(missing, block_rows):
+    df = _frame(missing)
+    res = correlation.corr_matrix(df, 'pearson', block_rows=block_rows)
+    expected = df.select_dtypes(include='number').corr()
+    pd.testing.assert_frame_equal(res, expected, atol=1e-10, rtol=0)
+
+
+def test_spearman_matches_pandas_without_missing():
+    df = _frame(False)
+    res = correlation.corr_matrix(df, 'spearman', block_rows=100)
+    pd.testing.assert_frame_equal(res, df.select_dtypes(include='number').corr(method='spearman'), atol=1e-10, rtol=0)
+
+
+def test_cached_by_token():
+    df = _frame(False)
+    first = correlation.corr_matrix(df, 'spearman', token='t-cache')
+    assert correlation.corr_matrix(df, 'spearman', token='t-cache') is first
+
+
+def test_top_pairs_and_clustered_submatrix():
+    corr = _frame(False).select_dtypes(include='number').corr()
+    top = correlation.top_pairs(corr, k=2)
+    assert list(top.iloc[0, :2]) == ['x', 'y']
+    assert len(top) == 2 and top['相関係数'].abs().is_monotonic_decreasing
+    sub = correlation.clustered_submatrix(corr, max_columns=3)
+    assert set(sub.columns) >= {'x', 'y'} and list(sub.index) == list(sub.columns)
@@ -0,0 +1,17 @@
+import io
+import pandas as pd
+import pytest
+from src.logic import data_io
+
+_CSV = ("d,t,x,s,b,tm\n"
+        "2024-01-01,2024-01-01 10:00:00,1,a,true,10:00:00\n"
+        ",2024-02-01T11:00,2,b,false,11:30:00\n"
+        "2024-03-01,,3,,true,\n").encode('utf-8')
+
+
+@pytest.mark.parametrize('read_kwargs', [{'encoding': None, 'header': 0}, {'encoding': None, 'header': None},
+                                         {'encoding': None, 'header': None, 'names': list('abcdef')}])
+def test_pyarrow_engine_matches_c_parser(read_kwargs):
+    expected = data_io.read_csv_with_engine(io.BytesIO(_CSV), read_kwargs, 'c')
+    res = data_io.read_csv_with_engine(io.BytesIO(_CSV), read_kwargs, 'pyarrow')
+    pd.testing.assert_frame_equal(res, expected)
@@ -0,0 +1,74 @@
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from src.logic import data_io, dataset_cache
+from src.logic.dataset_cache import DatasetCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DatasetCache(str(tmp_path), 1 << 30)
+
+
+def _frame() -> pd.DataFrame:
+    n = 6
+    return pd.DataFrame({
+        'i8': np.arange(n, dtype='int8'),
+        'i64': np.arange(n, dtype='int64') * 2 ** 40,
+        'f32': np.linspace(0, 1, n, dtype='float32'),
+        'f': [1.5, np.nan, 2.5, 3.0, np.nan, 0.0],
+        'b': [True, False] * 3,
+        'ni': pd.array([1, None, 3, 4, None, 6], dtype='Int64'),
+        't': pd.to_datetime(['2024-01-01 00:00:00', None, '2024-03-01 10:00:00', '2024-04-01 00:00:00', '2024-05-01 00:00:00', None]),
+        'tz': pd.date_range('2024-01-01', periods=n, freq='h', tz='Asia/Tokyo'),
+        'cat': pd.Categorical(['a', 'b', None, 'a', 'b', 'a']),
+        's': pd.array(['x', None, 'y', 'z', 'x', 'w'], dtype='string'),
+        'o': np.array(['x', None, 'y', 'z', 'x', 'w'], dtype=object),
+    })
+
+
+def test_round_trip_keeps_dtypes(cache):
+    df = _frame()
+    cache.put('abc', df, 'v')
+    res = cache.get('abc', 'v')
+    pd.testing.assert_frame_equal(res, df)
+    assert cache.stats()['hits'] == 1 and cache.stats()['writes'] == 1
+
+
+def test_variants_are_separate_entries(cache):
+    cache.put('abc', _frame(), 'header')
+    assert cache.get('abc', 'noheader') is None
+    assert cache.contains('abc', 'header')
+
+
+def test_unrepresentable_frame_is_skipped(cache):
+    cache.put('abc', pd.DataFrame({'mixed': [1, 'a', 2.5]}))
+    assert cache.get('abc') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_evicts_least_recently_used(tmp_path):
+    df = _frame()
+    size = DatasetCache(str(tmp_path / 'probe'), 1 << 30)
+    (tmp_path / 'probe').mkdir()
+    size.put('probe', df)
+    one = size.stats()['bytes']
+    cache = DatasetCache(str(tmp_path), int(one * 2.5))
+    for key in ['a', 'b', 'c']:
+        cache.put(key, df)
+    assert not cache.contains('a') and cache.contains('b') and cache.contains('c')
+    assert cache.stats()['evictions'] == 1
+
+
+def test_load_csv_hit_matches_miss(tmp_path, monkeypatch):
+    monkeypatch.setenv('CACHE_DIR', str(tmp_path))
+    dataset_cache.get_dataset_cache.cache_clear()
+    try:
+        data = b'a,b,c,d\n1,x,2024-01-01,1.5\n2,,2024-02-01,\n3,z,,2.5\n'
+        first = data_io.load_csv(io.BytesIO(data), engine='c')
+        second = data_io.load_csv(io.BytesIO(data), engine='c')
+        assert dataset_cache.get_dataset_cache().stats()['hits'] == 1
+        pd.testing.assert_frame_equal(second, first)
+    finally:
+        dataset_cache.get_dataset_cache.cache_clear()
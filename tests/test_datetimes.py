@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+from src.logic import cleaning, datetimes, feature_engineering
+
+
+def _dates_with_missing() -> pd.DataFrame:
+    values = np.array(['2024-06-01', '2024-06-15', '2024-01-10', None] * 25, dtype=object)
+    return pd.DataFrame({'d': values})
+
+
+def test_parse_categorical_keeps_missing_as_nat():
+    s = _dates_with_missing()['d'].astype('category')
+    parsed = datetimes.parse(s, cache=False)
+    assert int(parsed.isna().sum()) == int(s.isna().sum()) == 25
+    expected = pd.to_datetime(s.astype(object), format='%Y-%m-%d')
+    pd.testing.assert_series_equal(parsed, expected, check_names=False)
+
+
+def test_categorical_date_column_features_keep_missing():
+    df = cleaning.convert_dtype(_dates_with_missing(), 'd', 'カテゴリ')
+    df = cleaning.convert_dtype(df, 'd', '日付')
+    assert int(df['d'].isna().sum()) == 25
+    res = feature_engineering.extract_date_features(df, 'd', ['month'])
+    assert int(res['d_month'].isna().sum()) == 25
+    assert res['d_month'].value_counts().to_dict() == {6.0: 50, 1.0: 25}
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.logic import dedup
+
+
+def _frame() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    n = 2000
+    return pd.DataFrame({
+        'i': rng.integers(0, 20, n),
+        'f': np.where(rng.random(n) < 0.1, np.nan, rng.integers(0, 5, n) / 2),
+        's': rng.choice(['a', 'b', None], n),
+        'c': pd.Categorical(rng.choice(['x', 'y'], n)),
+    })
+
+
+@pytest.mark.parametrize('keep', dedup.KEEP_POLICIES)
+@pytest.mark.parametrize('verify', [True, False])
+@pytest.mark.parametrize('subset', [None, ['i', 's'], ['f']])
+def test_duplicate_mask_matches_pandas(keep, verify, subset):
+    df = _frame()
+    expected = df.duplicated(subset=subset, keep=False if keep == 'none' else keep).to_numpy()
+    np.testing.assert_array_equal(dedup.duplicate_mask(df, subset, keep, verify=verify), expected)
+
+
+def test_large_integer_keys_are_distinct():
+    df = pd.DataFrame({'id': [2**60, 2**60 + 1, 2**60 + 2, 1234567890123456789, 1234567890123456790]})
+    expected = df.duplicated().to_numpy()
+    np.testing.assert_array_equal(dedup.duplicate_mask(df, verify=False), expected)
+    np.testing.assert_array_equal(dedup.chunked_duplicate_mask([df.iloc[:2], df.iloc[2:]]), expected)
+
+
+def test_chunk_hashes_ignore_numeric_dtype():
+    # 欠損の有無でチャンクごとに int64 / float64 / Int64 に揺れる列
+    chunks = [pd.DataFrame({'x': [1, 2, 3]}), pd.DataFrame({'x': [1.0, np.nan, 2.5]}),
+              pd.DataFrame({'x': pd.array([3, None], dtype='Int64')})]
+    expected = pd.concat(chunks).astype({'x': np.float64}).duplicated().to_numpy()
+    np.testing.assert_array_equal(dedup.chunked_duplicate_mask(chunks), expected)
+
+
+def test_iter_drop_duplicates_matches_drop_duplicates():
+    df = _frame()
+    chunks = lambda: iter([df.iloc[i:i + 300] for i in range(0, len(df), 300)])
+    res = pd.concat(list(dedup.iter_drop_duplicates(chunks, ['i', 's'], 'last')))
+    pd.testing.assert_frame_equal(res, df.drop_duplicates(['i', 's'], keep='last'))
+
+
+def test_key_collisions_are_verified(monkeypatch):
+    # 全行が同じキーになっても、候補行の厳密な比較で結果は変わらない
+    df = _frame()
+    monkeypatch.setattr(dedup, 'row_keys', lambda frame, subset=None: np.zeros(len(frame), dtype=np.uint64))
+    for keep in dedup.KEEP_POLICIES:
+        expected = df.duplicated(keep=False if keep == 'none' else keep).to_numpy()
+        np.testing.assert_array_equal(dedup.duplicate_mask(df, keep=keep), expected)
+
+
+def test_count_duplicates_and_drop(monkeypatch):
+    df = _frame()
+    assert dedup.count_duplicates(df, ['i'], 'none', token='t-dedup') == int(df.duplicated(['i'], keep=False).sum())
+    monkeypatch.setattr(dedup, 'duplicate_mask', lambda *a, **k: pytest.fail('not cached'))
+    assert dedup.count_duplicates(df, ['i'], 'none', token='t-dedup') == int(df.duplicated(['i'], keep=False).sum())
+    monkeypatch.undo()
+    unique = df.drop_duplicates()
+    assert dedup.drop_duplicates(unique) is unique
+    with pytest.raises(ValueError):
+        dedup.duplicate_mask(df, keep='middle')
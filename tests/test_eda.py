@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.logic.eda import ApproxDescribe
+
+
+class _Recording(ApproxDescribe):
+    """公開された途中の推定値を記録する"""
+
+    def _publish(self, columns, seen):
+        super()._publish(columns, seen)
+        self.published = getattr(self, 'published', []) + [(seen, self._table.copy())]
+
+
+def test_refine_intervals_cover_sorted_column():
+    df = pd.DataFrame({'x': np.arange(200_000, dtype=np.float64)})
+    approx = _Recording(df, sample_size=5_000, block_rows=20_000)
+    approx._refine()
+    true_mean = df['x'].mean()
+    partial = [table for seen, table in approx.published if 0 < seen < len(df)]
+    assert len(partial) > 2
+    for table in partial:
+        assert abs(table.loc['x', 'mean'] - true_mean) <= table.loc['x', 'mean_ci']
+    final = approx.describe()
+    assert approx.done
+    assert final.loc['x', 'mean'] == pytest.approx(true_mean, rel=1e-12)
+    assert (final.loc['x', 'min'], final.loc['x', 'max']) == (0.0, 199_999.0)
+    assert final.loc['x', 'count'] == len(df)
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.logic import encoding, feature_engineering
+from src.logic.encoding import CardinalityError, OneHotEncoding, fit_one_hot
+
+
+def _frame() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    n = 300
+    return pd.DataFrame({
+        'x': rng.normal(size=n),
+        's': pd.Series(rng.choice(['b', 'a', 'c', None], n), dtype=object),
+        'i': rng.integers(0, 4, n),
+        'cat': pd.Categorical(rng.choice(['lo', 'hi'], n), categories=['lo', 'mid', 'hi']),
+    })
+
+
+@pytest.mark.parametrize('column', ['s', 'i', 'cat'])
+@pytest.mark.parametrize('sparse', [True, False])
+def test_one_hot_matches_get_dummies(column, sparse):
+    df = _frame()
+    res = feature_engineering.one_hot_encode(df, column, sparse=sparse)
+    expected = pd.get_dummies(df, columns=[column], dtype=bool)
+    if isinstance(df[column].dtype, pd.CategoricalDtype):
+        # 出現しないカテゴリの列は作らない
+        expected = expected.loc[:, expected.any() | ~expected.columns.str.startswith(f'{column}_')]
+    assert list(res.columns) == list(expected.columns)
+    if sparse:
+        encoded = [c for c in res.columns if str(c).startswith(f'{column}_')]
+        assert all(isinstance(res[c].dtype, pd.SparseDtype) for c in encoded)
+        res = res.astype({c: bool for c in encoded})
+    pd.testing.assert_frame_equal(res, expected)
+
+
+def test_fitted_categories_are_reapplied():
+    df = _frame()
+    params = fit_one_hot(df['s']).to_params()
+    batch = pd.DataFrame({'s': ['c', 'z', None, 'a']})
+    res = feature_engineering.one_hot_encode(batch, **params, sparse=False)
+    assert list(res.columns) == ['s_a', 's_b', 's_c']
+    # 学習時に無かった値・欠損はどの列も 0
+    assert res.to_numpy().tolist() == [[False, False, True], [False, False, False],
+                                       [False, False, False], [True, False, False]]
+
+
+def test_top_k_collects_other():
+    s = pd.Series(['a'] * 5 + ['b'] * 3 + ['c', 'd'], name='s')
+    enc = fit_one_hot(s, 'top_k', top_k=2)
+    assert enc.feature_names == ['s_a', 's_b', f's_{encoding.OTHER}']
+    assert enc.transform_sparse(s).sum(axis=0).tolist() == [[5, 3, 2]]
+
+
+def test_hash_is_deterministic_and_one_per_row():
+    s = pd.Series([f'v{i}' for i in range(1000)] + [None], name='h')
+    enc = fit_one_hot(s, 'hash', n_features=16)
+    matrix = enc.transform_sparse(s)
+    assert matrix.shape == (1001, 16)
+    assert matrix.sum(axis=1).A1.tolist() == [1] * 1000 + [0]
+    again = OneHotEncoding('h', 'hash', n_features=16).transform_sparse(s)
+    assert (matrix != again).nnz == 0
+
+
+def test_cardinality_guard(monkeypatch):
+    monkeypatch.setenv('ONE_HOT_MAX_CATEGORIES', '10')
+    s = pd.Series(np.arange(11), name='id')
+    with pytest.raises(CardinalityError):
+        fit_one_hot(s)
+    assert fit_one_hot(s, 'top_k').width == 11
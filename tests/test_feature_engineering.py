@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.logic import feature_engineering
+
+
+@pytest.mark.parametrize('left, right', [
+    ('int8[pyarrow]', 'double[pyarrow]'),
+    ('int8[pyarrow]', 'int8'),
+    ('Int8', 'double[pyarrow]'),
+    ('int8', 'float32'),
+])
+def test_operation_widens_downcast_columns(left, right):
+    df = pd.DataFrame({'a': pd.array([100, -100, 3], dtype=left), 'b': pd.array([100, 2, 3], dtype=right)})
+    res = feature_engineering.add_column_by_operation(df, 'a', 'b', '乗算', None)
+    np.testing.assert_array_equal(res['a_mul_b'].to_numpy(dtype=np.float64), [10000.0, -200.0, 9.0])
+
+
+@pytest.mark.parametrize('scale', [feature_engineering.standard_scale, feature_engineering.minmax_scale])
+def test_scaling_columns_match_single_column(scale):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'a': rng.normal(5, 2, 500), 'b': rng.integers(-3, 3, 500).astype('int8'),
+                       'c': np.where(rng.random(500) < 0.1, np.nan, rng.normal(size=500)).astype('float32')})
+    res = scale(df, None, columns=['a', 'b', 'c'])
+    for c in ['a', 'b', 'c']:
+        np.testing.assert_allclose(res[c].to_numpy(dtype=np.float64), scale(df, c)[c].to_numpy(dtype=np.float64),
+                                   rtol=1e-6, atol=1e-6)
@@ -0,0 +1,48 @@
+import hashlib
+import io
+import pandas as pd
+import pytest
+from src.logic import fingerprint
+from src.logic.fingerprint import HashingReader, buffered_reader, quick_fingerprint, sha256_view, source_view
+
+_DATA = b''.join(f'{i},{i * 7 % 13},row{i}\n'.encode() for i in range(100_000))
+
+
+def test_hashing_reader_matches_sha256_after_parsing():
+    reader = HashingReader(memoryview(_DATA))
+    df = pd.read_csv(buffered_reader(reader), header=None)
+    assert len(df) == 100_000
+    assert reader.hexdigest() == hashlib.sha256(_DATA).hexdigest()
+
+
+def test_hashing_reader_resets_on_rewind():
+    reader = HashingReader(memoryview(_DATA))
+    reader.read(1000)
+    reader.seek(0)
+    assert reader.read() == _DATA
+    assert reader.hexdigest() == hashlib.sha256(_DATA).hexdigest()
+    with pytest.raises(io.UnsupportedOperation):
+        reader.seek(10)
+
+
+def test_sha256_view_matches_hashlib():
+    assert sha256_view(memoryview(_DATA), block_size=4096) == hashlib.sha256(_DATA).hexdigest()
+
+
+@pytest.mark.parametrize('size', [0, 100, fingerprint.QUICK_SAMPLES * fingerprint.QUICK_SAMPLE_BYTES + 1, len(_DATA)])
+def test_quick_fingerprint_depends_on_size_and_sampled_content(size):
+    data = bytearray(_DATA[:size])
+    base = quick_fingerprint(memoryview(data))
+    assert base == quick_fingerprint(memoryview(bytes(data)))
+    assert base != quick_fingerprint(memoryview(bytes(data) + b'x'))
+    if size:
+        data[0] ^= 1  # 先頭ブロックは常にサンプルに含まれる
+        assert base != quick_fingerprint(memoryview(data))
+
+
+@pytest.mark.parametrize('source', [_DATA, bytearray(_DATA), io.BytesIO(_DATA)])
+def test_source_view_reads_content_and_releases(source):
+    with source_view(source) as view:
+        assert view.tobytes() == _DATA
+    if isinstance(source, io.BytesIO):
+        source.write(b'more')  # ビューは解放済みなのでリサイズできる
@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.utils.frame import downcast_numeric, widen_numeric
+
+
+@pytest.mark.parametrize('values, dtype', [
+    ([1, 2, 100], 'int8'),
+    ([1, 2, 40_000], 'int32'),
+    ([0.5, 1.25, np.nan], 'float32'),
+    ([0.1, 0.2], 'float64'),
+])
+def test_downcast_numeric_keeps_values(values, dtype):
+    s = pd.Series(values)
+    res = downcast_numeric(s)
+    assert res.dtype == dtype
+    np.testing.assert_array_equal(res.to_numpy(dtype=np.float64), s.to_numpy(dtype=np.float64))
+
+
+@pytest.mark.parametrize('dtype, expected', [
+    ('int8', 'int64'),
+    ('float32', 'float64'),
+    ('Int8', 'Int64'),
+    ('int8[pyarrow]', 'int64[pyarrow]'),
+    ('float[pyarrow]', 'double[pyarrow]'),
+    ('bool', 'bool'),
+])
+def test_widen_numeric(dtype, expected):
+    assert str(widen_numeric(pd.Series([1, 0, 1], dtype=dtype)).dtype) == expected
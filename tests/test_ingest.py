@@ -0,0 +1,61 @@
+import io
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from src.logic import ingest
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('CACHE_DIR', str(tmp_path))
+    return tmp_path
+
+
+def _csv() -> bytes:
+    # チャンクごとに型が揺れる列（整数→欠損を含む浮動小数、数値→文字列、全欠損のチャンク）
+    n = 300
+    df = pd.DataFrame({
+        'i': np.arange(n),
+        'f': np.where(np.arange(n) >= 150, np.nan, np.arange(n)),
+        'm': [str(v) if v < 200 else f'x{v}' for v in range(n)],
+        'e': [None] * 100 + ['a'] * 200,
+        'big': np.arange(n) * 1_000_000,
+    })
+    return df.to_csv(index=False).encode('utf-8')
+
+
+@pytest.mark.parametrize('chunk_rows', [100, 1000])
+def test_spilled_read_matches_in_memory_read(cache_dir, chunk_rows):
+    kwargs = {'encoding': None, 'header': 0}
+    in_memory = ingest.read_csv_chunked(io.BytesIO(_csv()), kwargs, chunk_rows=chunk_rows, memory_budget=1 << 40)
+    spilled = ingest.read_csv_chunked(io.BytesIO(_csv()), kwargs, chunk_rows=chunk_rows, memory_budget=0)
+    pd.testing.assert_frame_equal(spilled, in_memory)
+    assert os.listdir(cache_dir / 'spill') == []
+
+
+def test_chunk_dtypes_are_unified():
+    df = ingest.read_csv_chunked(io.BytesIO(_csv()), {'encoding': None, 'header': 0}, chunk_rows=100, memory_budget=0)
+    expected = pd.read_csv(io.BytesIO(_csv()))
+    assert df['f'].dtype.kind == 'f'
+    assert df['i'].dtype.kind == 'i' and df['big'].dtype.kind == 'i'
+    for col in ['i', 'f', 'big']:
+        np.testing.assert_array_equal(df[col].to_numpy(dtype=np.float64), expected[col].to_numpy(dtype=np.float64))
+    assert df['m'].astype(str).tolist() == expected['m'].astype(str).tolist()
+    assert df['e'].isna().sum() == 100
+
+
+def test_spill_files_removed_on_error(cache_dir, monkeypatch):
+    calls = []
+    downcast = ingest.downcast_chunk
+
+    def failing(df):
+        calls.append(len(df))
+        if len(calls) == 3:
+            raise RuntimeError('chunk failed')
+        return downcast(df)
+
+    monkeypatch.setattr(ingest, 'downcast_chunk', failing)
+    with pytest.raises(RuntimeError):
+        ingest.read_csv_chunked(io.BytesIO(_csv()), {'encoding': None, 'header': 0}, chunk_rows=10, memory_budget=0)
+    assert os.listdir(cache_dir / 'spill') == []
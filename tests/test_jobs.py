@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.logic import jobs
+from src.logic.jobs import Job, JobCancelled
+from src.logic.versioning import resolve_op
+
+
+def _frame() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    n = 1000
+    df = pd.DataFrame({f'c{i}': rng.normal(i, 1 + i, n) for i in range(4)})
+    df.loc[::7, 'c2'] = np.nan
+    return df
+
+
+_CASES = [
+    ('cleaning.fill_missing', {'column': None, 'columns': ['c1', 'c2'], 'method': '定数', 'value': 0.0}, 'rows'),
+    ('cleaning.clip_outliers_iqr', {'column': None, 'columns': ['c0', 'c1', 'c2']}, 'columns'),
+    ('feature_engineering.standard_scale', {'column': None, 'columns': ['c0', 'c3'], 'mean': [1.0, 2.0],
+                                            'scale': [2.0, 4.0]}, 'rows'),
+    ('cleaning.remove_outliers_sigma', {'column': 'c0', 'sigma': 2.0}, None),
+]
+
+
+@pytest.mark.parametrize('op, params, by', _CASES)
+def test_run_transform_matches_direct_call(workers, monkeypatch, op, params, by):
+    monkeypatch.setenv('JOB_CHUNK_ROWS', '300')
+    df = _frame()
+    split = jobs._transform_units(df, op, params)
+    assert (split[0] if split else None) == by
+    job = Job(id='j', session_uid='s', label=op)
+    pd.testing.assert_frame_equal(jobs.run_transform(job, df, op, params), resolve_op(op)(df, **params))
+    if by is not None:
+        assert job.progress == 1.0
+
+
+def test_fit_runs_in_job_and_is_recorded():
+    df = _frame()
+    job = Job(id='j', session_uid='s', label='scale')
+    fit = lambda frame: {'mean': [frame['c0'].mean()], 'scale': [frame['c0'].std(ddof=0)]}
+    res = jobs.run_transform(job, df, 'feature_engineering.standard_scale', {'column': None, 'columns': ['c0']}, fit=fit)
+    assert job.meta['params']['mean'] == [df['c0'].mean()]
+    np.testing.assert_allclose(res['c0'], (df['c0'] - df['c0'].mean()) / df['c0'].std(ddof=0))
+
+
+def test_cancel_stops_between_units(monkeypatch):
+    monkeypatch.setenv('JOB_CHUNK_ROWS', '100')
+    job = Job(id='j', session_uid='s', label='fill')
+    calls = []
+    original = job.report
+
+    def report(progress, message=''):
+        calls.append(progress)
+        if len(calls) == 3:
+            job._cancel.set()
+        original(progress, message)
+
+    monkeypatch.setattr(job, 'report', report)
+    with pytest.raises(JobCancelled):
+        jobs.run_transform(job, _frame(), 'cleaning.fill_missing',
+                           {'column': None, 'columns': ['c2'], 'method': '定数', 'value': 0.0})
+    assert len(calls) < 10
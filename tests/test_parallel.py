@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.logic import cleaning, feature_engineering, parallel
+
+
+def _frame() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    n = 1001
+    df = pd.DataFrame({f'c{i}': rng.normal(i, 1 + i, n) for i in range(5)}, index=np.arange(n) * 3)
+    df.loc[df.index[::9], 'c1'] = np.nan
+    df['k'] = rng.choice(['x', 'y', 'z'], n)
+    return df
+
+
+@pytest.mark.parametrize('n, parts', [(0, 3), (5, 3), (7, 2), (3, 8)])
+def test_partition_and_row_bounds_cover_in_order(n, parts):
+    groups = parallel.partition(list(range(n)), parts)
+    assert sum(groups, []) == list(range(n))
+    assert max(map(len, groups)) - min(map(len, groups)) <= 1
+    bounds = parallel.row_bounds(n, parts)
+    assert [i for start, end in bounds for i in range(start, end)] == list(range(n))
+
+
+def test_map_columns_keeps_column_order(workers):
+    cols = [f'c{i}' for i in range(5)]
+    res = parallel.map_columns(lambda group: {c: pd.Series([len(group)], name=c) for c in group}, cols, 10 ** 6)
+    assert list(res) == cols
+
+
+def test_map_row_chunks_matches_whole_frame(workers):
+    df = _frame()
+    fn = lambda chunk: {'sum': chunk['c0'] + chunk['c1'], 'cat': chunk['k'].astype('category')}
+    res = parallel.map_row_chunks(fn, df)
+    expected = fn(df)
+    pd.testing.assert_series_equal(res['sum'], expected['sum'])
+    # チャンクごとにカテゴリが異なっても、連結後は同じ値・インデックスになる
+    pd.testing.assert_series_equal(res['cat'].astype(str), expected['cat'].astype(str))
+    assert set(res['cat'].cat.categories) == {'x', 'y', 'z'}
+
+
+def test_map_units_order_progress_and_abort(workers):
+    done = []
+    assert parallel.map_units(lambda u: u * u, range(10), on_done=done.append) == [u * u for u in range(10)]
+    assert sorted(done) == list(range(1, 11))
+
+    def abort(n):
+        raise KeyboardInterrupt
+    with pytest.raises(KeyboardInterrupt):
+        parallel.map_units(lambda u: u, range(10), on_done=abort)
+
+
+def test_nested_calls_run_serially(workers):
+    # ワーカーの中からの呼び出しは分割せず 1 グループで実行する
+    inner = parallel.map_groups(lambda g: parallel.map_groups(lambda h: parallel.in_worker(), g, 10 ** 6),
+                                list(range(4)), 10 ** 6)
+    assert all(r == [workers > 1] for r in inner)
+
+
+_OPS = [
+    lambda df, cols: cleaning.clip_outliers_iqr(df, None, columns=cols),
+    lambda df, cols: cleaning.fill_missing(df, None, '中央値', columns=cols),
+    lambda df, cols: cleaning.convert_dtype(df, None, '文字列', columns=cols),
+    lambda df, cols: cleaning.remove_outliers_sigma(df, None, sigma=1.5, columns=cols),
+    lambda df, cols: feature_engineering.standard_scale(df, None, columns=cols),
+    lambda df, cols: feature_engineering.minmax_scale(df, None, columns=cols),
+]
+
+
+@pytest.mark.parametrize('op', range(len(_OPS)))
+def test_results_do_not_depend_on_worker_count(monkeypatch, op):
+    cols = [f'c{i}' for i in range(5)]
+    results = []
+    for n in (1, 2, 3, 4):
+        monkeypatch.setenv('PARALLEL_WORKERS', str(n))
+        monkeypatch.setenv('PARALLEL_MIN_CELLS', '1')
+        results.append(_OPS[op](_frame(), cols))
+    for res in results[1:]:
+        pd.testing.assert_frame_equal(res, results[0])
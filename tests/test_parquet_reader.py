@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from src.logic import parquet_reader
+
+
+@pytest.fixture(scope='module')
+def path(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    n = 10_000
+    df = pd.DataFrame({
+        'id': np.arange(n),
+        'x': rng.normal(size=n),
+        'cat': rng.choice(['a', 'b', 'c'], n),
+        'ts': pd.Timestamp('2024-01-01') + pd.to_timedelta(np.arange(n), unit='h'),
+        'opt': np.where(rng.random(n) < 0.2, np.nan, rng.normal(size=n)),
+    })
+    p = tmp_path_factory.mktemp('parquet') / 'data.parquet'
+    # id・ts が昇順なので、行グループの統計量で読み飛ばせる
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), p, row_group_size=1000)
+    return str(p)
+
+
+_CASES = [
+    (None, None),
+    (['x', 'cat'], None),
+    (['x'], [('id', '>=', 2500), ('id', '<', 4100)]),
+    (['id', 'x'], [('cat', 'in', ['a', 'c']), ('x', '>', 0.5)]),
+    (['id'], [('ts', '>=', pd.Timestamp('2024-06-01')), ('opt', '!=', 0.0)]),
+    (['cat', 'id'], [('id', '==', 7777)]),
+    (None, [('id', '>', 10**6)]),
+]
+
+
+@pytest.mark.parametrize('columns, filters', _CASES)
+def test_read_table_matches_read_parquet(path, columns, filters):
+    expected = pd.read_parquet(path, columns=columns, filters=filters).reset_index(drop=True)
+    res = parquet_reader.read_table(path, columns=columns, filters=filters)
+    pd.testing.assert_frame_equal(res, expected)
+    batches = list(parquet_reader.iter_batches(path, columns=columns, filters=filters, batch_rows=700))
+    joined = pd.concat(batches, ignore_index=True) if batches else expected.iloc[:0]
+    pd.testing.assert_frame_equal(joined, expected)
+
+
+def test_row_groups_are_pruned(path):
+    pf = pq.ParquetFile(path)
+    normalized = parquet_reader.normalize_filters([('id', '>=', 2500), ('id', '<', 4100)], pf.schema_arrow)
+    assert parquet_reader.prune_row_groups(pf, normalized) == [2, 3, 4]
+
+
+def test_string_filter_values_are_coerced(path):
+    schema = parquet_reader.read_schema(path)
+    filters = parquet_reader.coerce_filters([('ts', '<', '2024-01-02'), ('id', 'in', ['3', '5'])], schema)
+    res = parquet_reader.read_table(path, columns=['id'], filters=filters)
+    assert res['id'].tolist() == [3, 5]
+
+
+def test_read_schema_uses_footer_statistics(path):
+    schema = parquet_reader.read_schema(path)
+    assert schema.num_rows == 10_000 and schema.num_row_groups == 10
+    assert schema.column('id').min == 0 and schema.column('id').max == 9999
+    assert schema.column('opt').null_count == pd.read_parquet(path, columns=['opt'])['opt'].isna().sum()
+    assert schema.names_of_kind('datetime') == ['ts']
+
+
+def test_invalid_filters(path):
+    with pytest.raises(ValueError):
+        parquet_reader.read_table(path, filters=[('id', 'like', 1)])
+    with pytest.raises(KeyError):
+        parquet_reader.read_table(path, filters=[('missing', '==', 1)])
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.logic import codegen, pipeline
+from src.logic.pipeline import FusedStep, Pipeline, Step
+
+
+def _frame() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    n = 500
+    df = pd.DataFrame({
+        'a': rng.normal(0, 3, n),
+        'b': rng.integers(0, 10, n).astype(float),
+        'c': rng.choice(['x', 'y', 'z'], n),
+        'd': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 400, n), unit='D'),
+        'unused': rng.normal(size=n),
+    })
+    df.loc[rng.random(n) < 0.1, 'b'] = np.nan
+    return df
+
+
+_STEPS = [
+    Step('cleaning.fill_missing', {'column': 'b', 'method': '定数', 'value': -1.0}),
+    Step('feature_engineering.add_column_by_operation', {'col1': 'a', 'col2': 'b', 'op': '乗算'}),
+    Step('feature_engineering.add_column_by_operation', {'col1': 'a', 'col2': None, 'op': '定数加算', 'const': 1.0}),
+    Step('feature_engineering.extract_date_features', {'column': 'd'}),
+    Step('feature_engineering.standard_scale', {'column': None, 'columns': ['a']}),
+    Step('feature_engineering.label_encode', {'column': 'c', 'classes': ['x', 'y', 'z']}),
+    Step('cleaning.drop_missing', {'axis': 0}),
+    Step('cleaning.remove_outliers_sigma', {'column': 'a', 'sigma': 2.0}),
+    Step('feature_engineering.minmax_scale', {'column': 'b'}),
+]
+
+
+@pytest.mark.parametrize('outputs', [None, ['a', 'a_mul_b', 'c'], ['b', 'd_month']])
+def test_optimized_plan_matches_step_by_step(workers, outputs):
+    p = Pipeline(steps=list(_STEPS), outputs=outputs)
+    expected = pipeline.run_pipeline(_frame(), p, optimize_plan=False)
+    if outputs:
+        expected = expected[outputs]
+    pd.testing.assert_frame_equal(pipeline.run_pipeline(_frame(), p), expected)
+
+
+def test_row_local_fused_steps_match_serial(workers):
+    # 全て行ローカル（学習済みのパラメータを持つ）なので行チャンクに分けて並列に実行される
+    steps = [s for s in _STEPS[:6] if s.op != 'feature_engineering.standard_scale']
+    steps.append(Step('feature_engineering.standard_scale', {'column': None, 'columns': ['a'], 'mean': [0.5], 'scale': [2.0]}))
+    p = Pipeline(steps=steps)
+    assert pipeline.is_streamable(steps)
+    pd.testing.assert_frame_equal(pipeline.run_pipeline(_frame(), p),
+                                  pipeline.run_pipeline(_frame(), p, optimize_plan=False))
+
+
+def test_filters_move_before_row_local_steps_only():
+    steps = [
+        Step('feature_engineering.standard_scale', {'column': 'a'}),
+        Step('feature_engineering.label_encode', {'column': 'c', 'classes': ['x', 'y', 'z']}),
+        Step('feature_engineering.add_column_by_operation', {'col1': 'b', 'col2': None, 'op': '定数加算', 'const': 1.0}),
+        Step('cleaning.remove_outliers_sigma', {'column': 'a'}),
+    ]
+    # 行ローカルな操作は越えるが、フィルタが読む列 a を書く standard_scale は越えない
+    assert [s.op for s in pipeline.push_down_filters(steps)] == [steps[i].op for i in (0, 3, 1, 2)]
+    # drop_missing は全列を読むため、列を書き換える操作を越えない
+    assert pipeline.push_down_filters(_STEPS[:7])[-1].op == 'cleaning.drop_missing'
+
+
+def test_dead_steps_and_required_columns():
+    steps = pipeline.eliminate_dead_steps(_STEPS[:6], ['b'])
+    assert [s.op for s in steps] == ['cleaning.fill_missing']
+    assert pipeline.required_columns(_STEPS[:6], ['b']) == {'b'}
+    # 全列を読む drop_missing より前の操作は除去しない
+    assert len(pipeline.eliminate_dead_steps(_STEPS, ['b'])) == len(_STEPS)
+    assert pipeline.required_columns(_STEPS, ['b']) is None
+
+
+def test_consecutive_column_steps_are_fused():
+    plan = pipeline.optimize(Pipeline(steps=list(_STEPS)))
+    assert isinstance(plan[0], FusedStep) and len(plan[0].steps) == 6
+    assert [getattr(item, 'op', None) for item in plan[1:]] == [s.op for s in _STEPS[6:]]
+
+
+def test_json_round_trip():
+    p = Pipeline(steps=list(_STEPS), source={'path': 'x.csv', 'format': 'csv'}, outputs=['a'])
+    assert Pipeline.from_json(p.to_json()) == p
+
+
+def test_generated_code_matches_pipeline():
+    steps = [s for s in _STEPS if s.op != 'feature_engineering.extract_date_features']
+    p = Pipeline(steps=steps)
+    scope = {'df': _frame()}
+    exec(codegen.generate_pipeline_code(p), scope)
+    pd.testing.assert_frame_equal(scope['df'], pipeline.run_pipeline(_frame(), p, optimize_plan=False),
+                                  check_dtype=False)
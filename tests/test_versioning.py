@@ -0,0 +1,75 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from src.logic.versioning import DatasetVersionStore
+
+
+def _frame() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'a': rng.normal(size=200), 'b': rng.integers(0, 5, 200).astype(float)})
+    df.loc[::7, 'b'] = np.nan
+    return df
+
+
+def _apply_all(store: DatasetVersionStore) -> list:
+    """3 つの操作を記録し、各バージョンのデータを返す"""
+    frames = [store.current.copy()]
+    frames.append(store.apply('cleaning.fill_missing', column='b', method='中央値').copy())
+    frames.append(store.apply('cleaning.clip_outliers_iqr', column='a').copy())
+    frames.append(store.apply('cleaning.drop_duplicates', subset=['b']).copy())
+    return frames
+
+
+def test_undo_redo_jump_and_discard_redo():
+    store = DatasetVersionStore(_frame(), max_bytes=1 << 40)
+    frames = _apply_all(store)
+    assert store.undo() is store.versions[2].df and store.can_redo
+    store.undo()
+    pd.testing.assert_frame_equal(store.redo(), frames[2])
+    pd.testing.assert_frame_equal(store.jump(0), frames[0])
+    with pytest.raises(KeyError):
+        store.jump(99)
+    store.commit(frames[3], 'manual')
+    assert [v.id for v in store.versions] == [0, 4] and not store.can_redo
+
+
+def test_evicted_snapshots_are_replayed():
+    unlimited = DatasetVersionStore(_frame(), max_bytes=1 << 40)
+    expected = _apply_all(unlimited)
+    store = DatasetVersionStore(_frame(), max_bytes=0)
+    _apply_all(store)
+    # 先頭と現在以外は破棄され、参照すると記録済みの操作から再計算される
+    assert [v.df is not None for v in store.versions] == [True, False, False, True]
+    for i in range(len(expected)):
+        store.jump(i)
+        pd.testing.assert_frame_equal(store.current, expected[i])
+
+
+def test_spill_and_reload(tmp_path):
+    store = DatasetVersionStore(_frame(), max_bytes=1 << 40)
+    expected = _apply_all(store)
+    store.jump(1)
+    assert store.spill(keep_current=False, directory=str(tmp_path)) > 0
+    assert store.spilled and store.memory_usage() == 0
+    assert sorted(os.listdir(tmp_path)) == sorted(f'version-{store.uid}-{i}.pkl' for i in (0, 1))
+    for i in (1, 3, 0, 2):
+        store.jump(i)
+        pd.testing.assert_frame_equal(store.current, expected[i])
+    assert os.listdir(tmp_path) == []
+
+
+def test_close_removes_spill_files(tmp_path):
+    store = DatasetVersionStore(_frame())
+    store.spill(keep_current=False, directory=str(tmp_path))
+    assert os.listdir(tmp_path)
+    store.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_shared_columns_counted_once():
+    store = DatasetVersionStore(_frame(), max_bytes=1 << 40)
+    base = store.memory_usage()
+    store.apply('cleaning.fill_missing', column='b', method='中央値')
+    # 変更されていない列 a はバッファを共有するため、増えるのは b の分だけ
+    assert store.memory_usage() == base + int(store.current['b'].memory_usage(index=False, deep=True))